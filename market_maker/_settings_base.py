@@ -87,6 +87,58 @@ DRY_RUN = False
 # order amend/replaces are done, you may hit a ratelimit. If so, email BitMEX if you feel you need a higher limit.
 LOOP_INTERVAL = 5
 
+# How the loop is driven. 'interval' re-checks orders every LOOP_INTERVAL seconds. 'event' re-checks as soon as
+# something relevant arrives over the websocket: the mid price moving QUOTE_TRIGGER_THRESHOLD (a fraction of price)
+# from where it was at the last check, an execution, a position change or a new 5m bar. After the first event we
+# wait EVENT_DEBOUNCE seconds so a burst of them leads to one check. LOOP_INTERVAL is still the longest the loop
+# will go without a check.
+LOOP_MODE = 'interval'
+QUOTE_TRIGGER_THRESHOLD = 0.0005
+EVENT_DEBOUNCE = 0.25
+
+# If the realtime connection drops, reconnect this many times before giving up and restarting the bot.
+# Waits between attempts start at WS_RECONNECT_BACKOFF seconds and double up to WS_RECONNECT_MAX_BACKOFF.
+WS_RECONNECT_ATTEMPTS = 10
+WS_RECONNECT_BACKOFF = 0.5
+WS_RECONNECT_MAX_BACKOFF = 30
+
+# Batches of order cancels and amends are sent at the same time, on up to this many threads. Amends at a price
+# we're cancelling an order at still wait for the cancel to finish, and creates wait for both.
+ORDER_DISPATCH_WORKERS = 3
+# Connections to keep open to the REST API. Should be at least ORDER_DISPATCH_WORKERS.
+HTTP_POOL_SIZE = 4
+# ORDER_DISPATCH_WORKERS connections are opened on startup, so the first orders don't wait for TCP and TLS
+# handshakes. If no requests are sent for this many seconds, they're opened again with a HEAD request to BASE_URL,
+# since the server has likely closed them. None to let them close.
+HTTP_IDLE_REFRESH = 30
+
+# How many 5m bars of history to keep for the moving averages, fetched from the REST API on startup. The API returns
+# 500 bars per request; more than that are fetched on up to BACKFILL_WORKERS requests at once, within the rate limit.
+BAR_HISTORY = 500
+BACKFILL_WORKERS = 4
+
+# The REST API reports how much of our rate limit is left on every response. Rather than run out, we hold back
+# creates once less than RATELIMIT_RESERVE_CREATE of the limit is left, and amends below RATELIMIT_RESERVE_AMEND,
+# keeping the rest for cancels. Held back orders are retried on the next loop.
+RATELIMIT_RESERVE_AMEND = 0.1
+RATELIMIT_RESERVE_CREATE = 0.2
+# Below this fraction of the rate limit, quote fewer ORDER_PAIRS (in proportion) so there's less to amend.
+RATELIMIT_LOW_BUDGET = 0.5
+
+# Amends to the same orders within this many seconds of the last amend request are merged, so only the latest price
+# and quantity is sent, in one request when the window is up. The first amend after a quiet spell goes straight out.
+# While amends are queued no new orders are placed, and a queued amend that fails is reported on the next pass.
+# 0 (the default) sends every amend as it comes.
+AMEND_COALESCE_WINDOW = 0
+
+# Failed REST requests that are safe to send again (GET and DELETE) are retried up to API_MAX_RETRIES times. Waits
+# between attempts start at API_RETRY_BACKOFF seconds and double up to API_RETRY_MAX_BACKOFF, less a random amount so
+# requests that failed together don't retry together. A request is given up on after API_RETRY_DEADLINE seconds.
+API_MAX_RETRIES = 3
+API_RETRY_BACKOFF = 0.5
+API_RETRY_MAX_BACKOFF = 10
+API_RETRY_DEADLINE = 60
+
 # Wait times between orders / errors
 API_REST_INTERVAL = 1
 API_ERROR_INTERVAL = 10
@@ -94,6 +146,26 @@ API_ERROR_INTERVAL = 10
 # If we're doing a dry run, use these numbers for BTC balances
 DRY_BTC = 50
 
+# Which order book feed to keep a local book from. 'orderBook10' sends the top 10 levels in full on every
+# change; 'orderBookL2' sends the whole book and then deltas, which is more data but gives full depth.
+ORDERBOOK_TABLE = "orderBook10"
+
+# How many rows of the append-only realtime tables to keep in memory. These are ring buffers; once full,
+# the oldest row is dropped for each new one. Tables not listed here keep 200 rows.
+WS_TABLE_CAPACITY = {
+    'trade': 200,
+    'quote': 200,
+    'tradeBin5m': 200
+}
+
+# Record every raw realtime frame, with the time it arrived, to segment files in this directory. Useful for
+# reproducing bugs and replaying real traffic (see market_maker/ws/recorder.py). None to disable.
+# Compression is None, 'gzip' or 'zstd' (needs the zstandard package). A new segment is started after
+# WS_RECORD_SEGMENT_BYTES of frames.
+WS_RECORD_DIR = None
+WS_RECORD_COMPRESSION = 'gzip'
+WS_RECORD_SEGMENT_BYTES = 256 * 1024 * 1024
+
 # Available levels: logging.(DEBUG|INFO|WARN|ERROR)
 LOG_LEVEL = logging.INFO
 
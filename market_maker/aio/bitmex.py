@@ -0,0 +1,424 @@
+"""BitMEX API Connector for asyncio. Python 3 only; needs aiohttp."""
+import asyncio
+import base64
+import inspect
+import json
+import logging
+import uuid
+from collections import deque
+from time import time
+from urllib.parse import urlencode, urlparse, urlunparse
+
+from market_maker.auth import APIKeyAuthWithExpires
+from market_maker.utils import errors
+from market_maker.utils.ratelimit import RateLimitGovernor, request_priority
+from market_maker.utils.retry import RetryPolicy
+from market_maker.ws.openorders import OpenOrders
+from market_maker.ws.ws_thread import KeyedTable, instrumentTicker, json_loads
+
+
+# The same connector as market_maker.bitmex.BitMEX, for asyncio. It does its REST calls and its
+# realtime feed on one event loop, with no threads. That lets one process quote many symbols, and
+# keep many requests in flight at once (up to maxInFlight connections), without a thread for each.
+#
+# Reads (instrument, position, open_orders, ...) come from the realtime tables in memory, as they
+# do in the threaded connector, so they're plain methods. Anything that goes to the exchange is a
+# coroutine. Use it as an async context manager, or call connect() and close():
+#
+#     async with AsyncBitMEX(base_url, ['XBTUSD', 'ETHUSD'], apiKey, apiSecret) as bitmex:
+#         await bitmex.create_bulk_orders([{'price': 10000, 'orderQty': 100, 'side': 'Buy'}], 'XBTUSD')
+#
+# aiohttp is only imported on connect(), so the rest of the bot doesn't need it installed.
+class AsyncBitMEX(object):
+
+    """BitMEX API Connector for asyncio."""
+
+    # Rows kept per symbol in append-only tables (trade, quote).
+    TABLE_CAPACITY = 200
+
+    # Tables subscribed for each symbol, and for each symbol when authenticated.
+    MARKET_TABLES = ('quote', 'trade')
+    ACCOUNT_TABLES = ('order', 'execution')
+
+    def __init__(self, base_url, symbols=(), apiKey=None, apiSecret=None, orderIDPrefix='mm_bitmex_',
+                 shouldWSAuth=True, postOnly=False, maxInFlight=32, timeout=5, ratelimit=None, retryPolicy=None,
+                 reconnectAttempts=10, reconnectBackoff=0.5, reconnectMaxBackoff=30):
+        """Init connector. Nothing connects until connect()."""
+        self.logger = logging.getLogger('root')
+        self.base_url = base_url
+        self.basePath = urlparse(base_url).path
+        self.symbols = [symbols] if isinstance(symbols, str) else list(symbols)
+        if len(orderIDPrefix) > 13:
+            raise ValueError("settings.ORDERID_PREFIX must be at most 13 characters long!")
+        self.orderIDPrefix = orderIDPrefix
+        self.auth = APIKeyAuthWithExpires(apiKey, apiSecret) if apiKey else None
+        self.shouldWSAuth = shouldWSAuth and self.auth is not None
+        self.postOnly = postOnly
+        self.maxInFlight = maxInFlight
+        self.timeout = timeout
+        self.ratelimit = ratelimit or RateLimitGovernor()
+        self.retryPolicy = retryPolicy or RetryPolicy()
+        self.reconnectAttempts = reconnectAttempts
+        self.reconnectBackoff = reconnectBackoff
+        self.reconnectMaxBackoff = reconnectMaxBackoff
+
+        self.session = None
+        self.ws = None
+        self.reader = None
+        self.closed = False
+        self.stateChanged = None
+        # How many wait_for()s are waiting; they're only woken if there are any.
+        self.waiting = 0
+        self.listeners = {}
+        # table -> KeyedTable, or for tables without keys, symbol -> deque (a ring buffer, as in the
+        # threaded connector, but one per symbol so a busy symbol can't push out a quiet one's rows)
+        self.data = {}
+        # symbol -> OpenOrders, our own open orders indexed as in the threaded connector
+        self.own_orders = {}
+        # (table, symbol) for every partial we've had; symbol is None for tables across all symbols
+        self.partials = set()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def connect(self):
+        """Open the REST session and the realtime feed, and wait for every subscribed table's partial."""
+        import aiohttp
+        import yarl
+        self.aiohttp = aiohttp
+        self.URL = yarl.URL
+        self.stateChanged = asyncio.Condition()
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.maxInFlight),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={'content-type': 'application/json', 'accept': 'application/json'})
+        opened = asyncio.get_event_loop().create_future()
+        self.reader = asyncio.ensure_future(self.__run(opened))
+        await opened
+        if not await self.wait_for(self.__synced):
+            raise Exception("Unable to get market data for %s: the WS closed before it arrived." %
+                            ', '.join(self.symbols))
+        self.logger.info('Got all market data for %s. Starting.' % ', '.join(self.symbols))
+
+    async def close(self):
+        self.closed = True
+        if self.ws is not None:
+            await self.ws.close()
+        if self.reader is not None:
+            await asyncio.gather(self.reader, return_exceptions=True)
+        if self.session is not None:
+            await self.session.close()
+
+    async def subscribe(self, symbol):
+        """Start following another symbol, and wait for its data."""
+        if symbol in self.symbols:
+            return
+        self.symbols.append(symbol)
+        await self.ws.send_str(json.dumps({'op': 'subscribe', 'args': self.__symbol_subscriptions(symbol)}))
+        if not await self.wait_for(self.__synced):
+            raise Exception("Unable to get market data for %s: the WS closed before it arrived." % symbol)
+
+    async def wait_for(self, predicate, timeout=None):
+        """Wait until predicate() is true (it's checked after each realtime message), or `timeout` seconds pass."""
+        async def wait():
+            async with self.stateChanged:
+                await self.stateChanged.wait_for(lambda: predicate() or self.closed)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(wait(), timeout)
+        finally:
+            self.waiting -= 1
+        return predicate()
+
+    def add_listener(self, table, callback, actions=None):
+        """Call `callback(table, action, data)` whenever a message for `table` has been applied.
+
+        As with the threaded connector, `actions` limits it to some of 'partial', 'insert', 'update'
+        and 'delete'. The callback may be a coroutine function; it's then scheduled on the loop."""
+        self.listeners.setdefault(table, []).append((callback, set(actions) if actions else None))
+
+    def remove_listener(self, table, callback):
+        self.listeners[table] = [(cb, actions) for cb, actions in self.listeners.get(table, []) if cb != callback]
+
+    #
+    # Realtime data
+    #
+    def instrument(self, symbol):
+        """Get an instrument's details."""
+        instrument = self.data['instrument'].find({'symbol': symbol})
+        if instrument is None:
+            raise Exception("Unable to find instrument or index with symbol: " + symbol)
+        return instrument
+
+    def ticker_data(self, symbol):
+        """Get ticker data."""
+        return instrumentTicker(self.instrument(symbol))
+
+    def recent_trades(self, symbol):
+        """The last TABLE_CAPACITY trades on a symbol, oldest first. Don't modify the result."""
+        return self.data.get('trade', {}).get(symbol, ())
+
+    def funds(self):
+        """Get your current balance."""
+        return self.data['margin'][0]
+
+    def position(self, symbol):
+        """Get your open position."""
+        for position in self.data.get('position', ()):
+            if position['symbol'] == symbol:
+                return position
+        # No position found; stub it
+        return {'avgCostPrice': 0, 'avgEntryPrice': 0, 'currentQty': 0, 'symbol': symbol}
+
+    def open_orders(self, symbol=None):
+        """Get our open orders, on one symbol or all of them, in the order they arrived. Don't modify the result."""
+        if symbol is not None:
+            return self.own_orders[symbol].all() if symbol in self.own_orders else ()
+        return tuple(order for openOrders in self.own_orders.values() for order in openOrders.all())
+
+    def best_open_order(self, symbol, side):
+        """Our highest open buy or lowest open sell on a symbol, or None if we have none on that side."""
+        return self.own_orders[symbol].best(side) if symbol in self.own_orders else None
+
+    #
+    # REST
+    #
+    async def create_bulk_orders(self, orders, symbol=None):
+        """Create multiple orders, on `symbol` (our first symbol by default) unless an order says otherwise."""
+        for order in orders:
+            order['clOrdID'] = self.orderIDPrefix + base64.b64encode(uuid.uuid4().bytes).decode('utf8').rstrip('=\n')
+            order.setdefault('symbol', symbol or self.symbols[0])
+            if self.postOnly:
+                order['execInst'] = 'ParticipateDoNotInitiate'
+        return await self._request('order/bulk', postdict={'orders': orders}, verb='POST')
+
+    async def amend_bulk_orders(self, orders):
+        """Amend multiple orders."""
+        return await self._request('order/bulk', postdict={'orders': orders}, verb='PUT')
+
+    async def cancel(self, orderID):
+        """Cancel an existing order, or a list of them."""
+        return await self._request('order', postdict={'orderID': orderID}, verb='DELETE')
+
+    async def http_open_orders(self, symbol=None):
+        """Get open orders via HTTP."""
+        orders = await self._request('order', query={
+            'filter': json.dumps({'ordStatus.isTerminated': False, 'symbol': symbol or self.symbols[0]}),
+            'count': 500
+        })
+        return [o for o in orders if str(o['clOrdID']).startswith(self.orderIDPrefix)]
+
+    async def _request(self, path, query=None, postdict=None, verb=None, max_retries=None):
+        """Send a request to BitMEX, retrying as market_maker.bitmex does.
+
+        Unlike the threaded connector, errors are raised rather than exiting: HTTP errors as
+        aiohttp.ClientResponseError, and requests held back for the rate limit as RateLimitDeferred."""
+        aiohttp = self.aiohttp
+        if not verb:
+            verb = 'POST' if postdict else 'GET'
+        queryString = '?' + urlencode(query) if query else ''
+        url = self.base_url + path + queryString
+        signedPath = self.basePath + path + queryString
+        body = json.dumps(postdict, separators=(',', ':')).encode('utf8') if postdict is not None else b''
+        call = self.retryPolicy.begin(verb, path, max_retries)
+
+        while True:
+            if not self.ratelimit.acquire(request_priority(verb, path)):
+                raise errors.RateLimitDeferred("Deferred %s %s, %.0f%% of the rate limit left." %
+                                               (verb, path, self.ratelimit.budget() * 100))
+            headers = self.auth.headers(verb, signedPath, body) if self.auth else {}
+            minimum = 0
+            try:
+                # encoded=True: send the URL exactly as signed.
+                async with self.session.request(verb, self.URL(url, encoded=True), data=body or None,
+                                                headers=headers) as response:
+                    self.ratelimit.update(response.headers)
+                    if response.status == 404 and verb == 'DELETE':
+                        self.logger.error("Order not found: %s" % postdict['orderID'])
+                        return None
+                    if response.status not in (429, 503):
+                        if response.status >= 400:
+                            self.logger.error("%s %s failed (%d): %s" %
+                                              (verb, path, response.status, await response.text()))
+                        response.raise_for_status()
+                        return await response.json(loads=json_loads)
+                    # 429, ratelimit: wait until X-Ratelimit-Reset. 503, temporary downtime: try again.
+                    self.logger.warning("%s %s returned %d, retrying." % (verb, path, response.status))
+                    if response.status == 429:
+                        minimum = int(response.headers.get('X-Ratelimit-Reset', 0)) - time()
+                    error = aiohttp.ClientResponseError(response.request_info, response.history,
+                                                        status=response.status, message=response.reason)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                self.logger.warning("Unable to contact the BitMEX API on %s %s (%r), retrying." % (verb, path, e))
+                error = e
+            delay = call.next_delay(minimum)
+            if delay is None:
+                raise error
+            await asyncio.sleep(delay)
+
+    #
+    # Private methods
+    #
+    def __symbol_subscriptions(self, symbol):
+        tables = self.MARKET_TABLES + (self.ACCOUNT_TABLES if self.shouldWSAuth else ())
+        return [table + ':' + symbol for table in tables]
+
+    def __subscriptions(self):
+        subscriptions = ['instrument']
+        if self.shouldWSAuth:
+            subscriptions += ['margin', 'position']
+        for symbol in self.symbols:
+            subscriptions += self.__symbol_subscriptions(symbol)
+        return subscriptions
+
+    def __synced(self):
+        tables = self.MARKET_TABLES + (self.ACCOUNT_TABLES if self.shouldWSAuth else ())
+        expected = set((table, symbol) for table in tables for symbol in self.symbols)
+        expected.add(('instrument', None))
+        if self.shouldWSAuth:
+            expected |= set([('margin', None), ('position', None)])
+        return expected <= self.partials
+
+    async def __run(self, opened):
+        """Read the realtime feed, reconnecting with backoff if it drops."""
+        attempts = 0
+        while not self.closed:
+            urlParts = list(urlparse(self.base_url))
+            urlParts[0] = urlParts[0].replace('http', 'ws')
+            urlParts[2] = '/realtime'
+            urlParts[4] = 'subscribe=' + ','.join(self.__subscriptions())
+            headers = self.auth.headers('GET', '/realtime') if self.shouldWSAuth else {}
+            try:
+                self.ws = await self.session.ws_connect(urlunparse(urlParts), headers=headers, heartbeat=30)
+            except Exception as e:
+                if not opened.done():
+                    opened.set_exception(e)
+                    return
+                self.logger.warning("Unable to reconnect to the WS: %r" % e)
+            else:
+                attempts = 0
+                self.partials = set()
+                if not opened.done():
+                    opened.set_result(None)
+                async for message in self.ws:
+                    if message.type == self.aiohttp.WSMsgType.TEXT:
+                        self.__on_message(json_loads(message.data))
+                        if self.waiting:
+                            async with self.stateChanged:
+                                self.stateChanged.notify_all()
+                    elif message.type in (self.aiohttp.WSMsgType.ERROR, self.aiohttp.WSMsgType.CLOSED):
+                        break
+            if self.closed:
+                break
+            attempts += 1
+            if attempts > self.reconnectAttempts:
+                self.logger.error("Unable to reconnect to the WS after %d attempts." % self.reconnectAttempts)
+                self.closed = True
+                break
+            delay = min(self.reconnectBackoff * 2 ** (attempts - 1), self.reconnectMaxBackoff)
+            self.logger.warning("WS connection lost. Reconnecting in %.1f seconds." % delay)
+            await asyncio.sleep(delay)
+        async with self.stateChanged:
+            self.stateChanged.notify_all()
+
+    def __on_message(self, message):
+        """Apply a realtime message to the tables."""
+        table = message.get('table')
+        action = message.get('action')
+        if 'subscribe' in message:
+            if not message['success']:
+                self.logger.error("Unable to subscribe to %s. Error: \"%s\"" %
+                                  (message['request']['args'][0], message['error']))
+            return
+        if 'status' in message:
+            self.logger.error("WS error %s: %s" % (message['status'], message.get('error')))
+            return
+        if not action:
+            return
+
+        if action == 'partial':
+            symbol = (message.get('filter') or {}).get('symbol')
+            self.__replace(table, message['keys'], symbol, message['data'])
+            self.partials.add((table, symbol))
+        elif table not in self.data:
+            return  # Nothing to apply it to until the partial arrives
+        elif not isinstance(self.data[table], KeyedTable):
+            # Tables without keys are only ever appended to; the ring buffers evict their oldest rows.
+            if action == 'insert':
+                for row in message['data']:
+                    self.__ring(table, row.get('symbol')).append(row)
+        elif action == 'insert':
+            self.data[table] += message['data']
+            if table == 'order':
+                for order in message['data']:
+                    self.__own_orders(order['symbol']).add(order)
+            # Don't trim orders, we'd lose state.
+            elif len(self.data[table]) > self.TABLE_CAPACITY * max(1, len(self.symbols)):
+                self.data[table].evict(self.TABLE_CAPACITY // 2)
+        elif action == 'update':
+            for updateData in message['data']:
+                item = self.data[table].find(updateData)
+                if item is None:
+                    continue  # No item found to update. Could happen before push
+                item.update(updateData)
+                if table == 'order':
+                    # Re-sort our own orders if this one moved; drop it if it's done.
+                    self.__own_orders(item['symbol']).update(item)
+                    # Remove canceled / filled orders
+                    if item['leavesQty'] <= 0:
+                        self.data[table].remove(item)
+        elif action == 'delete':
+            for deleteData in message['data']:
+                item = self.data[table].find(deleteData)
+                self.data[table].remove(item)
+                if table == 'order' and item is not None:
+                    self.__own_orders(item['symbol']).remove(item)
+
+        for callback, actions in self.listeners.get(table, ()):
+            if actions is None or action in actions:
+                try:
+                    result = callback(table, action, message['data'])
+                    if inspect.isawaitable(result):
+                        asyncio.ensure_future(result)
+                except Exception:
+                    self.logger.exception("Error in %s listener" % table)
+
+    def __replace(self, table, keys, symbol, rows):
+        """Replace a table's rows with a partial's: all of them, or, for a partial of one symbol, that symbol's."""
+        existing = self.data.get(table)
+        if not keys:
+            if symbol is None or not isinstance(existing, dict):
+                self.data[table] = {}
+            else:
+                self.data[table].pop(symbol, None)
+            for row in rows:
+                self.__ring(table, row.get('symbol')).append(row)
+            return
+        if symbol is not None and isinstance(existing, KeyedTable):
+            kept = [row for row in existing if row.get('symbol') != symbol]
+        else:
+            kept = []
+        self.data[table] = KeyedTable(keys, kept + rows)
+        if table == 'order':
+            # Rebuild the index for the symbols the partial covers.
+            if symbol is None:
+                self.own_orders = {}
+            else:
+                self.own_orders.pop(symbol, None)
+            for order in rows:
+                self.__own_orders(order['symbol']).add(order)
+
+    def __ring(self, table, symbol):
+        rings = self.data[table]
+        if symbol not in rings:
+            rings[symbol] = deque(maxlen=self.TABLE_CAPACITY)
+        return rings[symbol]
+
+    def __own_orders(self, symbol):
+        if symbol not in self.own_orders:
+            self.own_orders[symbol] = OpenOrders(self.orderIDPrefix)
+        return self.own_orders[symbol]
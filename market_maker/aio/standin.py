@@ -0,0 +1,243 @@
+"""A local stand-in for the BitMEX REST API and realtime feed, for tests and benchmarks. Needs aiohttp."""
+import asyncio
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from time import time
+from urllib.parse import parse_qs
+
+from market_maker.auth.APIKeyAuth import generate_signature
+
+
+# Serves enough of BitMEX to drive a connector end to end, on 127.0.0.1:
+#
+#  - GET /api/v1/instrument, /api/v1/position and /api/v1/order
+#  - POST, PUT and DELETE /api/v1/order/bulk and /api/v1/order, which create, amend and cancel
+#    orders and push the change to the realtime feed, as BitMEX does
+#  - /realtime, with partials for whatever is subscribed (in the URL or with an 'op'), and
+#    inserts for quotes sent with publish_quote()
+#
+# Requests are checked against `apiSecret` if one is given, and every response carries
+# X-Ratelimit headers. `latency` seconds are added to each REST request, to stand in for the
+# network and the exchange; requests wait concurrently, as they would on the real thing. Set
+# `sendPartials` to False to accept subscriptions but never send their data.
+#
+# Run it on the loop you're using (await start() / stop()), or on its own thread with
+# start_in_thread() when the client isn't asyncio.
+class StandInServer(object):
+
+    ACCOUNT = 1
+    RATELIMIT = 1000000
+
+    def __init__(self, symbols=('XBTUSD',), apiSecret=None, latency=0):
+        self.apiSecret = apiSecret
+        self.latency = latency
+        self.sendPartials = True
+        self.instruments = OrderedDict((symbol, {
+            'symbol': symbol, 'state': 'Open', 'tickSize': 0.5, 'multiplier': -100000000,
+            'isQuanto': False, 'isInverse': True, 'underlyingToSettleMultiplier': None,
+            'quoteToSettleMultiplier': None, 'lastPrice': 10000.0, 'bidPrice': 9999.5, 'askPrice': 10000.5,
+            'markPrice': 10000.0, 'indicativeSettlePrice': 10000.0
+        }) for symbol in symbols)
+        self.orders = OrderedDict()
+        self.sockets = []
+        self.requests = 0
+        self.runner = None
+        self.loop = None
+        self.base_url = None
+
+    async def start(self):
+        """Start serving. Returns the REST base URL, e.g. http://127.0.0.1:12345/api/v1/."""
+        from aiohttp import web
+        self.loop = asyncio.get_event_loop()
+        app = web.Application()
+        app.router.add_route('GET', '/realtime', self.__realtime)
+        app.router.add_route('*', '/api/v1/{path:.*}', self.__rest)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.base_url = 'http://127.0.0.1:%d/api/v1/' % port
+        return self.base_url
+
+    async def stop(self):
+        for ws in list(self.sockets):
+            await ws.close()
+        await self.runner.cleanup()
+
+    def start_in_thread(self):
+        """Serve from a new event loop on a daemon thread. Returns the REST base URL."""
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            asyncio.get_event_loop().run_until_complete(self.start())
+            started.set()
+            asyncio.get_event_loop().run_forever()
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        started.wait()
+        return self.base_url
+
+    def publish_quote(self, symbol, bidPrice, askPrice):
+        """Push a quote (and the matching instrument update) to every subscriber of `symbol`."""
+        self.instruments[symbol].update({'bidPrice': bidPrice, 'askPrice': askPrice})
+        self.__publish('quote', 'insert', [{'timestamp': timestamp(), 'symbol': symbol,
+                                            'bidPrice': bidPrice, 'askPrice': askPrice,
+                                            'bidSize': 100, 'askSize': 100}], symbol)
+        self.__publish('instrument', 'update', [{'symbol': symbol, 'bidPrice': bidPrice, 'askPrice': askPrice}])
+
+    #
+    # REST
+    #
+    async def __rest(self, request):
+        from aiohttp import web
+        self.requests += 1
+        body = await request.read()
+        headers = {
+            'X-Ratelimit-Limit': str(self.RATELIMIT),
+            'X-Ratelimit-Remaining': str(self.RATELIMIT - 1),
+            'X-Ratelimit-Reset': str(int(time()) + 1)
+        }
+        if self.apiSecret is not None:
+            signature = generate_signature(self.apiSecret, request.method, request.raw_path,
+                                           request.headers.get('api-expires', ''), body)
+            if request.headers.get('api-signature') != signature:
+                return web.json_response({'error': {'message': 'Signature not valid.', 'name': 'HTTPError'}},
+                                         status=401, headers=headers)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        path = request.match_info['path']
+        postdict = json.loads(body.decode('utf8')) if body else {}
+        handler = {
+            ('GET', 'instrument'): self.__get_instruments,
+            ('GET', 'position'): lambda query, postdict: [],
+            ('GET', 'order'): self.__get_orders,
+            ('POST', 'order/bulk'): self.__create_orders,
+            ('PUT', 'order/bulk'): self.__amend_orders,
+            ('DELETE', 'order'): self.__cancel_orders,
+        }.get((request.method, path))
+        if handler is None:
+            return web.json_response({'error': {'message': 'Not Found', 'name': 'HTTPError'}},
+                                     status=404, headers=headers)
+        return web.json_response(handler(request.query, postdict), headers=headers)
+
+    def __get_instruments(self, query, postdict):
+        return list(self.instruments.values())
+
+    def __get_orders(self, query, postdict):
+        filter = json.loads(query.get('filter', '{}'))
+        return [order for order in self.orders.values() if all(
+            order.get(field) == value for field, value in filter.items() if field in order)]
+
+    def __create_orders(self, query, postdict):
+        created = []
+        for order in postdict['orders']:
+            order = dict(order, orderID=str(uuid.uuid4()), account=self.ACCOUNT, ordStatus='New',
+                         leavesQty=order['orderQty'], cumQty=0, timestamp=timestamp())
+            order.setdefault('side', 'Buy' if order['orderQty'] > 0 else 'Sell')
+            self.orders[order['orderID']] = order
+            created.append(order)
+        self.__publish_orders('insert', created)
+        return created
+
+    def __amend_orders(self, query, postdict):
+        amended = []
+        for amend in postdict['orders']:
+            order = self.orders[amend['orderID']]
+            order.update(amend)
+            if 'orderQty' in amend:
+                order['leavesQty'] = amend['orderQty'] - order['cumQty']
+            amended.append(order)
+        self.__publish_orders('update', amended)
+        return amended
+
+    def __cancel_orders(self, query, postdict):
+        orderIDs = postdict['orderID'] if isinstance(postdict['orderID'], list) else [postdict['orderID']]
+        canceled = []
+        for orderID in orderIDs:
+            order = self.orders.pop(orderID, None)
+            if order is not None:
+                order.update(ordStatus='Canceled', leavesQty=0)
+                canceled.append(order)
+        self.__publish_orders('update', canceled)
+        return canceled
+
+    def __publish_orders(self, action, orders):
+        for symbol in set(order['symbol'] for order in orders):
+            self.__publish('order', action, [dict(order) for order in orders if order['symbol'] == symbol], symbol)
+
+    #
+    # Realtime
+    #
+    async def __realtime(self, request):
+        from aiohttp import web, WSMsgType
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        ws.subscriptions = set()
+        self.sockets.append(ws)
+        try:
+            await ws.send_json({'info': 'Welcome to the BitMEX Realtime API.'})
+            subscribe = ','.join(parse_qs(request.query_string).get('subscribe', []))
+            if subscribe:
+                await self.__subscribe(ws, subscribe.split(','))
+            async for message in ws:
+                if message.type == WSMsgType.TEXT:
+                    command = json.loads(message.data)
+                    if command.get('op') == 'subscribe':
+                        await self.__subscribe(ws, command['args'])
+        finally:
+            self.sockets.remove(ws)
+        return ws
+
+    async def __subscribe(self, ws, subscriptions):
+        for subscription in subscriptions:
+            table, _, symbol = subscription.partition(':')
+            ws.subscriptions.add((table, symbol or None))
+            await ws.send_json({'success': True, 'subscribe': subscription})
+            if not self.sendPartials:
+                continue
+            keys, rows = self.__image(table, symbol or None)
+            message = {'table': table, 'action': 'partial', 'keys': keys, 'data': rows}
+            if symbol:
+                message['filter'] = {'symbol': symbol}
+            await ws.send_json(message)
+
+    def __image(self, table, symbol):
+        matches = lambda row: symbol is None or row.get('symbol') == symbol  # noqa: E731
+        if table == 'instrument':
+            return ['symbol'], [dict(row) for row in self.instruments.values() if matches(row)]
+        if table == 'order':
+            return ['orderID'], [dict(row) for row in self.orders.values() if matches(row)]
+        if table == 'position':
+            return ['account', 'symbol', 'currency'], []
+        if table == 'margin':
+            return ['account', 'currency'], [{'account': self.ACCOUNT, 'currency': 'XBt', 'marginBalance': 0}]
+        if table == 'quote' and symbol in self.instruments:
+            instrument = self.instruments[symbol]
+            return [], [{'timestamp': timestamp(), 'symbol': symbol, 'bidPrice': instrument['bidPrice'],
+                         'askPrice': instrument['askPrice'], 'bidSize': 100, 'askSize': 100}]
+        if table == 'trade' and symbol in self.instruments:
+            return [], [{'timestamp': timestamp(), 'symbol': symbol, 'side': 'Buy', 'size': 1,
+                         'price': self.instruments[symbol]['lastPrice']}]
+        if table == 'orderBook10' and symbol in self.instruments:
+            instrument = self.instruments[symbol]
+            return ['symbol'], [{'symbol': symbol, 'timestamp': timestamp(),
+                                 'bids': [[instrument['bidPrice'], 100]], 'asks': [[instrument['askPrice'], 100]]}]
+        return [], []
+
+    def __publish(self, table, action, rows, symbol=None):
+        message = json.dumps({'table': table, 'action': action, 'data': rows})
+        for ws in self.sockets:
+            if (table, symbol) in ws.subscriptions or (table, None) in ws.subscriptions:
+                asyncio.ensure_future(ws.send_str(message))
+
+
+def timestamp():
+    return datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
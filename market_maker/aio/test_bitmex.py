@@ -0,0 +1,118 @@
+import asyncio
+import unittest
+
+try:
+    import aiohttp  # noqa: F401
+except ImportError:
+    aiohttp = None
+
+from market_maker.aio.bitmex import AsyncBitMEX
+from market_maker.aio.standin import StandInServer
+
+SECRET = 'chNOOS4KvNXR_Xq4k4c9qsfoKWvnDecLATCRlcBwyKDYnWgO'
+
+
+@unittest.skipIf(aiohttp is None, "needs aiohttp")
+class TestAsyncBitMEX(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = StandInServer(['XBTUSD', 'ETHUSD'], apiSecret=SECRET)
+        base_url = await self.server.start()
+        self.bitmex = AsyncBitMEX(base_url, ['XBTUSD'], 'key', SECRET, timeout=2)
+        await asyncio.wait_for(self.bitmex.connect(), 5)
+
+    async def asyncTearDown(self):
+        await self.bitmex.close()
+        await self.server.stop()
+
+    async def test_market_data(self):
+        self.assertEqual(self.bitmex.instrument('XBTUSD')['tickSize'], 0.5)
+        self.assertEqual(self.bitmex.ticker_data('XBTUSD')['mid'], 10000)
+        self.assertEqual(self.bitmex.position('XBTUSD')['currentQty'], 0)
+        self.assertEqual(len(self.bitmex.recent_trades('XBTUSD')), 1)
+
+    async def test_orders_round_trip(self):
+        created = await self.bitmex.create_bulk_orders([{'price': 9990.0, 'orderQty': 100, 'side': 'Buy'},
+                                                        {'price': 10010.0, 'orderQty': 100, 'side': 'Sell'}])
+        self.assertEqual([order['symbol'] for order in created], ['XBTUSD', 'XBTUSD'])
+        await self.bitmex.wait_for(lambda: len(self.bitmex.open_orders('XBTUSD')) == 2, 2)
+
+        await self.bitmex.amend_bulk_orders([{'orderID': created[0]['orderID'], 'price': 9995.0}])
+        await self.bitmex.wait_for(
+            lambda: sorted(o['price'] for o in self.bitmex.open_orders()) == [9995.0, 10010.0], 2)
+
+        await self.bitmex.cancel([order['orderID'] for order in created])
+        await self.bitmex.wait_for(lambda: not self.bitmex.open_orders(), 2)
+        self.assertEqual(await self.bitmex.http_open_orders(), [])
+
+    async def test_own_orders_by_symbol(self):
+        await asyncio.wait_for(self.bitmex.subscribe('ETHUSD'), 2)
+        await self.bitmex.create_bulk_orders([{'price': 9990.0, 'orderQty': 100, 'side': 'Buy'},
+                                              {'price': 9995.0, 'orderQty': 100, 'side': 'Buy'}])
+        await self.bitmex.create_bulk_orders([{'price': 900.0, 'orderQty': 100, 'side': 'Buy'}], 'ETHUSD')
+        await self.bitmex.wait_for(lambda: len(self.bitmex.open_orders()) == 3, 2)
+        self.assertEqual([o['price'] for o in self.bitmex.open_orders('XBTUSD')], [9990.0, 9995.0])
+        self.assertEqual(self.bitmex.best_open_order('XBTUSD', 'Buy')['price'], 9995.0)
+        self.assertEqual(self.bitmex.best_open_order('ETHUSD', 'Buy')['price'], 900.0)
+        self.assertIsNone(self.bitmex.best_open_order('XBTUSD', 'Sell'))
+        self.assertEqual(self.bitmex.open_orders('LTCUSD'), ())
+
+        best = self.bitmex.best_open_order('XBTUSD', 'Buy')
+        await self.bitmex.cancel(best['orderID'])
+        await self.bitmex.wait_for(lambda: len(self.bitmex.open_orders('XBTUSD')) == 1, 2)
+        self.assertEqual(self.bitmex.best_open_order('XBTUSD', 'Buy')['price'], 9990.0)
+
+    async def test_trades_by_symbol(self):
+        capacity = self.bitmex.TABLE_CAPACITY
+        await asyncio.wait_for(self.bitmex.subscribe('ETHUSD'), 2)
+        # A busy symbol doesn't push a quiet one's trades out.
+        self.bitmex._AsyncBitMEX__on_message({'table': 'trade', 'action': 'insert', 'data': [
+            {'symbol': 'XBTUSD', 'price': 10000.0 + i, 'size': 1} for i in range(capacity + 10)]})
+        self.assertEqual(len(self.bitmex.recent_trades('XBTUSD')), capacity)
+        self.assertEqual(self.bitmex.recent_trades('XBTUSD')[-1]['price'], 10000.0 + capacity + 9)
+        self.assertEqual(len(self.bitmex.recent_trades('ETHUSD')), 1)
+        self.assertEqual(len(self.bitmex.recent_trades('LTCUSD')), 0)
+
+    async def test_connect_fails_without_data(self):
+        self.server.sendPartials = False
+        bitmex = AsyncBitMEX(self.server.base_url, ['XBTUSD'], 'key', SECRET, timeout=2, reconnectAttempts=0)
+        connecting = asyncio.ensure_future(bitmex.connect())
+        await asyncio.sleep(0.2)
+        self.assertFalse(connecting.done())
+        # The feed drops before the partials arrive: connect() gives up rather than carrying on without data.
+        for ws in list(self.server.sockets):
+            await ws.close()
+        with self.assertRaises(Exception) as raised:
+            await asyncio.wait_for(connecting, 2)
+        self.assertIn('Unable to get market data', str(raised.exception))
+        await bitmex.close()
+
+    async def test_many_requests_in_flight(self):
+        self.server.latency = 0.1
+        started = asyncio.get_event_loop().time()
+        results = await asyncio.gather(*[
+            self.bitmex.create_bulk_orders([{'price': 9000.0 + i, 'orderQty': 100, 'side': 'Buy'}])
+            for i in range(20)])
+        self.assertEqual(len(results), 20)
+        # Sent one after another, these would take 2 seconds.
+        self.assertLess(asyncio.get_event_loop().time() - started, 1)
+
+    async def test_subscribe_and_listen(self):
+        quotes = []
+        self.bitmex.add_listener('quote', lambda table, action, data: quotes.extend(data), ['insert'])
+        await asyncio.wait_for(self.bitmex.subscribe('ETHUSD'), 2)
+        self.assertEqual(self.bitmex.instrument('ETHUSD')['symbol'], 'ETHUSD')
+        self.server.publish_quote('ETHUSD', 9000.0, 9001.0)
+        self.server.publish_quote('XBTUSD', 10001.0, 10002.0)
+        await self.bitmex.wait_for(lambda: len(quotes) == 2, 2)
+        self.assertEqual(set(quote['symbol'] for quote in quotes), set(['ETHUSD', 'XBTUSD']))
+
+    async def test_bad_signature(self):
+        self.bitmex.auth.signer = type(self.bitmex.auth.signer)('not the secret')
+        with self.assertRaises(aiohttp.ClientResponseError) as raised:
+            await self.bitmex.create_bulk_orders([{'price': 9990.0, 'orderQty': 100, 'side': 'Buy'}])
+        self.assertEqual(raised.exception.status, 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
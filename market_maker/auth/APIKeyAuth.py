@@ -60,3 +60,22 @@ def generate_signature(secret, verb, url, nonce, data):
 
     signature = hmac.new(bytes(secret, 'utf8'), bytes(message, 'utf8'), digestmod=hashlib.sha256).hexdigest()
     return signature
+
+
+class Signer(object):
+
+    """Signs requests with one API secret, as generate_signature does, but faster.
+
+    The secret is keyed into an HMAC once; each signature starts from a copy of it. The path is
+    passed already split from the host (e.g. '/api/v1/order?filter=...'), and the body as the exact
+    bytes that will be sent, so nothing is parsed or re-encoded per request."""
+
+    def __init__(self, apiSecret):
+        self.hmac = hmac.new(bytes(apiSecret, 'utf8'), digestmod=hashlib.sha256)
+
+    def sign(self, verb, path, expires, body=b''):
+        """Hex HMAC_SHA256(secret, verb + path + expires + body). `body` is bytes."""
+        mac = self.hmac.copy()
+        mac.update((verb + path + str(expires)).encode('utf8'))
+        mac.update(body)
+        return mac.hexdigest()
@@ -1,6 +1,6 @@
 from requests.auth import AuthBase
 import time
-from market_maker.auth.APIKeyAuth import generate_signature
+from market_maker.auth.APIKeyAuth import Signer
 
 
 class APIKeyAuthWithExpires(AuthBase):
@@ -11,6 +11,7 @@ class APIKeyAuthWithExpires(AuthBase):
         """Init with Key & Secret."""
         self.apiKey = apiKey
         self.apiSecret = apiSecret
+        self.signer = Signer(apiSecret)
 
     def __call__(self, r):
         """
@@ -20,9 +21,18 @@ class APIKeyAuthWithExpires(AuthBase):
         For more details, see https://www.bitmex.com/app/apiKeys
         """
         # modify and return the request
-        expires = int(round(time.time()) + 5)  # 5s grace period in case of clock skew
-        r.headers['api-expires'] = str(expires)
-        r.headers['api-key'] = self.apiKey
-        r.headers['api-signature'] = generate_signature(self.apiSecret, r.method, r.url, expires, r.body or '')
+        body = r.body or b''
+        if not isinstance(body, bytes):
+            body = body.encode('utf8')
+        r.headers.update(self.headers(r.method, r.path_url, body))
 
         return r
+
+    def headers(self, verb, path, body=b''):
+        """The auth headers for a request to `path` (relative to the host, with any query) with `body` (bytes)."""
+        expires = int(round(time.time()) + 5)  # 5s grace period in case of clock skew
+        return {
+            'api-expires': str(expires),
+            'api-key': self.apiKey,
+            'api-signature': self.signer.sign(verb, path, expires, body)
+        }
@@ -0,0 +1,47 @@
+from __future__ import absolute_import
+
+import unittest
+
+import requests
+
+from market_maker.auth.APIKeyAuth import Signer, generate_signature
+from market_maker.auth.APIKeyAuthWithExpires import APIKeyAuthWithExpires
+
+# The example secret and signatures from the BitMEX API key docs.
+SECRET = 'chNOOS4KvNXR_Xq4k4c9qsfoKWvnDecLATCRlcBwyKDYnWgO'
+VECTORS = [
+    ('GET', '/api/v1/instrument?filter=%7B%22symbol%22%3A+%22XBTM15%22%7D', 1518064237, b'',
+     'e2f422547eecb5b3cb29ade2127e21b858b235b386bfa45e1c1756eb3383919f'),
+    ('POST', '/api/v1/order', 1518064238,
+     b'{"symbol":"XBTM15","price":219.0,"clOrdID":"mm_bitmex_1a/oemUeQ4CAJZgP3fjHsA","orderQty":98}',
+     '1749cd2ccae4aa49048ae09f0b95110cee706e0944e6a14ad0b3a8cb45bd336b'),
+]
+
+
+class TestSigner(unittest.TestCase):
+
+    def test_reference_vectors(self):
+        signer = Signer(SECRET)
+        for verb, path, expires, body, signature in VECTORS:
+            self.assertEqual(signer.sign(verb, path, expires, body), signature)
+            self.assertEqual(generate_signature(SECRET, verb, path, expires, body), signature)
+
+    def test_matches_generate_signature(self):
+        # The example in the generate_signature comments.
+        signer = Signer(SECRET)
+        data = '{"symbol":"XBTZ14","quantity":1,"price":395.01}'
+        self.assertEqual(signer.sign('POST', '/api/v1/order', 1416993995705, data.encode('utf8')),
+                         generate_signature(SECRET, 'POST', 'https://www.bitmex.com/api/v1/order', 1416993995705, data))
+        # Signing again starts from the keyed state, not from the last message.
+        self.assertEqual(signer.sign('GET', '/api/v1/instrument', 1, b''), signer.sign('GET', '/api/v1/instrument', 1))
+
+    def test_auth_signs_prepared_requests(self):
+        auth = APIKeyAuthWithExpires('key', SECRET)
+        r = requests.Request('POST', 'https://www.bitmex.com/api/v1/order?a=1', json={'price': 1}, auth=auth).prepare()
+        self.assertEqual(r.headers['api-key'], 'key')
+        self.assertEqual(r.headers['api-signature'],
+                         generate_signature(SECRET, 'POST', r.url, int(r.headers['api-expires']), r.body))
+
+
+if __name__ == '__main__':
+    unittest.main()
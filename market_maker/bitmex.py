@@ -9,7 +9,14 @@ import uuid
 import logging
 from market_maker.auth import APIKeyAuthWithExpires
 from market_maker.utils import constants, errors
+from market_maker.utils.coalesce import AmendCoalescer
+from market_maker.utils.ratelimit import CANCEL, RateLimitGovernor, request_priority
+from market_maker.utils.retry import RetryPolicy
+from market_maker.utils.transport import Transport
 from market_maker.ws.ws_thread import BitMEXWebsocket
+from future.standard_library import hooks
+with hooks():  # Python 2/3 compat
+    from urllib.parse import urlencode, urlparse
 
 
 # https://www.bitmex.com/api/explorer/
@@ -18,7 +25,8 @@ class BitMEX(object):
     """BitMEX API Connector."""
 
     def __init__(self, base_url=None, symbol=None, apiKey=None, apiSecret=None,
-                 orderIDPrefix='mm_bitmex_', shouldWSAuth=True, postOnly=False):
+                 orderIDPrefix='mm_bitmex_', shouldWSAuth=True, postOnly=False, httpPoolSize=4,
+                 ratelimit=None, amendWindow=0, transport=None, retryPolicy=None):
         """Init connector."""
         self.logger = logging.getLogger('root')
         self.base_url = base_url
@@ -30,10 +38,18 @@ class BitMEX(object):
                             )
         self.apiKey = apiKey
         self.apiSecret = apiSecret
+        # Auth: API Key/Secret. Requests are signed against the path from the host, e.g. /api/v1/order.
+        # Without a secret there's nothing to sign with; requests then go out unauthenticated.
+        self.auth = APIKeyAuthWithExpires(apiKey, apiSecret) if apiSecret else None
+        self.basePath = urlparse(base_url).path
         if len(orderIDPrefix) > 13:
             raise ValueError("settings.ORDERID_PREFIX must be at most 13 characters long!")
         self.orderIDPrefix = orderIDPrefix
-        self.retries = 0  # initialize counter
+        self.retryPolicy = retryPolicy or RetryPolicy()
+        # Rations the REST rate limit between cancels, amends and creates.
+        self.ratelimit = ratelimit or RateLimitGovernor()
+        # Amends to the same orders within amendWindow seconds of each other go out as one request.
+        self.amends = AmendCoalescer(self._amend_bulk_orders, amendWindow) if amendWindow else None
 
         # Prepare HTTPS session
         self.session = requests.Session()
@@ -41,15 +57,21 @@ class BitMEX(object):
         self.session.headers.update({'user-agent': 'liquidbot-' + constants.VERSION})
         self.session.headers.update({'content-type': 'application/json'})
         self.session.headers.update({'accept': 'application/json'})
+        # Order batches can be sent concurrently (see market_maker.utils.dispatch); keep a connection for each.
+        self.transport = transport or Transport(httpPoolSize)
+        self.transport.mount(self.session)
 
         # Create websocket for streaming data
         self.ws = BitMEXWebsocket()
-        self.ws.connect(base_url, symbol, shouldAuth=shouldWSAuth)
+        self.ws.connect(base_url, symbol, shouldAuth=shouldWSAuth, clOrdIDPrefix=orderIDPrefix)
 
     def __del__(self):
         self.exit()
 
     def exit(self):
+        if self.amends is not None:
+            self.amends.close()
+        self.transport.close()
         self.ws.exit()
 
     #
@@ -65,6 +87,10 @@ class BitMEX(object):
         """Get an instrument's details."""
         return self.ws.get_instrument(symbol)
 
+    def instrument_constants(self, symbol):
+        """Get an instrument's derived constants (tickLog, tickSize, multiplier, futureType)."""
+        return self.ws.get_instrument_constants(symbol)
+
     def instruments(self, filter=None):
         query = {}
         if filter is not None:
@@ -75,6 +101,22 @@ class BitMEX(object):
         """Get market depth / orderbook."""
         return self.ws.market_depth(symbol)
 
+    def best_bid(self, symbol=None):
+        """Get (price, size) of the best bid in the local order book."""
+        return self.ws.best_bid(symbol or self.symbol)
+
+    def best_ask(self, symbol=None):
+        """Get (price, size) of the best ask in the local order book."""
+        return self.ws.best_ask(symbol or self.symbol)
+
+    def size_within(self, side, ticks, tickSize, symbol=None):
+        """Get the total size within `ticks` ticks of the best price on a side of the order book."""
+        return self.ws.size_within(symbol or self.symbol, side, ticks, tickSize)
+
+    def price_to_fill(self, side, quantity, symbol=None):
+        """Get the worst price we'd trade at taking `quantity` from a side of the order book."""
+        return self.ws.price_to_fill(symbol or self.symbol, side, quantity)
+
     def recent_trades(self,symbol):
         """Get recent trades.
 
@@ -90,6 +132,15 @@ class BitMEX(object):
         return self.ws.recent_trades()
     def last_close(self):
         return self.ws.last_close()[-1]
+
+    def add_listener(self, table, callback, actions=None):
+        """Call callback(table, action, data) on the WS thread whenever `table` changes."""
+        self.ws.add_listener(table, callback, actions)
+
+    def remove_listener(self, table, callback):
+        """Stop calling a callback registered with add_listener()."""
+        self.ws.remove_listener(table, callback)
+
     #
     # Authentication required methods
     #
@@ -162,7 +213,20 @@ class BitMEX(object):
 
     @authentication_required
     def amend_bulk_orders(self, orders):
-        """Amend multiple orders."""
+        """Amend multiple orders. If amends are being coalesced, raises AmendsQueued when they were queued."""
+        if self.amends is not None:
+            return self.amends.submit(orders)
+        return self._amend_bulk_orders(orders)
+
+    def retry_stats(self):
+        """Requests, retries, failures and time spent waiting to retry, per endpoint."""
+        return self.retryPolicy.stats()
+
+    def amend_stats(self):
+        """Counters from amend coalescing, or None if it's off."""
+        return self.amends.stats() if self.amends is not None else None
+
+    def _amend_bulk_orders(self, orders):
         # Note rethrow; if this fails, we want to catch it and re-tick
         return self._curl_bitmex(path='order/bulk', postdict={'orders': orders}, verb='PUT', rethrow_errors=True)
 
@@ -181,6 +245,29 @@ class BitMEX(object):
         """Get open orders."""
         return self.ws.open_orders(self.orderIDPrefix)
 
+    @authentication_required
+    def best_open_order(self, side):
+        """Get our highest open buy or lowest open sell. None if we have no orders on that side."""
+        return self.ws.best_open_order(self.orderIDPrefix, side)
+
+    @authentication_required
+    def open_order_count(self, side):
+        """Count our open orders on one side."""
+        return self.ws.open_order_count(self.orderIDPrefix, side)
+
+    @authentication_required
+    def snapshot(self):
+        """Get a consistent, read-only view of our instrument, position, margin, orders and last trade."""
+        return self.ws.snapshot(self.symbol, self.orderIDPrefix)
+
+    def is_stale(self, snapshot):
+        """Check whether the realtime data has changed since a snapshot was taken."""
+        return self.ws.is_stale(snapshot)
+
+    def ratelimit_budget(self):
+        """The fraction of the REST rate limit we have left, or None before the first response."""
+        return self.ratelimit.budget()
+
     @authentication_required
     def http_open_orders(self):
         """Get open orders via HTTP. Used on close to ensure we catch them all."""
@@ -191,7 +278,9 @@ class BitMEX(object):
                 'filter': json.dumps({'ordStatus.isTerminated': False, 'symbol': self.symbol}),
                 'count': 500
             },
-            verb="GET"
+            verb="GET",
+            # This is how we find the orders to cancel, so it mustn't be held back any more than the cancel.
+            priority=CANCEL
         )
         # Only return orders that start with our clOrdID prefix.
         return [o for o in orders if str(o['clOrdID']).startswith(self.orderIDPrefix)]
@@ -199,6 +288,8 @@ class BitMEX(object):
     @authentication_required
     def cancel(self, orderID):
         """Cancel an existing order."""
+        if self.amends is not None:
+            self.amends.discard(orderID if isinstance(orderID, list) else [orderID])
         path = "order"
         postdict = {
             'orderID': orderID,
@@ -217,10 +308,18 @@ class BitMEX(object):
         return self._curl_bitmex(path=path, postdict=postdict, verb="POST", max_retries=0)
 
     def _curl_bitmex(self, path, query=None, postdict=None, timeout=5, verb=None, rethrow_errors=False,
-                     max_retries=None):
-        """Send a request to BitMEX Servers."""
+                     max_retries=None, priority=None):
+        """Send a request to BitMEX Servers.
+
+        `priority` is the request's claim on the rate limit (see market_maker.utils.ratelimit); by
+        default it's worked out from the verb and path."""
         # Handle URL
-        url = self.base_url + path
+        queryString = '?' + urlencode(query) if query else ''
+        url = self.base_url + path + queryString
+        signedPath = self.basePath + path + queryString
+
+        # Serialize the body once, compactly; these are the bytes that are both signed and sent.
+        body = json.dumps(postdict, separators=(',', ':')).encode('utf8') if postdict is not None else b''
 
         # Default to POST if data is attached, GET otherwise
         if not verb:
@@ -230,11 +329,10 @@ class BitMEX(object):
         # In the future we could allow retrying PUT, so long as 'leavesQty' is not used (not idempotent),
         # or you could change the clOrdID (set {"clOrdID": "new", "origClOrdID": "old"}) so that an amend
         # can't erroneously be applied twice.
-        if max_retries is None:
-            max_retries = 0 if verb in ['POST', 'PUT'] else 3
-
-        # Auth: API Key/Secret
-        auth = APIKeyAuthWithExpires(self.apiKey, self.apiSecret)
+        # Retries are counted for this call alone (see market_maker.utils.retry).
+        call = self.retryPolicy.begin(verb, path, max_retries)
+        if priority is None:
+            priority = request_priority(verb, path)
 
         def exit_or_throw(e):
             if rethrow_errors:
@@ -242,117 +340,125 @@ class BitMEX(object):
             else:
                 exit(1)
 
-        def retry():
-            self.retries += 1
-            if self.retries > max_retries:
+        def wait_to_retry(minimum=0):
+            delay = call.next_delay(minimum)
+            if delay is None:
                 raise Exception("Max retries on %s (%s) hit, raising." % (path, json.dumps(postdict or '')))
-            return self._curl_bitmex(path, query, postdict, timeout, verb, rethrow_errors, max_retries)
-
-        # Make the request
-        response = None
-        try:
-            self.logger.info("sending req to %s: %s" % (url, json.dumps(postdict or query or '')))
-            req = requests.Request(verb, url, json=postdict, auth=auth, params=query)
-            prepped = self.session.prepare_request(req)
-            response = self.session.send(prepped, timeout=timeout)
-            # Make non-200s throw
-            response.raise_for_status()
-
-        except requests.exceptions.HTTPError as e:
-            if response is None:
-                raise e
+            time.sleep(delay)
+
+        # A retry goes round again, rather than recursing.
+        while True:
+            # Near the rate limit, hold back creates (and then amends) so cancels can still get through.
+            # The caller skips this batch; the next pass of the loop works out what's still needed.
+            if not self.ratelimit.acquire(priority):
+                raise errors.RateLimitDeferred("Deferred %s %s, %.0f%% of the rate limit left." %
+                                               (verb, path, self.ratelimit.budget() * 100))
+
+            # Make the request
+            response = None
+            try:
+                self.logger.info("sending req to %s: %s" % (url, body.decode('utf8')))
+                headers = self.auth.headers(verb, signedPath, body) if self.auth else {}
+                req = requests.Request(verb, url, data=body or None, headers=headers)
+                prepped = self.session.prepare_request(req)
+                response = self.session.send(prepped, timeout=timeout)
+                self.ratelimit.update(response.headers)
+                # Make non-200s throw
+                response.raise_for_status()
+
+            except requests.exceptions.HTTPError as e:
+                if response is None:
+                    raise e
+
+                # 401 - Auth error. This is fatal.
+                if response.status_code == 401:
+                    self.logger.error("API Key or Secret incorrect, please check and restart.")
+                    self.logger.error("Error: " + response.text)
+                    if postdict:
+                        self.logger.error(postdict)
+                    # Always exit, even if rethrow_errors, because this is fatal
+                    exit(1)
+
+                # 404, can be thrown if order canceled or does not exist.
+                elif response.status_code == 404:
+                    if verb == 'DELETE':
+                        self.logger.error("Order not found: %s" % postdict['orderID'])
+                        return
+                    self.logger.error("Unable to contact the BitMEX API (404). " +
+                                      "Request: %s \n %s" % (url, json.dumps(postdict)))
+                    exit_or_throw(e)
+
+                # 429, ratelimit; cancel orders & wait until X-Ratelimit-Reset
+                elif response.status_code == 429:
+                    self.logger.error("Ratelimited on current request. Sleeping, then trying again. Try fewer " +
+                                      "order pairs or contact support@bitmex.com to raise your limits. " +
+                                      "Request: %s \n %s" % (url, json.dumps(postdict)))
+
+                    # Figure out how long we need to wait.
+                    ratelimit_reset = response.headers['X-Ratelimit-Reset']
+                    to_sleep = int(ratelimit_reset) - int(time.time())
+                    reset_str = datetime.datetime.fromtimestamp(int(ratelimit_reset)).strftime('%X')
+
+                    # We're ratelimited, and we may be waiting for a long time. Cancel orders.
+                    self.logger.warning("Canceling all known orders in the meantime.")
+                    self.cancel([o['orderID'] for o in self.open_orders()])
+
+                    self.logger.error("Your ratelimit will reset at %s. Sleeping for %d seconds." % (reset_str, to_sleep))
+
+                    # Retry the request.
+                    wait_to_retry(to_sleep)
+                    continue
+
+                # 503 - BitMEX temporary downtime, likely due to a deploy. Try again
+                elif response.status_code == 503:
+                    self.logger.warning("Unable to contact the BitMEX API (503), retrying. " +
+                                        "Request: %s \n %s" % (url, json.dumps(postdict)))
+                    wait_to_retry()
+                    continue
+
+                elif response.status_code == 400:
+                    error = response.json()['error']
+                    message = error['message'].lower() if error else ''
+
+                    # Duplicate clOrdID: that's fine, probably a deploy, go get the order(s) and return it
+                    if 'duplicate clordid' in message:
+                        orders = postdict['orders'] if 'orders' in postdict else postdict
+
+                        IDs = json.dumps({'clOrdID': [order['clOrdID'] for order in orders]})
+                        orderResults = self._curl_bitmex('/order', query={'filter': IDs}, verb='GET')
+
+                        for i, order in enumerate(orderResults):
+                            if (
+                                    order['orderQty'] != abs(postdict['orderQty']) or
+                                    order['side'] != ('Buy' if postdict['orderQty'] > 0 else 'Sell') or
+                                    order['price'] != postdict['price'] or
+                                    order['symbol'] != postdict['symbol']):
+                                raise Exception('Attempted to recover from duplicate clOrdID, but order returned from API ' +
+                                                'did not match POST.\nPOST data: %s\nReturned order: %s' % (
+                                                    json.dumps(orders[i]), json.dumps(order)))
+                        # All good
+                        return orderResults
+
+                    elif 'insufficient available balance' in message:
+                        self.logger.error('Account out of funds. The message: %s' % error['message'])
+                        exit_or_throw(Exception('Insufficient Funds'))
+
+
+                # If we haven't returned or re-raised yet, we get here.
+                self.logger.error("Unhandled Error: %s: %s" % (e, response.text))
+                self.logger.error("Endpoint was: %s %s: %s" % (verb, path, json.dumps(postdict)))
+                exit_or_throw(e)
 
-            # 401 - Auth error. This is fatal.
-            if response.status_code == 401:
-                self.logger.error("API Key or Secret incorrect, please check and restart.")
-                self.logger.error("Error: " + response.text)
-                if postdict:
-                    self.logger.error(postdict)
-                # Always exit, even if rethrow_errors, because this is fatal
-                exit(1)
+            except requests.exceptions.Timeout as e:
+                # Timeout, re-run this request
+                self.logger.warning("Timed out on request: %s (%s), retrying..." % (path, json.dumps(postdict or '')))
+                wait_to_retry()
+                continue
 
-            # 404, can be thrown if order canceled or does not exist.
-            elif response.status_code == 404:
-                if verb == 'DELETE':
-                    self.logger.error("Order not found: %s" % postdict['orderID'])
-                    return
-                self.logger.error("Unable to contact the BitMEX API (404). " +
-                                  "Request: %s \n %s" % (url, json.dumps(postdict)))
-                exit_or_throw(e)
+            except requests.exceptions.ConnectionError as e:
+                self.logger.warning(("Unable to contact the BitMEX API (%s). Please check the URL. Retrying. " +
+                                     "Request: %s %s \n %s") % (e, url, json.dumps(postdict)))
+                wait_to_retry()
+                continue
 
-            # 429, ratelimit; cancel orders & wait until X-Ratelimit-Reset
-            elif response.status_code == 429:
-                self.logger.error("Ratelimited on current request. Sleeping, then trying again. Try fewer " +
-                                  "order pairs or contact support@bitmex.com to raise your limits. " +
-                                  "Request: %s \n %s" % (url, json.dumps(postdict)))
-
-                # Figure out how long we need to wait.
-                ratelimit_reset = response.headers['X-Ratelimit-Reset']
-                to_sleep = int(ratelimit_reset) - int(time.time())
-                reset_str = datetime.datetime.fromtimestamp(int(ratelimit_reset)).strftime('%X')
-
-                # We're ratelimited, and we may be waiting for a long time. Cancel orders.
-                self.logger.warning("Canceling all known orders in the meantime.")
-                self.cancel([o['orderID'] for o in self.open_orders()])
-
-                self.logger.error("Your ratelimit will reset at %s. Sleeping for %d seconds." % (reset_str, to_sleep))
-                time.sleep(to_sleep)
-
-                # Retry the request.
-                return retry()
-
-            # 503 - BitMEX temporary downtime, likely due to a deploy. Try again
-            elif response.status_code == 503:
-                self.logger.warning("Unable to contact the BitMEX API (503), retrying. " +
-                                    "Request: %s \n %s" % (url, json.dumps(postdict)))
-                time.sleep(3)
-                return retry()
-
-            elif response.status_code == 400:
-                error = response.json()['error']
-                message = error['message'].lower() if error else ''
-
-                # Duplicate clOrdID: that's fine, probably a deploy, go get the order(s) and return it
-                if 'duplicate clordid' in message:
-                    orders = postdict['orders'] if 'orders' in postdict else postdict
-
-                    IDs = json.dumps({'clOrdID': [order['clOrdID'] for order in orders]})
-                    orderResults = self._curl_bitmex('/order', query={'filter': IDs}, verb='GET')
-
-                    for i, order in enumerate(orderResults):
-                        if (
-                                order['orderQty'] != abs(postdict['orderQty']) or
-                                order['side'] != ('Buy' if postdict['orderQty'] > 0 else 'Sell') or
-                                order['price'] != postdict['price'] or
-                                order['symbol'] != postdict['symbol']):
-                            raise Exception('Attempted to recover from duplicate clOrdID, but order returned from API ' +
-                                            'did not match POST.\nPOST data: %s\nReturned order: %s' % (
-                                                json.dumps(orders[i]), json.dumps(order)))
-                    # All good
-                    return orderResults
-
-                elif 'insufficient available balance' in message:
-                    self.logger.error('Account out of funds. The message: %s' % error['message'])
-                    exit_or_throw(Exception('Insufficient Funds'))
-
-
-            # If we haven't returned or re-raised yet, we get here.
-            self.logger.error("Unhandled Error: %s: %s" % (e, response.text))
-            self.logger.error("Endpoint was: %s %s: %s" % (verb, path, json.dumps(postdict)))
-            exit_or_throw(e)
-
-        except requests.exceptions.Timeout as e:
-            # Timeout, re-run this request
-            self.logger.warning("Timed out on request: %s (%s), retrying..." % (path, json.dumps(postdict or '')))
-            return retry()
-
-        except requests.exceptions.ConnectionError as e:
-            self.logger.warning("Unable to contact the BitMEX API (%s). Please check the URL. Retrying. " +
-                                "Request: %s %s \n %s" % (e, url, json.dumps(postdict)))
-            time.sleep(1)
-            return retry()
-
-        # Reset retry counter on success
-        self.retries = 0
-
-        return response.json()
+            return response.json()
@@ -10,12 +10,22 @@ import atexit
 import signal
 from operator import itemgetter
 import numpy as np
-import math
 from market_maker import bitmex
 from market_maker.settings import settings
-from market_maker.utils import log, constants, errors
+from market_maker.utils import log, constants, errors, math
+from market_maker.utils.backfill import BarBackfill
+from market_maker.utils.bars import BarBuffer
+from market_maker.utils.converge import diff_orders
+from market_maker.utils.dispatch import OrderDispatcher
+from market_maker.utils.indicators import EMA
+from market_maker.utils.ladder import Ladder
+from market_maker.utils.ratelimit import RateLimitGovernor
+from market_maker.utils.retry import RetryPolicy
 from market_maker.utils.rest import ApiException
+from market_maker.utils.api_client import ApiClient
 from market_maker.utils.trade_api import TradeApi
+from market_maker.utils.transport import Transport
+from market_maker.ws.trigger import OrderTrigger
 import talib as ta
 
 # Used for reloading the bot - saves modified times of key files
@@ -29,15 +39,23 @@ watched_files_mtimes = [(f, getmtime(f)) for f in settings.WATCHED_FILES]
 logger = log.setup_custom_logger('root')
 
 class HTTPTradeApi(object):
-    def __init__(self, dry_run=False):
-        self.last=""
-        self.close=[]
-        self.api = TradeApi()
+    def __init__(self, dry_run=False, transport=None, history=500, workers=4, ratelimit=None):
+        # The last `history` 5m bars.
+        self.bars = BarBuffer(history)
+        self.api = TradeApi(ApiClient(pool_manager=transport.poolmanager) if transport else None)
+        self.backfill = BarBackfill(self.api, "XBT", "5m", workers, ratelimit)
     def trade_get_bucketed(self,start):
-        trades = self.api.trade_get_bucketed(bin_size="5m",symbol="XBT",count=500,start_time=start)
-        for trade in trades:
-            self.close.append(trade.close)
-            self.last=str(trade.timestamp)
+        # More than one request's worth of bars is fetched a page per request, several at once.
+        self.backfill.fill(self.bars, start)
+
+class TickContext(object):
+    """What one pass of the loop knows about our symbol: a snapshot, plus what's derived from it."""
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        buys = [o for o in snapshot.orders if o['side'] == 'Buy']
+        sells = [o for o in snapshot.orders if o['side'] == 'Sell']
+        self.highest_buy = max(buys, key=itemgetter('price')) if buys else None
+        self.lowest_sell = min(sells, key=itemgetter('price')) if sells else None
 
 class ExchangeInterface:
     def __init__(self, dry_run=False):
@@ -46,9 +64,50 @@ class ExchangeInterface:
             self.symbol = sys.argv[1]
         else:
             self.symbol = settings.SYMBOL
+        # One set of keep-alive connections to the REST API, for the connector and the TradeApi client.
+        self.transport = Transport(settings.HTTP_POOL_SIZE)
         self.bitmex = bitmex.BitMEX(base_url=settings.BASE_URL, symbol=self.symbol,
                                     apiKey=settings.API_KEY, apiSecret=settings.API_SECRET,
-                                    orderIDPrefix=settings.ORDERID_PREFIX, postOnly=settings.POST_ONLY)
+                                    orderIDPrefix=settings.ORDERID_PREFIX, postOnly=settings.POST_ONLY,
+                                    transport=self.transport,
+                                    ratelimit=RateLimitGovernor(settings.RATELIMIT_RESERVE_AMEND,
+                                                                settings.RATELIMIT_RESERVE_CREATE),
+                                    amendWindow=settings.AMEND_COALESCE_WINDOW,
+                                    retryPolicy=RetryPolicy(settings.API_MAX_RETRIES, settings.API_RETRY_BACKOFF,
+                                                            settings.API_RETRY_MAX_BACKOFF, settings.API_RETRY_DEADLINE))
+        self.dispatcher = OrderDispatcher(self, settings.ORDER_DISPATCH_WORKERS)
+        # See begin_tick().
+        self.tick = None
+        self.tick_reads = 0
+
+    def warm_up(self):
+        """Open connections to the REST API now, so the first orders don't wait for the handshakes."""
+        # Enough for each batch the dispatcher sends at once.
+        connections = settings.ORDER_DISPATCH_WORKERS
+        self.transport.warm(settings.BASE_URL, connections)
+        if settings.HTTP_IDLE_REFRESH:
+            self.transport.keep_warm(settings.BASE_URL, settings.HTTP_IDLE_REFRESH, connections)
+
+    def begin_tick(self):
+        """Capture our symbol's realtime data once, for one pass of the loop.
+
+        Until end_tick(), the getters below answer for our symbol from that capture instead of
+        going back to the websocket each time, so a pass sees one consistent view however many
+        times it asks. Outside a tick they read the live data."""
+        self.tick = TickContext(self.bitmex.snapshot())
+        self.tick_reads = 0
+
+    def end_tick(self):
+        """Stop reading from the tick's capture. Returns how many reads it answered."""
+        self.tick = None
+        return self.tick_reads
+
+    def _tick(self, symbol=None):
+        """The current tick context, if there is one and it covers `symbol`."""
+        if self.tick is None or (symbol is not None and symbol != self.symbol):
+            return None
+        self.tick_reads += 1
+        return self.tick
 
     def cancel_order(self, order):
         tickLog = self.get_instrument()['tickLog']
@@ -88,25 +147,12 @@ class ExchangeInterface:
         for symbol in contracts:
             position = self.bitmex.position(symbol=symbol)
             instrument = self.bitmex.instrument(symbol=symbol)
-
-            if instrument['isQuanto']:
-                future_type = "Quanto"
-            elif instrument['isInverse']:
-                future_type = "Inverse"
-            elif not instrument['isQuanto'] and not instrument['isInverse']:
-                future_type = "Linear"
-            else:
-                raise NotImplementedError("Unknown future type; not quanto or inverse: %s" % instrument['symbol'])
-
-            if instrument['underlyingToSettleMultiplier'] is None:
-                multiplier = float(instrument['multiplier']) / float(instrument['quoteToSettleMultiplier'])
-            else:
-                multiplier = float(instrument['multiplier']) / float(instrument['underlyingToSettleMultiplier'])
+            instrument_constants = self.bitmex.instrument_constants(symbol=symbol)
 
             portfolio[symbol] = {
                 "currentQty": float(position['currentQty']),
-                "futureType": future_type,
-                "multiplier": multiplier,
+                "futureType": instrument_constants['futureType'],
+                "multiplier": instrument_constants['multiplier'],
                 "markPrice": float(instrument['markPrice']),
                 "spot": float(instrument['indicativeSettlePrice'])
             }
@@ -145,48 +191,86 @@ class ExchangeInterface:
     def get_instrument(self, symbol=None):
         if symbol is None:
             symbol = self.symbol
+        tick = self._tick(symbol)
+        if tick is not None:
+            return tick.snapshot.instrument
         return self.bitmex.instrument(symbol)
 
     def get_margin(self):
         if self.dry_run:
             return {'marginBalance': float(settings.DRY_BTC), 'availableFunds': float(settings.DRY_BTC)}
+        tick = self._tick()
+        if tick is not None and tick.snapshot.margin is not None:
+            return tick.snapshot.margin
         return self.bitmex.funds()
     def recent_trades(self, symbol=settings.symbol):
+        tick = self._tick(symbol)
+        if tick is not None and tick.snapshot.trade is not None:
+            return tick.snapshot.trade
         return self.bitmex.recent_trades(symbol)[-1]
-    def get_orders(self):
+    def get_orders(self, snapshot=None):
         if self.dry_run:
             return []
+        if snapshot is None and self._tick() is not None:
+            snapshot = self.tick.snapshot
+        if snapshot is not None:
+            return snapshot.orders
         return self.bitmex.open_orders()
     def last_close(self):
+        tick = self._tick()
+        if tick is not None and tick.snapshot.lastClose is not None:
+            return tick.snapshot.lastClose
         return self.bitmex.last_close()
     def get_highest_buy(self):
-        buys = [o for o in self.get_orders() if o['side'] == 'Buy']
-        if not len(buys):
-            return {'price': -2**32}
-        highest_buy = max(buys or [], key=lambda o: o['price'])
+        tick = None if self.dry_run else self._tick()
+        if tick is not None:
+            highest_buy = tick.highest_buy
+        else:
+            highest_buy = None if self.dry_run else self.bitmex.best_open_order('Buy')
         return highest_buy if highest_buy else {'price': -2**32}
 
     def get_lowest_sell(self):
-        sells = [o for o in self.get_orders() if o['side'] == 'Sell']
-        if not len(sells):
-            return {'price': 2**32}
-        lowest_sell = min(sells or [], key=lambda o: o['price'])
+        tick = None if self.dry_run else self._tick()
+        if tick is not None:
+            lowest_sell = tick.lowest_sell
+        else:
+            lowest_sell = None if self.dry_run else self.bitmex.best_open_order('Sell')
         return lowest_sell if lowest_sell else {'price': 2**32}  # ought to be enough for anyone
 
     def get_position(self, symbol=None):
         if symbol is None:
             symbol = self.symbol
+        tick = self._tick(symbol)
+        if tick is not None and tick.snapshot.position is not None:
+            return tick.snapshot.position
         return self.bitmex.position(symbol)
 
+    def snapshot(self):
+        """Take a consistent, read-only view of the realtime data for this symbol."""
+        tick = self._tick()
+        if tick is not None:
+            return tick.snapshot
+        return self.bitmex.snapshot()
+
+    def is_stale(self, snapshot):
+        return self.bitmex.is_stale(snapshot)
+
     def get_ticker(self, symbol=None):
         if symbol is None:
             symbol = self.symbol
+        tick = self._tick(symbol)
+        if tick is not None:
+            return tick.snapshot.ticker
         return self.bitmex.ticker_data(symbol)
 
     def is_open(self):
         """Check that websockets are still open."""
         return not self.bitmex.ws.exited
 
+    def is_resyncing(self):
+        """Check whether the websocket is reconnecting, or waiting for fresh data after reconnecting."""
+        return self.bitmex.ws.is_resyncing()
+
     def check_market_open(self):
         instrument = self.get_instrument()
         if instrument["state"] != "Open" and instrument["state"] != "Closed":
@@ -214,6 +298,16 @@ class ExchangeInterface:
             return orders
         return self.bitmex.cancel([order['orderID'] for order in orders])
 
+    def get_ratelimit_budget(self):
+        """The fraction of the REST rate limit we have left, or None if we don't know yet."""
+        if self.dry_run:
+            return None
+        return self.bitmex.ratelimit_budget()
+
+    def dispatch_orders(self, to_cancel=(), to_amend=(), to_create=()):
+        """Send cancels, amends and creates concurrently. Returns a BatchResult for each batch sent."""
+        return self.dispatcher.dispatch(to_cancel, to_amend, to_create)
+
 
 class OrderManager:
     def __init__(self):
@@ -232,12 +326,25 @@ class OrderManager:
             logger.info("Order Manager initializing, connecting to BitMEX. Live run: executing real trades.")
 
         self.start_time = datetime.now()
+        self.exchange.warm_up()
         self.instrument = self.exchange.get_instrument()
         self.starting_qty = self.exchange.get_delta()
         self.running_qty = self.starting_qty
-        self.http = HTTPTradeApi()
-        start = datetime.utcnow() - timedelta(minutes=2500)
+        self.ladder = Ladder(settings.ORDER_PAIRS, settings.INTERVAL, settings.ORDER_START_SIZE, settings.ORDER_STEP_SIZE,
+                             settings.MAINTAIN_SPREADS, settings.RANDOM_ORDER_SIZE is True,
+                             settings.MIN_ORDER_SIZE, settings.MAX_ORDER_SIZE)
+        self.http = HTTPTradeApi(transport=self.exchange.transport, history=settings.BAR_HISTORY,
+                                 workers=settings.BACKFILL_WORKERS, ratelimit=self.exchange.bitmex.ratelimit)
+        start = datetime.utcnow() - timedelta(minutes=5 * settings.BAR_HISTORY)
         self.http.trade_get_bucketed(start)
+        # Kept up to date as bars close, so whatToDo doesn't recompute them over the whole history.
+        self.emas = dict((period, EMA(period, self.http.bars['close'])) for period in set([settings.MA1, settings.MA2]))
+
+        # In event mode, run the loop when the market or our account changes rather than on a timer.
+        self.trigger = None
+        if settings.LOOP_MODE == 'event':
+            self.trigger = OrderTrigger(self.exchange.symbol, settings.QUOTE_TRIGGER_THRESHOLD)
+            self.trigger.attach(self.exchange.bitmex)
 
     def reset(self):
         self.exchange.cancel_all_orders()
@@ -250,9 +357,9 @@ class OrderManager:
         if settings.DRY_RUN:
             sys.exit()
 
-    def stop_profit(self):
-        position = self.exchange.get_position()
-        recent_trade = self.exchange.recent_trades()
+    def stop_profit(self, snapshot):
+        position = snapshot.position
+        recent_trade = snapshot.trade
         if os.path.exists("./.stop_profit"):
             return "stopped", []
         cost = position['avgCostPrice']
@@ -272,13 +379,10 @@ class OrderManager:
     def update_close_data(self):
         """update close data every mins """
         close = self.exchange.last_close()
-        timestamp = close["timestamp"]
-        if self.http.last != timestamp:
-            if len(self.http.close) < 500:
-                self.http.close += [close["close"]]
-            else:
-                self.http.close = self.http.close[1:] + [close["close"]]
-        self.http.last = timestamp
+        if self.http.bars.append(close["timestamp"], close["open"], close["high"], close["low"], close["close"],
+                                 close["volume"]):
+            for ema in self.emas.values():
+                ema.update(close["close"])
 
     def reset(self):
         self.exchange.cancel_all_orders()
@@ -367,14 +471,13 @@ class OrderManager:
 
         return math.toNearest(start_position * (1 + settings.INTERVAL) ** index, self.instrument['tickSize'])
 
-    def whatToDo(self):
-        close = self.http.close
-        recent_trade = self.exchange.recent_trades()
+    def whatToDo(self, snapshot):
+        recent_trade = snapshot.trade
         ema1 = settings.MA1 if settings.MA1 < settings.MA2 else settings.MA2
         ema2 = settings.MA2 if settings.MA1 < settings.MA2 else settings.MA1
-        EMA1 = ta.EMA(np.array(close + [recent_trade['price']]), ema1)[-1]
-        EMA2 = ta.EMA(np.array(close + [recent_trade['price']]), ema2)[-1]
-        recent_trade = self.exchange.recent_trades()
+        # As if the current trade price closed a bar.
+        EMA1 = self.emas[ema1].peek(recent_trade['price'])
+        EMA2 = self.emas[ema2].peek(recent_trade['price'])
         logger.info("MA%s: %s,MA%s: %s ,last trade: %s" % (ema1, EMA1, ema2, EMA2, recent_trade['price']))
         if recent_trade['price'] < EMA1 and EMA1 + 1.1 < EMA2:
             logger.info("do short")
@@ -391,19 +494,20 @@ class OrderManager:
     
 
     def begin_orders(self):
+        # Make every decision in this pass from the same view of the market and our account.
+        snapshot = self.exchange.snapshot()
         to_create = []
         to_amend = []
         to_cancel = []
-        position = self.exchange.get_delta()
-        todo = self.whatToDo()
-        to_create = []
-        orders = existing_orders = self.exchange.get_orders()
+        position = snapshot.position['currentQty']
+        todo = self.whatToDo(snapshot)
+        orders = self.exchange.get_orders(snapshot)
         for order in orders:
             if order['side'] == 'Buy' and todo < 0:
                 to_cancel.append(order)
             elif order['side'] == 'Sell' and todo > 0:
                 to_cancel.append(order)
-        ret, to_create = self.stop_profit()
+        ret, to_create = self.stop_profit(snapshot)
         if ret == 'stopped' and position == 0:
             return
         amount = 0
@@ -417,37 +521,37 @@ class OrderManager:
                 amount = settings.MAX_POSITION - position
             elif position <= 0:
                 amount = abs(position) + settings.MAX_POSITION
+        if self.exchange.is_stale(snapshot):
+            logger.debug("Realtime data changed while deciding on orders (%d stale snapshots so far)." %
+                         self.exchange.bitmex.ws.stale_snapshots)
         if len(to_create) > 0 or amount > 0:
-            price = self.exchange.recent_trades()['price']
+            price = snapshot.trade['price']
             if amount > 0:
                 create_order = {'price': price, 'orderQty': amount, 'side': "Buy" if todo > 0 else "Sell"}
                 to_create.append(create_order)
-            orders = existing_orders = self.exchange.get_orders()
-            for order in orders:
-                if order['price'] == to_create[0]['price']:
-                    to_create.remove(to_create[0])
-                else:
-                    to_amend.append({'orderID': order['orderID'], 'leavesQty': to_create[0]['orderQty'],
-                                     'price': to_create[0]['price'], 'side': order['side']})
-                    to_create.remove(to_create[0])
-            if len(to_create) > 0:
-                logger.info("%4s %d @ %s" % (to_create[0]['side'], to_create[0]['orderQty'], to_create[0]['price']))
-                try:
-                    self.exchange.create_bulk_orders(to_create)
-                except:
-                    pass
+            # Move the orders we're keeping onto what we want, rather than cancelling and re-placing them.
+            cancelling = set(order['orderID'] for order in to_cancel)
+            diff = diff_orders([order for order in orders if order['orderID'] not in cancelling],
+                               [order for order in to_create if order['side'] == 'Buy'],
+                               [order for order in to_create if order['side'] == 'Sell'])
+            to_create, to_amend = diff.to_create, diff.to_amend
+            to_cancel += diff.to_cancel
+            for order in to_create:
+                logger.info("%4s %d @ %s" % (order['side'], order['orderQty'], order['price']))
         if len(to_cancel) > 0:
             logger.info("need cancel ...")
-            try:
-                self.exchange.cancel_bulk_orders(to_cancel)
-            except:
-                pass
         if len(to_amend) > 0:
             logger.info("need amend ...")
-            try:
-                self.exchange.amend_bulk_orders(to_amend)
-            except:
-                pass
+        # A failed batch is logged and otherwise ignored; the next pass will try again.
+        try:
+            results = self.exchange.dispatch_orders(to_cancel, to_amend, to_create)
+        except SystemExit:
+            results = []
+        for batch in results:
+            if isinstance(batch.error, (errors.RateLimitDeferred, errors.AmendsQueued)):
+                logger.info("Deferred %d %ss: %s" % (len(batch.orders), batch.kind, batch.error))
+            elif not batch.ok:
+                logger.warning("Failed to %s orders: %s" % (batch.kind, batch.error))
     ###
     # Orders
     ###
@@ -455,112 +559,85 @@ class OrderManager:
     def place_orders(self):
         """Create order items for use in convergence."""
 
-        buy_orders = []
-        sell_orders = []
         # Create orders from the outside in. This is intentional - let's say the inner order gets taken;
         # then we match orders from the outside in, ensuring the fewest number of orders are amended and only
         # a new order is created in the inside. If we did it inside-out, all orders would be amended
         # down and a new order would be created at the outside.
-        for i in reversed(range(1, settings.ORDER_PAIRS + 1)):
-            if not self.long_position_limit_exceeded():
-                buy_orders.append(self.prepare_order(-i))
-            if not self.short_position_limit_exceeded():
-                sell_orders.append(self.prepare_order(i))
+        buy_orders, sell_orders = self.ladder.build(self.start_position_buy, self.start_position_sell,
+                                                    self.instrument['tickSize'],
+                                                    buys=not self.long_position_limit_exceeded(),
+                                                    sells=not self.short_position_limit_exceeded(),
+                                                    depth=self.ladder_depth())
 
         return self.converge_orders(buy_orders, sell_orders)
 
-    def prepare_order(self, index):
-        """Create an order object."""
-
-        if settings.RANDOM_ORDER_SIZE is True:
-            quantity = random.randint(settings.MIN_ORDER_SIZE, settings.MAX_ORDER_SIZE)
-        else:
-            quantity = settings.ORDER_START_SIZE + ((abs(index) - 1) * settings.ORDER_STEP_SIZE)
-
-        price = self.get_price_offset(index)
-
-        return {'price': price, 'orderQty': quantity, 'side': "Buy" if index < 0 else "Sell"}
+    def ladder_depth(self):
+        """How many order pairs to quote. Fewer when we're running short of rate limit, so there's
+        less to amend each pass and the budget can recover."""
+        budget = self.exchange.get_ratelimit_budget()
+        if budget is None or budget >= settings.RATELIMIT_LOW_BUDGET:
+            return settings.ORDER_PAIRS
+        depth = max(1, int(settings.ORDER_PAIRS * budget / settings.RATELIMIT_LOW_BUDGET))
+        logger.info("%.0f%% of the rate limit left, quoting %d of %d order pairs." %
+                    (budget * 100, depth, settings.ORDER_PAIRS))
+        return depth
 
     def converge_orders(self, buy_orders, sell_orders):
         """Converge the orders we currently have in the book with what we want to be in the book.
            This involves amending any open orders and creating new ones if any have filled completely.
            We start from the closest orders outward."""
 
-        tickLog = self.exchange.get_instrument()['tickLog']
-        to_amend = []
-        to_create = []
-        to_cancel = []
-        buys_matched = 0
-        sells_matched = 0
-        existing_orders = self.exchange.get_orders()
-
-        # Check all existing orders and match them up with what we want to place.
-        # If there's an open one, we might be able to amend it to fit what we want.
-        for order in existing_orders:
-            try:
-                if order['side'] == 'Buy':
-                    desired_order = buy_orders[buys_matched]
-                    buys_matched += 1
-                else:
-                    desired_order = sell_orders[sells_matched]
-                    sells_matched += 1
-
-                # Found an existing order. Do we need to amend it?
-                if desired_order['orderQty'] != order['leavesQty'] or (
-                        # If price has changed, and the change is more than our RELIST_INTERVAL, amend.
-                        desired_order['price'] != order['price'] and
-                        abs((desired_order['price'] / order['price']) - 1) > settings.RELIST_INTERVAL):
-                    to_amend.append({'orderID': order['orderID'], 'orderQty': order['cumQty'] + desired_order['orderQty'],
-                                     'price': desired_order['price'], 'side': order['side']})
-            except IndexError:
-                # Will throw if there isn't a desired order to match. In that case, cancel it.
-                to_cancel.append(order)
-
-        while buys_matched < len(buy_orders):
-            to_create.append(buy_orders[buys_matched])
-            buys_matched += 1
-
-        while sells_matched < len(sell_orders):
-            to_create.append(sell_orders[sells_matched])
-            sells_matched += 1
+        tickLog = self.instrument['tickLog']
+        diff = diff_orders(self.exchange.get_orders(), buy_orders, sell_orders, settings.RELIST_INTERVAL)
+        to_amend, to_create, to_cancel = diff.to_amend, diff.to_create, diff.to_cancel
 
         if len(to_amend) > 0:
             for amended_order in reversed(to_amend):
-                reference_order = [o for o in existing_orders if o['orderID'] == amended_order['orderID']][0]
+                reference_order = diff.existing[amended_order['orderID']]
                 logger.info("Amending %4s: %d @ %.*f to %d @ %.*f (%+.*f)" % (
                     amended_order['side'],
                     reference_order['leavesQty'], tickLog, reference_order['price'],
                     (amended_order['orderQty'] - reference_order['cumQty']), tickLog, amended_order['price'],
                     tickLog, (amended_order['price'] - reference_order['price'])
                 ))
-            # This can fail if an order has closed in the time we were processing.
-            # The API will send us `invalid ordStatus`, which means that the order's status (Filled/Canceled)
-            # made it not amendable.
-            # If that happens, we need to catch it and re-tick.
-            try:
-                self.exchange.amend_bulk_orders(to_amend)
-            except requests.exceptions.HTTPError as e:
-                errorObj = e.response.json()
-                if errorObj['error']['message'] == 'Invalid ordStatus':
-                    logger.warn("Amending failed. Waiting for order data to converge and retrying.")
-                    sleep(0.5)
-                    return self.place_orders()
-                else:
-                    logger.error("Unknown error on amend: %s. Exiting" % errorObj)
-                    sys.exit(1)
 
         if len(to_create) > 0:
             logger.info("Creating %d orders:" % (len(to_create)))
             for order in reversed(to_create):
                 logger.info("%4s %d @ %.*f" % (order['side'], order['orderQty'], tickLog, order['price']))
-            self.exchange.create_bulk_orders(to_create)
 
         # Could happen if we exceed a delta limit
         if len(to_cancel) > 0:
             logger.info("Canceling %d orders:" % (len(to_cancel)))
             for order in reversed(to_cancel):
                 logger.info("%4s %d @ %.*f" % (order['side'], order['leavesQty'], tickLog, order['price']))
-            self.exchange.cancel_bulk_orders(to_cancel)
+
+        results = self.exchange.dispatch_orders(to_cancel, to_amend, to_create)
+        # Batches held back to save rate limit, or amends queued to be coalesced, aren't errors; the
+        # next pass diffs again and sends whatever is still needed then.
+        deferred = [batch for batch in results
+                    if isinstance(batch.error, (errors.RateLimitDeferred, errors.AmendsQueued))]
+        for batch in deferred:
+            logger.info("Deferred %d %ss: %s" % (len(batch.orders), batch.kind, batch.error))
+        results = [batch for batch in results if batch not in deferred]
+        for batch in results:
+            # Amends can fail if an order has closed in the time we were processing.
+            # The API will send us `invalid ordStatus`, which means that the order's status (Filled/Canceled)
+            # made it not amendable.
+            # If that happens, we need to catch it and re-tick. The dispatcher doesn't send creates when the
+            # amends fail, so none are in flight to be created a second time by the re-tick.
+            if batch.kind == 'amend' and isinstance(batch.error, requests.exceptions.HTTPError):
+                errorObj = batch.error.response.json()
+                if errorObj['error']['message'] == 'Invalid ordStatus':
+                    logger.warn("Amending failed. Waiting for order data to converge and retrying.")
+                    sleep(0.5)
+                    return self.place_orders()
+                else:
+                    logger.error("Unknown error on amend: %s. Exiting" % errorObj)
+                    sys.exit(1)
+        for batch in results:
+            if not batch.ok:
+                raise batch.error
 
     ###
     # Position Limits
@@ -633,30 +710,79 @@ class OrderManager:
         logger.info("Shutting down. All open orders will be cancelled.")
         try:
             self.exchange.cancel_all_orders()
+            self.exchange.dispatcher.close()
             self.exchange.bitmex.exit()
         except errors.AuthenticationError as e:
             logger.info("Was not authenticated; could not cancel orders.")
         except Exception as e:
             logger.info("Unable to cancel orders: %s" % e)
 
+        # Stats only once the orders are cancelled, so nothing here can get in the way of that.
+        try:
+            amend_stats = self.exchange.bitmex.amend_stats()
+            if amend_stats is not None:
+                logger.info("Amends: %(submitted)d batches sent as %(requests)d requests, %(merged)d merged." %
+                            amend_stats)
+        except Exception as e:
+            logger.info("Unable to get amend stats: %s" % e)
+        try:
+            transport_stats = self.exchange.transport.stats()
+            if transport_stats['requests']:
+                logger.info("REST: %(requests)d requests over %(handshakes)d connections (%(warmed)d warm-ups), "
+                            "%(reuse).0f%% reused." % dict(transport_stats, reuse=transport_stats['reuse'] * 100))
+        except Exception as e:
+            logger.info("Unable to get transport stats: %s" % e)
+        try:
+            for endpoint, counts in sorted(self.exchange.bitmex.retry_stats().items()):
+                if counts['retries'] or counts['failures']:
+                    logger.info("%s: %d requests, %d retries (%.1fs waiting), %d given up on." % (
+                        endpoint, counts['requests'], counts['retries'], counts['waited'], counts['failures']))
+        except Exception as e:
+            logger.info("Unable to get retry stats: %s" % e)
+
         sys.exit()
 
+    def wait_for_trigger(self):
+        """Wait until it's time for another pass. Returns what triggered it and when, if it was an event."""
+        if self.trigger is None:
+            sleep(settings.LOOP_INTERVAL)
+            return None, None
+        # LOOP_INTERVAL is the longest we'll go without a pass, in case an event was missed.
+        return self.trigger.wait(settings.EVENT_DEBOUNCE, settings.LOOP_INTERVAL)
+
     def run_loop(self):
         while True:
             sys.stdout.write("-----\n")
             sys.stdout.flush()
 
             self.check_file_change()
-            sleep(settings.LOOP_INTERVAL)
+            reason, triggeredAt = self.wait_for_trigger()
 
-            # This will restart on very short downtime, but if it's longer,
-            # the MM will crash entirely as it is unable to connect to the WS on boot.
+            # The WS reconnects by itself; it only closes for good if that keeps failing.
+            # In that case restart, and the MM will crash entirely if it can't connect on boot.
             if not self.check_connection():
                 logger.error("Realtime data connection unexpectedly closed, restarting.")
                 self.restart()
-            self.update_close_data()
-            self.print_status()
-            self.begin_orders()
+
+            # Don't quote off stale data while the WS is catching up.
+            if self.exchange.is_resyncing():
+                logger.info("Waiting for realtime data to resync. Not quoting.")
+                continue
+            # Read the market and our account once for the whole pass.
+            self.exchange.begin_tick()
+            try:
+                self.update_close_data()
+                self.print_status()
+                self.begin_orders()
+            finally:
+                reads = self.exchange.end_tick()
+            logger.debug("Answered %d reads from this pass's tick context." % reads)
+
+            if triggeredAt is not None:
+                latency = self.trigger.record_latency(triggeredAt)
+                logger.info("Acted on %s in %.0fms (average %.0fms, max %.0fms over %d events)." %
+                            (reason, latency * 1000, self.trigger.average_latency() * 1000,
+                             self.trigger.maxLatency * 1000, self.trigger.reactions))
 
             '''
           self.sanity_check()  # Ensures health of mm - several cut-out points here
@@ -301,8 +301,8 @@ class OrderManager:
 
     def get_ticker(self):
         ticker = self.exchange.get_ticker()
-        print self.exchange.market_depth()
-        order_book = sorted(self.exchange.market_depth(), key=itemgetter('level'))
+        order_book = self.exchange.market_depth()
+        print order_book
         highest_buy = self.exchange.get_highest_buy()
         lowest_sell = self.exchange.get_lowest_sell()
 
@@ -316,15 +316,15 @@ class OrderManager:
         # make sure they're not ours. If they are, we need to adjust, otherwise we'll
         # just work the orders inward until they collide.
         if settings.MAINTAIN_SPREADS:
-            bid_levels = [x["bidSize"] for x in filter(lambda x: x["bidSize"]!=None, order_book)]
-            bid_prices = [x["bidPrice"] for x in filter(lambda x: x["bidPrice"]!=None, order_book)]
+            bid_levels = [size for price, size in order_book.levels('Buy')]
+            bid_prices = [price for price, size in order_book.levels('Buy')]
             bid_index = next(x[0] for x in enumerate(np.cumsum(bid_levels)-highest_buy["orderQty"]) if x[1] > settings.MIN_CONTRACTS)
             buy_start = bid_prices[bid_index]
             print("Bid Prices: "+str(bid_prices))
             print("Bid Levels: "+str(bid_levels))
             print("Bid Index: "+str(bid_index))
-            ask_levels = [x["askSize"] for x in filter(lambda x: x["askSize"]!=None, order_book)]
-            ask_prices = [x["askPrice"] for x in filter(lambda x: x["askPrice"]!=None, order_book)]
+            ask_levels = [size for price, size in order_book.levels('Sell')]
+            ask_prices = [price for price, size in order_book.levels('Sell')]
             ask_index = next(x[0] for x in enumerate(np.cumsum(ask_levels)-lowest_sell["orderQty"]) if x[1] > settings.MIN_CONTRACTS)
             sell_start = ask_prices[ask_index]
             print("Ask Prices: "+str(ask_prices))
@@ -619,8 +619,8 @@ class OrderManager:
         highest_buy = self.exchange.get_highest_buy()
         lowest_sell = self.exchange.get_lowest_sell()
 
-        bid_depth = sum([x["bidSize"] for x in filter(lambda x: x["bidSize"]!=None, order_book)])
-        ask_depth = sum([x["askSize"] for x in filter(lambda x: x["askSize"]!=None, order_book)])
+        bid_depth = order_book.depth('Buy')
+        ask_depth = order_book.depth('Sell')
 
         bid_liquid = bid_depth - highest_buy["orderQty"]
         logger.info("Bid Liquidity: "+str(bid_liquid)+" Contracts")
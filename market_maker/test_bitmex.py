@@ -0,0 +1,119 @@
+from __future__ import absolute_import
+
+import json
+import time
+import unittest
+
+import requests
+
+from market_maker import bitmex
+from market_maker.utils import errors
+from market_maker.utils.ratelimit import RateLimitGovernor
+
+
+class NullWebsocket(object):
+
+    def connect(self, *args, **kwargs):
+        pass
+
+    def exit(self):
+        pass
+
+
+class FakeResponse(object):
+
+    def __init__(self, body, limit, remaining):
+        self.body = body
+        self.status_code = 200
+        self.headers = {'X-Ratelimit-Limit': str(limit), 'X-Ratelimit-Remaining': str(remaining),
+                        'X-Ratelimit-Reset': str(int(time.time()) + 600)}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+class TestRateLimitedCancel(unittest.TestCase):
+    """ Getting out of the market has to work with the rate limit nearly spent """
+
+    def setUp(self):
+        self.websocket = bitmex.BitMEXWebsocket
+        bitmex.BitMEXWebsocket = NullWebsocket
+        try:
+            self.api = bitmex.BitMEX('https://testnet.bitmex.com/api/v1/', 'XBTUSD', apiKey='key', apiSecret='secret',
+                                     orderIDPrefix='mm_', ratelimit=RateLimitGovernor(0.1, 0.2))
+        finally:
+            bitmex.BitMEXWebsocket = self.websocket
+        self.sent = []
+        self.api.session.send = self.send
+        # 2 of 60 requests left: well into the reserves for both amends and creates.
+        self.api.ratelimit.update(FakeResponse(None, 60, 2).headers)
+
+    def tearDown(self):
+        self.api.exit()
+
+    def send(self, prepped, timeout=None):
+        self.sent.append((prepped.method, prepped.path_url))
+        if prepped.method == 'GET':
+            body = [{'orderID': 'a', 'clOrdID': 'mm_a'}, {'orderID': 'b', 'clOrdID': 'other_b'}]
+        else:
+            body = [{'orderID': orderID} for orderID in json.loads(prepped.body.decode('utf8'))['orderID']]
+        return FakeResponse(body, 60, 2 - len(self.sent))
+
+    def test_open_orders_and_cancel_go_through(self):
+        orders = self.api.http_open_orders()
+        self.assertEqual([order['orderID'] for order in orders], ['a'])
+        self.assertEqual(self.api.cancel([order['orderID'] for order in orders]), [{'orderID': 'a'}])
+        self.assertEqual([method for method, _ in self.sent], ['GET', 'DELETE'])
+
+    def test_other_requests_deferred(self):
+        with self.assertRaises(errors.RateLimitDeferred):
+            self.api.create_bulk_orders([{'orderQty': 100, 'price': 10000.5, 'side': 'Buy'}])
+        with self.assertRaises(errors.RateLimitDeferred):
+            self.api._curl_bitmex(path='position', verb='GET')
+        self.assertEqual(self.sent, [])
+
+
+class TestWithoutKeys(unittest.TestCase):
+    """ Public endpoints work with the default, empty, API key and secret """
+
+    def setUp(self):
+        self.websocket = bitmex.BitMEXWebsocket
+        bitmex.BitMEXWebsocket = NullWebsocket
+        self.sent = []
+
+    def tearDown(self):
+        bitmex.BitMEXWebsocket = self.websocket
+
+    def send(self, prepped, timeout=None):
+        self.sent.append(prepped.headers)
+        return FakeResponse([{'symbol': 'XBTUSD'}], 60, 59)
+
+    def test_unsigned_requests(self):
+        for apiSecret in ('', None):
+            api = bitmex.BitMEX('https://testnet.bitmex.com/api/v1/', 'XBTUSD', apiKey='', apiSecret=apiSecret)
+            try:
+                self.assertIsNone(api.auth)
+                api.session.send = self.send
+                self.assertEqual(api.instruments(), [{'symbol': 'XBTUSD'}])
+            finally:
+                api.exit()
+        self.assertEqual(len(self.sent), 2)
+        for headers in self.sent:
+            self.assertFalse([name for name in headers if name.lower().startswith('api-')])
+
+    def test_authenticated_methods_refused(self):
+        api = bitmex.BitMEX('https://testnet.bitmex.com/api/v1/', 'XBTUSD', apiKey='', apiSecret='')
+        try:
+            api.session.send = self.send
+            with self.assertRaises(errors.AuthenticationError):
+                api.http_open_orders()
+        finally:
+            api.exit()
+        self.assertEqual(self.sent, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
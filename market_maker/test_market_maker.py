@@ -0,0 +1,192 @@
+from __future__ import absolute_import
+
+import unittest
+from collections import Counter
+
+from market_maker import market_maker
+from market_maker.settings import settings
+from market_maker.utils.dispatch import OrderDispatcher
+from market_maker.utils.ladder import Ladder
+
+XBTUSD = {'symbol': 'XBTUSD', 'tickSize': 0.5, 'tickLog': 1, 'state': 'Open', 'midPrice': 10000.25,
+          'markPrice': 10000.0, 'bidPrice': 10000.0, 'askPrice': 10000.5, 'lastPrice': 10000.0}
+
+
+class FakeSnapshot(object):
+
+    def __init__(self, orders=(), currentQty=0):
+        self.version = 1
+        self.symbol = 'XBTUSD'
+        self.instrument = XBTUSD
+        self.ticker = {'last': 10000.0, 'buy': 10000.0, 'sell': 10000.5, 'mid': 10000.25}
+        self.position = {'symbol': 'XBTUSD', 'currentQty': currentQty, 'avgCostPrice': 0, 'avgEntryPrice': 0}
+        self.margin = {'marginBalance': 100000000}
+        self.orders = tuple(orders)
+        self.trade = {'symbol': 'XBTUSD', 'price': 10000.0}
+        self.lastClose = None
+
+
+class FakeBitMEX(object):
+    """Stands in for the connector: serves one snapshot, and counts what's read from it and what's sent."""
+
+    def __init__(self, snapshot):
+        self.current = snapshot
+        self.reads = Counter()
+        self.sent = []
+
+    def snapshot(self):
+        self.reads['snapshot'] += 1
+        return self.current
+
+    def is_stale(self, snapshot):
+        return False
+
+    def ratelimit_budget(self):
+        return None
+
+    # Live reads, which a pass shouldn't need once it has a tick context.
+    def instrument(self, symbol):
+        self.reads['instrument'] += 1
+        return self.current.instrument
+
+    def ticker_data(self, symbol=None):
+        self.reads['ticker_data'] += 1
+        return self.current.ticker
+
+    def position(self, symbol):
+        self.reads['position'] += 1
+        return self.current.position
+
+    def funds(self):
+        self.reads['funds'] += 1
+        return self.current.margin
+
+    def open_orders(self):
+        self.reads['open_orders'] += 1
+        return self.current.orders
+
+    def best_open_order(self, side):
+        self.reads['best_open_order'] += 1
+        return None
+
+    def cancel(self, orderIDs):
+        self.sent.append(('cancel', orderIDs))
+        return orderIDs
+
+    def amend_bulk_orders(self, orders):
+        self.sent.append(('amend', orders))
+        return orders
+
+    def create_bulk_orders(self, orders):
+        self.sent.append(('create', orders))
+        return orders
+
+
+def exchange_for(snapshot):
+    """An ExchangeInterface on a FakeBitMEX. Built by hand: the real constructor connects."""
+    exchange = market_maker.ExchangeInterface.__new__(market_maker.ExchangeInterface)
+    exchange.dry_run = False
+    exchange.symbol = 'XBTUSD'
+    exchange.bitmex = FakeBitMEX(snapshot)
+    exchange.dispatcher = OrderDispatcher(exchange, 1)
+    exchange.tick = None
+    exchange.tick_reads = 0
+    return exchange
+
+
+def order_manager(exchange):
+    manager = market_maker.OrderManager.__new__(market_maker.OrderManager)
+    manager.exchange = exchange
+    manager.instrument = XBTUSD
+    manager.running_qty = 0
+    manager.ladder = Ladder(settings.ORDER_PAIRS, settings.INTERVAL, settings.ORDER_START_SIZE,
+                            settings.ORDER_STEP_SIZE, settings.MAINTAIN_SPREADS)
+    return manager
+
+
+def order(orderID, side, price, leavesQty=100):
+    return {'orderID': orderID, 'clOrdID': 'mm_' + orderID, 'symbol': 'XBTUSD', 'side': side, 'price': price,
+            'orderQty': leavesQty, 'leavesQty': leavesQty, 'cumQty': 0}
+
+
+class TestBeginOrders(unittest.TestCase):
+
+    def begin_orders(self, orders):
+        self.exchange = exchange_for(FakeSnapshot(orders))
+        manager = order_manager(self.exchange)
+        # Go long; the indicators themselves are tested in utils/test_indicators.py.
+        manager.whatToDo = lambda snapshot: 1
+        try:
+            manager.begin_orders()
+        finally:
+            self.exchange.dispatcher.close()
+        return dict(self.exchange.bitmex.sent)
+
+    def test_moves_an_order_onto_the_target(self):
+        sent = self.begin_orders([order('a', 'Buy', 9990.0)])
+        self.assertEqual(sent, {'amend': [{'orderID': 'a', 'orderQty': settings.MAX_POSITION, 'price': 10000.0,
+                                           'side': 'Buy'}]})
+
+    def test_cancels_orders_left_over(self):
+        # Only one order is wanted; the one that isn't moved onto it is cancelled, not left resting.
+        sent = self.begin_orders([order('a', 'Buy', 9990.0), order('b', 'Buy', 9980.0)])
+        self.assertEqual(sent['cancel'], ['b'])
+        self.assertEqual([amend['orderID'] for amend in sent['amend']], ['a'])
+        self.assertNotIn('create', sent)
+
+
+class TestTickContext(unittest.TestCase):
+    """ A pass of the loop reads the realtime data once, and answers everything else from that """
+
+    # The getters that answer from the tick context when there is one.
+    GETTERS = ['get_instrument', 'get_ticker', 'get_highest_buy', 'get_lowest_sell', 'get_position', 'get_margin',
+               'get_orders', 'recent_trades', 'last_close', 'snapshot']
+
+    def setUp(self):
+        self.exchange = exchange_for(FakeSnapshot([order('a', 'Buy', 9900.0), order('b', 'Sell', 10100.0)]))
+        self.manager = order_manager(self.exchange)
+        self.calls = Counter()
+        for name in self.GETTERS:
+            setattr(self.exchange, name, self.counted(name, getattr(self.exchange, name)))
+
+    def tearDown(self):
+        self.exchange.dispatcher.close()
+
+    def counted(self, name, getter):
+        def call(*args, **kwargs):
+            self.calls[name] += 1
+            return getter(*args, **kwargs)
+        return call
+
+    def test_one_read_per_pass(self):
+        self.exchange.begin_tick()
+        try:
+            self.manager.sanity_check()
+            self.manager.place_orders()
+        finally:
+            reads = self.exchange.end_tick()
+
+        # The pass asked for the instrument, ticker, our orders and so on many times...
+        self.assertGreater(self.calls['get_instrument'], 1)
+        self.assertEqual(reads, sum(self.calls.values()))
+        # ...and the connector was read once, for the snapshot.
+        self.assertEqual(self.exchange.bitmex.reads, Counter({'snapshot': 1}))
+        self.assertEqual([kind for kind, _ in self.exchange.bitmex.sent], ['amend', 'create'])
+
+    def test_live_outside_a_pass(self):
+        self.exchange.get_instrument()
+        self.exchange.get_orders()
+        self.assertEqual(self.exchange.bitmex.reads, Counter({'instrument': 1, 'open_orders': 1}))
+        self.assertEqual(self.exchange.tick_reads, 0)
+
+    def test_other_symbols_read_live(self):
+        self.exchange.begin_tick()
+        try:
+            self.exchange.get_instrument('ETHUSD')
+        finally:
+            self.assertEqual(self.exchange.end_tick(), 0)
+        self.assertEqual(self.exchange.bitmex.reads, Counter({'snapshot': 1, 'instrument': 1}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -43,6 +43,7 @@ class ApiClient(object):
     :param host: The base path for the server to call.
     :param header_name: a header to pass when making calls to the API.
     :param header_value: a header value to pass when making calls to the API.
+    :param pool_manager: a urllib3 pool to send on, e.g. a shared Transport's.
     """
 
     PRIMITIVE_TYPES = (float, bool, bytes, text_type) + integer_types
@@ -57,11 +58,11 @@ class ApiClient(object):
         'object': object,
     }
 
-    def __init__(self, header_name=None, header_value=None, cookie=None):
+    def __init__(self, header_name=None, header_value=None, cookie=None, pool_manager=None):
         self.configuration = settings 
 
         self.pool = ThreadPool()
-        self.rest_client = RESTClientObject(settings)
+        self.rest_client = RESTClientObject(settings, pool_manager=pool_manager)
         self.default_headers = {}
         if header_name is not None:
             self.default_headers[header_name] = header_value
@@ -274,12 +275,12 @@ class ApiClient(object):
     def call_api(self, resource_path, method,
                  path_params=None, query_params=None, header_params=None,
                  body=None, post_params=None, files=None,
-                 response_type=None, auth_settings=None, async=None,
+                 response_type=None, auth_settings=None, async_req=None,
                  _return_http_data_only=None, collection_formats=None, _preload_content=True,
                  _request_timeout=None):
         """
         Makes the HTTP request (synchronous) and return the deserialized data.
-        To make an async request, set the async parameter.
+        To make an async request, set the async_req parameter.
 
         :param resource_path: Path to method endpoint.
         :param method: Method to call.
@@ -294,7 +295,7 @@ class ApiClient(object):
         :param response: Response data type.
         :param files dict: key -> filename, value -> filepath,
             for `multipart/form-data`.
-        :param async bool: execute request asynchronously
+        :param async_req bool: execute request asynchronously
         :param _return_http_data_only: response data without head status code and headers
         :param collection_formats: dict of collection formats for path, query,
             header, and post parameters.
@@ -303,13 +304,13 @@ class ApiClient(object):
         :param _request_timeout: timeout setting for this request. If one number provided, it will be total request
                                  timeout. It can also be a pair (tuple) of (connection, read) timeouts.
         :return:
-            If async parameter is True,
+            If async_req parameter is True,
             the request will be called asynchronously.
             The method will return the request thread.
-            If parameter async is False or missing,
+            If parameter async_req is False or missing,
             then the method will return the response directly.
         """
-        if not async:
+        if not async_req:
             return self.__call_api(resource_path, method,
                                    path_params, query_params, header_params,
                                    body, post_params, files,
@@ -0,0 +1,120 @@
+import logging
+from datetime import datetime, timedelta
+from multiprocessing.pool import ThreadPool
+from time import sleep, time
+
+import numpy as np
+
+from market_maker.utils.bars import BarBuffer, to_epoch
+from market_maker.utils.ratelimit import CREATE
+from market_maker.utils.rest import ApiException
+from market_maker.utils.retry import RetryPolicy
+
+# Length of a bin, for each bin size the API has.
+BIN_SIZES = {'1m': timedelta(minutes=1), '5m': timedelta(minutes=5), '1h': timedelta(hours=1), '1d': timedelta(days=1)}
+
+
+class BarBackfill(object):
+    """Fetches a long run of tradeBin bars from the REST API, many requests at a time.
+
+    The API returns at most PAGE_SIZE bins per request, so anything longer takes several, and one
+    after another each waits a full round trip. Instead we split the range into pages of PAGE_SIZE
+    bins, fetch them on up to `workers` threads at once, and stitch them back together in order,
+    dropping the bins that pages share at their edges. Each page is turned into columns as it comes
+    in, so the result is a (len(BarBuffer.COLUMNS), n) float64 array that BarBuffer.extend() can
+    copy in whole.
+
+    `api` is a TradeApi. With a RateLimitGovernor as `ratelimit`, each page takes a token at the
+    lowest priority (CREATE) and waits while there's none to spare, so a backfill never eats into
+    what's kept for cancels and amends. Pages that fail with a 429 or a 5xx are retried under
+    `retryPolicy`; anything else is raised."""
+
+    PAGE_SIZE = 500
+    # Seconds between checks of the rate limit while waiting for room.
+    RATELIMIT_POLL = 0.5
+
+    def __init__(self, api, symbol, binSize='5m', workers=4, ratelimit=None, retryPolicy=None):
+        self.logger = logging.getLogger('root')
+        self.api = api
+        self.symbol = symbol
+        self.binSize = binSize
+        self.bin = BIN_SIZES[binSize]
+        self.workers = workers
+        self.ratelimit = ratelimit
+        self.retryPolicy = retryPolicy or RetryPolicy()
+
+    def pages(self, start, end=None):
+        """(start, end) of each page covering `start` to `end` (default now), both inclusive, as the API takes them."""
+        end = end or datetime.utcnow()
+        span = self.bin * self.PAGE_SIZE
+        pages = []
+        while start <= end:
+            pages.append((start, min(end, start + span - self.bin)))
+            start += span
+        return pages
+
+    def fetch(self, start, end=None):
+        """Bars from `start` to `end` (default now) as columns, oldest first, one per timestamp."""
+        pages = self.pages(start, end)
+        began = time()
+        pool = ThreadPool(max(1, min(self.workers, len(pages))))
+        try:
+            columns = stitch(pool.map(self.fetch_page, pages))
+        finally:
+            pool.close()
+            pool.join()
+        self.logger.info("Backfilled %d %s bars of %s in %d requests, %.1fs." %
+                         (columns.shape[1], self.binSize, self.symbol, len(pages), time() - began))
+        return columns
+
+    def fill(self, buffer, start, end=None):
+        """Fetch bars from `start` into a BarBuffer. Returns how many were added."""
+        return buffer.extend(self.fetch(start, end))
+
+    def fetch_page(self, page):
+        """One page of bars, as columns."""
+        start, end = page
+        call = self.retryPolicy.begin('GET', '/trade/bucketed')
+        while True:
+            if self.ratelimit is not None:
+                self.ratelimit.acquire(CREATE, block=True, poll=self.RATELIMIT_POLL)
+            try:
+                trades, status, headers = self.api.trade_get_bucketed_with_http_info(
+                    bin_size=self.binSize, symbol=self.symbol, count=self.PAGE_SIZE, start_time=start, end_time=end)
+            except ApiException as e:
+                if self.ratelimit is not None and e.headers:
+                    self.ratelimit.update(e.headers)
+                if e.status != 429 and (e.status or 0) < 500:
+                    raise
+                # Over the limit, there's no point trying again before it resets.
+                minimum = 0
+                if e.status == 429 and e.headers and 'X-Ratelimit-Reset' in e.headers:
+                    minimum = int(e.headers['X-Ratelimit-Reset']) - time()
+                delay = call.next_delay(minimum)
+                if delay is None:
+                    raise
+                self.logger.warning("Backfill of %s to %s failed (%s), retrying in %.1fs." %
+                                    (start, end, e.status, delay))
+                sleep(delay)
+                continue
+            if self.ratelimit is not None:
+                self.ratelimit.update(headers)
+            return to_columns(trades)
+
+
+def to_columns(trades):
+    """TradeBins as a (len(BarBuffer.COLUMNS), n) float64 array; missing values are NaN."""
+    if not trades:
+        return np.empty((len(BarBuffer.COLUMNS), 0))
+    return np.array([[to_epoch(trade.timestamp), trade.open, trade.high, trade.low, trade.close, trade.volume]
+                     for trade in trades], dtype=np.float64).T
+
+
+def stitch(pages):
+    """Join pages of columns into one, sorted by timestamp, keeping the first bar seen for each timestamp."""
+    if not pages:
+        return np.empty((len(BarBuffer.COLUMNS), 0))
+    columns = np.concatenate(pages, axis=1)
+    # np.unique sorts, and gives the index of each timestamp's first occurrence.
+    first = np.unique(columns[0], return_index=True)[1]
+    return columns[:, first]
@@ -0,0 +1,101 @@
+import calendar
+from datetime import datetime
+
+import numpy as np
+
+
+class BarBuffer(object):
+    """The last `capacity` OHLCV bars, oldest first, in a fixed-size float64 ring buffer.
+
+    Each column is stored twice over, back to back, and every value is written to both halves.
+    That way the newest `len(self)` values of a column are always one contiguous slice, and
+    buffer['close'] can hand out a view rather than a copy. Views alias the buffer: once it's full,
+    the next append() overwrites the oldest slot, so copy a view if you need to keep it.
+
+    Bars are identified by timestamp (seconds since the epoch; datetimes and BitMEX timestamp
+    strings are converted), and a bar we already have, or one older than the newest, is ignored."""
+
+    COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, capacity=500):
+        self.capacity = capacity
+        self.data = np.full((len(BarBuffer.COLUMNS), 2 * capacity), np.nan)
+        self.columns = dict((name, i) for i, name in enumerate(BarBuffer.COLUMNS))
+        # Slot the next bar goes into, in the first half.
+        self.next = 0
+        self.count = 0
+        # Timestamps of the bars we hold.
+        self.timestamps = set()
+
+    def append(self, timestamp, open, high, low, close, volume):
+        """Add a bar. Returns False if it was ignored as a duplicate or out of order."""
+        timestamp = to_epoch(timestamp)
+        if timestamp in self.timestamps or (self.count and timestamp < self.last_timestamp()):
+            return False
+        if self.count == self.capacity:
+            self.timestamps.discard(self.data[0, self.next])
+        else:
+            self.count += 1
+        self.timestamps.add(timestamp)
+
+        values = [timestamp, open, high, low, close, volume]
+        values = [np.nan if value is None else value for value in values]
+        self.data[:, self.next] = values
+        self.data[:, self.next + self.capacity] = values
+        self.next = (self.next + 1) % self.capacity
+        return True
+
+    def extend(self, columns):
+        """Add many bars at once, from an array with a row per column (as in COLUMNS) and a bar per
+        column of the array, oldest first, one per timestamp. Written in with a couple of slice
+        copies rather than a bar at a time. Bars no newer than the newest we have are ignored, and
+        if there are more than `capacity`, only the newest are kept. Returns how many were added."""
+        columns = np.asarray(columns, dtype=np.float64)
+        if self.count:
+            columns = columns[:, columns[0] > self.last_timestamp()]
+        columns = columns[:, -self.capacity:]
+        added = columns.shape[1]
+        if not added:
+            return 0
+
+        slots = (self.next + np.arange(added)) % self.capacity
+        # Empty slots hold NaN; the rest hold bars that are being pushed out.
+        evicted = self.data[0, slots]
+        self.timestamps.difference_update(evicted[~np.isnan(evicted)].tolist())
+        self.timestamps.update(columns[0].tolist())
+        self.data[:, slots] = columns
+        self.data[:, slots + self.capacity] = columns
+        self.next = (self.next + added) % self.capacity
+        self.count = min(self.capacity, self.count + added)
+        return added
+
+    def last_timestamp(self):
+        """Timestamp of the newest bar, or None if there are none."""
+        if not self.count:
+            return None
+        return self.data[0, self.next + self.capacity - 1]
+
+    def __getitem__(self, column):
+        """A column, oldest bar first, as a view into the buffer."""
+        end = self.next + self.capacity
+        return self.data[self.columns[column], end - self.count:end]
+
+    def __contains__(self, timestamp):
+        return to_epoch(timestamp) in self.timestamps
+
+    def __len__(self):
+        return self.count
+
+
+def to_epoch(timestamp):
+    """Seconds since the epoch for a datetime (naive ones are taken as UTC), a BitMEX timestamp
+    string such as '2017-11-03T00:15:00.000Z', or a number."""
+    if isinstance(timestamp, datetime):
+        return calendar.timegm(timestamp.utctimetuple()) + timestamp.microsecond / 1e6
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    # Sliced rather than strptime()d: the format is fixed, and on Python 2 strptime isn't safe to
+    # call for the first time from several threads at once (backfill parses on a thread pool).
+    text = str(timestamp)
+    return float(calendar.timegm((int(text[0:4]), int(text[5:7]), int(text[8:10]),
+                                  int(text[11:13]), int(text[14:16]), int(text[17:19]))))
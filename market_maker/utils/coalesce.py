@@ -0,0 +1,113 @@
+import logging
+import threading
+from collections import OrderedDict
+from time import time
+
+from market_maker.utils.errors import AmendsQueued
+
+
+class AmendCoalescer(object):
+    """Merges amends to the same orders that come in quick succession into one bulk request.
+
+    In a fast market the loop can want to move the same orders on every pass. The first batch of
+    amends after a quiet spell is sent straight away, so there's no added latency. Amends that
+    arrive within `window` seconds of the last send are queued instead. A later amend to an order
+    that's already queued replaces the queued one, so only the latest price and quantity go out.
+    When the window is up, everything queued is sent as one bulk request from a timer thread.
+
+    `send` takes a list of amends and sends them, e.g. as an order/bulk PUT. Amends that are
+    queued raise AmendsQueued, so the caller knows they haven't gone out yet. If a queued send
+    fails, the error is logged and raised from the next submit() instead of queuing anything, so
+    the caller finds out (e.g. about an `Invalid ordStatus`) and can re-diff the book."""
+
+    def __init__(self, send, window):
+        self.logger = logging.getLogger('root')
+        self.send = send
+        self.window = window
+        self.lock = threading.Lock()
+        self.pending = OrderedDict()
+        self.lastSent = 0
+        self.timer = None
+        # The error from the last queued send, until submit() raises it.
+        self.error = None
+        # Counters. `submitted` and `requests` count calls; `merged` counts amends replaced while queued.
+        self.submitted = 0
+        self.requests = 0
+        self.merged = 0
+
+    def submit(self, orders):
+        """Amend `orders`. Returns what `send` returned if they went straight out, and raises
+        AmendsQueued if they were queued. If the last queued send failed, raises its error and
+        drops `orders`."""
+        with self.lock:
+            if self.error is not None:
+                error, self.error = self.error, None
+                raise error
+            self.submitted += 1
+            for order in orders:
+                if order['orderID'] in self.pending:
+                    self.merged += 1
+                # A queued order keeps its place in the batch and takes the new values.
+                self.pending[order['orderID']] = order
+            wait = self.lastSent + self.window - time()
+            if self.timer is None and wait <= 0:
+                batch = self.__take()
+            else:
+                if self.timer is None:
+                    self.timer = threading.Timer(wait, self.flush)
+                    self.timer.daemon = True
+                    self.timer.start()
+                raise AmendsQueued("%d amends queued to go out within %.2fs." % (len(self.pending), max(wait, 0)))
+        return self.send(batch)
+
+    def flush(self):
+        """Send whatever is queued now."""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            batch = self.__take()
+        if not batch:
+            return
+        try:
+            self.send(batch)
+        except BaseException as e:
+            # BaseException: the connector exits on errors it considers fatal, which would only end this thread.
+            self.logger.warning("Failed to send %d queued amends: %r" % (len(batch), e))
+            with self.lock:
+                self.error = e
+
+    def discard(self, orderIDs):
+        """Forget queued amends to these orders, e.g. because they're being cancelled."""
+        with self.lock:
+            for orderID in orderIDs:
+                self.pending.pop(orderID, None)
+
+    def close(self):
+        """Stop the timer and drop anything queued."""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            self.pending.clear()
+            self.error = None
+
+    def stats(self):
+        with self.lock:
+            return {
+                'submitted': self.submitted,
+                'requests': self.requests,
+                'merged': self.merged,
+                'queued': len(self.pending),
+                # Bulk requests we didn't have to send.
+                'saved': self.submitted - self.requests - (1 if self.pending else 0)
+            }
+
+    def __take(self):
+        # Called with the lock held.
+        batch = list(self.pending.values())
+        self.pending.clear()
+        if batch:
+            self.requests += 1
+            self.lastSent = time()
+        return batch
@@ -0,0 +1,57 @@
+from __future__ import division
+
+
+class OrderDiff(object):
+    """The orders to create, amend and cancel to get from the orders we have to the ones we want.
+
+    `existing` indexes the open orders that were diffed by orderID, e.g. to look up what an
+    amend changes."""
+
+    def __init__(self):
+        self.to_create = []
+        self.to_amend = []
+        self.to_cancel = []
+        self.existing = {}
+
+    def __len__(self):
+        return len(self.to_create) + len(self.to_amend) + len(self.to_cancel)
+
+    def __repr__(self):
+        return 'OrderDiff(create=%d, amend=%d, cancel=%d)' % (
+            len(self.to_create), len(self.to_amend), len(self.to_cancel))
+
+
+def diff_orders(existing_orders, buy_orders, sell_orders, relist_interval=0):
+    """Work out how to converge the open orders we have with the ladder we want.
+
+    Existing orders are matched, in the order given, with the desired orders on their side, in the
+    order given. A matched order is amended if its size differs, or its price is off by more than
+    `relist_interval` (a fraction of price; 0 amends on any change). Existing orders left over are
+    cancelled, and desired orders left over are created.
+
+    Desired orders are dicts with 'price', 'orderQty' and 'side'; existing ones are order table rows.
+    Amends are {'orderID', 'orderQty', 'price', 'side'}, with orderQty including what has already
+    filled, as BitMEX expects. One pass over the orders; nothing is searched."""
+    diff = OrderDiff()
+    desired = {'Buy': buy_orders, 'Sell': sell_orders}
+    matched = {'Buy': 0, 'Sell': 0}
+
+    for order in existing_orders:
+        side = order['side']
+        diff.existing[order['orderID']] = order
+        if matched[side] >= len(desired[side]):
+            # Nothing left to match it with.
+            diff.to_cancel.append(order)
+            continue
+        desired_order = desired[side][matched[side]]
+        matched[side] += 1
+
+        if desired_order['orderQty'] != order['leavesQty'] or (
+                desired_order['price'] != order['price'] and
+                abs((desired_order['price'] / order['price']) - 1) > relist_interval):
+            diff.to_amend.append({'orderID': order['orderID'], 'orderQty': order['cumQty'] + desired_order['orderQty'],
+                                  'price': desired_order['price'], 'side': side})
+
+    for side in ('Buy', 'Sell'):
+        diff.to_create.extend(desired[side][matched[side]:])
+    return diff
@@ -0,0 +1,109 @@
+import logging
+from multiprocessing.pool import ThreadPool
+from time import time
+
+from market_maker.utils.errors import AmendsQueued, RateLimitDeferred
+
+
+class BatchResult(object):
+    """The outcome of sending one batch of orders: what the API returned, or the error it raised."""
+
+    def __init__(self, kind, orders):
+        self.kind = kind
+        self.orders = orders
+        self.result = None
+        self.error = None
+        self.elapsed = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return 'BatchResult(%s, %d orders, %s, %.0fms)' % (
+            self.kind, len(self.orders), 'ok' if self.ok else repr(self.error), (self.elapsed or 0) * 1000)
+
+
+class OrderDispatcher(object):
+    """Sends batches of cancels, amends and creates to the exchange at the same time.
+
+    Sent one after another, a requote that cancels, amends and creates waits three round trips.
+    Cancels and amends don't depend on each other, so we send them together on a small thread pool.
+    That makes it two round trips rather than one, because creates still go after the amends, as
+    they always have: an amend can move one of our orders onto the other side of a new one, and if
+    the amends fail (e.g. `Invalid ordStatus`, an order filled under us) the caller re-ticks from
+    the orders actually on the book - so the creates are then not sent at all, rather than racing
+    it and quoting the ladder twice. Amends held back to save rate limit (RateLimitDeferred)
+    haven't moved anything, so creates go ahead of them; amends queued to be coalesced
+    (AmendsQueued) will, so creates wait for a later pass. An amend to a price we're also
+    cancelling an order at waits until the cancels are done, so it can't cross or be rejected
+    against an order that's on its way out; creates wait for them anyway.
+
+    `exchange` needs cancel_bulk_orders, amend_bulk_orders and create_bulk_orders, each taking a
+    list of orders."""
+
+    def __init__(self, exchange, workers=3):
+        self.logger = logging.getLogger('root')
+        self.exchange = exchange
+        self.pool = ThreadPool(workers)
+
+    def dispatch(self, to_cancel=(), to_amend=(), to_create=()):
+        """Send the batches, and return a BatchResult for each one sent.
+
+        Errors are returned on the batches they came from, not raised, so one failed batch doesn't
+        hide what happened to the others. The exception is SystemExit (the API connector exits on
+        errors it considers fatal), which is re-raised once every batch has finished. Creates that
+        weren't sent because the amends failed get no BatchResult."""
+        cancel_prices = set(order['price'] for order in to_cancel)
+        amend_now, amend_later = split(to_amend, cancel_prices)
+
+        cancels = self.__send('cancel', to_cancel)
+        pending = [cancels, self.__send('amend', amend_now)]
+        if amend_later:
+            if cancels is not None:
+                cancels.wait()
+            pending.append(self.__send('amend', amend_later))
+
+        results = [async_result.get() for async_result in pending if async_result is not None]
+        if to_create:
+            failed = [batch for batch in results if batch.kind == 'amend' and not batch.ok and
+                      not isinstance(batch.error, RateLimitDeferred)]
+            if failed:
+                self.logger.debug("Not sending %d creates, amends failed or are queued: %r", len(to_create), failed)
+            else:
+                # The cancels are done by now too, so nothing is left for a create to cross.
+                results.append(self.__send('create', to_create).get())
+        for batch in results:
+            if isinstance(batch.error, SystemExit):
+                raise batch.error
+        return results
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __send(self, kind, orders):
+        if not orders:
+            return None
+        return self.pool.apply_async(self.__call, (kind, list(orders)))
+
+    def __call(self, kind, orders):
+        batch = BatchResult(kind, orders)
+        start = time()
+        try:
+            batch.result = getattr(self.exchange, '%s_bulk_orders' % kind)(orders)
+        except BaseException as e:
+            # BaseException, so a SystemExit doesn't kill the worker and leave the batch unfinished.
+            batch.error = e
+        batch.elapsed = time() - start
+        self.logger.debug("Sent %r", batch)
+        return batch
+
+
+def split(orders, cancel_prices):
+    """Split orders into those that can go now and those that must wait for the cancels."""
+    if not cancel_prices:
+        return orders, []
+    now = [order for order in orders if order['price'] not in cancel_prices]
+    later = [order for order in orders if order['price'] in cancel_prices]
+    return now, later
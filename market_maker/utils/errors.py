@@ -6,3 +6,9 @@ class MarketClosedError(Exception):
 
 class MarketEmptyError(Exception):
     pass
+
+class RateLimitDeferred(Exception):
+    pass
+
+class AmendsQueued(Exception):
+    pass
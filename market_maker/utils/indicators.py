@@ -0,0 +1,39 @@
+class EMA(object):
+    """An exponential moving average, updated one value at a time.
+
+    Computes what talib.EMA does - the first value is the simple average of the first `period`
+    values, then each value moves it by (value - ema) * 2 / (period + 1) - but keeps the running
+    state, so adding a value is O(1) rather than a pass over the whole history.
+
+    talib only sees the history it's given, so if that's a trimmed window (e.g. the last 500 bars)
+    it seeds from the start of the window each time. The seed's weight decays by a factor of
+    (1 - 2 / (period + 1)) per value, so for periods well short of the window the difference is
+    lost in float error."""
+
+    def __init__(self, period, values=()):
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        self.count = 0
+        # Sum of the values seen before we have `period` of them.
+        self.seedSum = 0.0
+        self.value = float('nan')
+        for value in values:
+            self.update(value)
+
+    def update(self, value):
+        """Add a value (e.g. a bar's close). Returns the new EMA, or NaN until we've seen `period` values."""
+        self.value = self.peek(value)
+        self.count += 1
+        if self.count < self.period:
+            self.seedSum += value
+        return self.value
+
+    def peek(self, value):
+        """What the EMA would be if `value` were added, without adding it.
+
+        Use this for a provisional value with the current trade price on the end."""
+        if self.count + 1 < self.period:
+            return float('nan')
+        if self.count + 1 == self.period:
+            return (self.seedSum + value) / self.period
+        return (value - self.value) * self.k + self.value
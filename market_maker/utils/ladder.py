@@ -0,0 +1,74 @@
+import sys
+
+import numpy as np
+
+from market_maker.utils.math import tickScale
+
+if sys.version_info[0] < 3:
+    def round_ticks(ticks):
+        """round(ticks, 0) for an array of them. On Python 2 that takes halves away from zero."""
+        magnitude = np.abs(ticks)
+        whole = np.floor(magnitude)
+        return np.copysign(whole + (magnitude - whole >= 0.5), ticks)
+else:
+    # On Python 3 round() takes halves to even, as rint does.
+    round_ticks = np.rint
+
+
+class Ladder(object):
+    """Builds the buy and sell ladders place_orders quotes, all levels at once.
+
+    Level i (1 is nearest the spread) is priced at start * (1 + interval) ** i, away from the
+    spread on each side, or ** (i - 1) when maintaining spreads so level 1 sits right at the start
+    price. Level sizes are start_size + (i - 1) * step_size, or random between min_size and
+    max_size. Everything that doesn't depend on the market - the interval multipliers and the
+    fixed sizes - is worked out once here; build() is then a few array operations per side.
+
+    Orders come out from the outside in, as place_orders has always created them (see there)."""
+
+    def __init__(self, pairs, interval, start_size, step_size, maintain_spreads=True,
+                 random_size=False, min_size=None, max_size=None):
+        self.pairs = pairs
+        self.random_size = random_size
+        self.min_size = min_size
+        self.max_size = max_size
+        # Outside in: pairs, pairs - 1, ..., 1.
+        levels = np.arange(pairs, 0, -1)
+        exponents = levels - 1 if maintain_spreads else levels
+        self.sell_multipliers = (1 + interval) ** exponents.astype(np.float64)
+        self.buy_multipliers = (1 + interval) ** -exponents.astype(np.float64)
+        self.sizes = start_size + (levels - 1) * step_size
+
+    def build(self, start_buy, start_sell, tick_size, buys=True, sells=True, depth=None):
+        """Return (buy_orders, sell_orders) as lists of order dicts.
+
+        Prices are rounded to the nearest tick. Pass buys or sells as False to leave that side
+        out, e.g. when a position limit has been reached. Pass depth to quote only that many
+        levels nearest the spread on each side, e.g. when we're short of rate limit."""
+        buy_prices, buy_sizes, sell_prices, sell_sizes = self.arrays(start_buy, start_sell, tick_size)
+        # Outside in, so the innermost levels are at the end.
+        levels = slice(-depth, None) if depth is not None and depth < self.pairs else slice(None)
+        buy_orders = to_orders('Buy', buy_prices[levels], buy_sizes[levels]) if buys and depth != 0 else []
+        sell_orders = to_orders('Sell', sell_prices[levels], sell_sizes[levels]) if sells and depth != 0 else []
+        return buy_orders, sell_orders
+
+    def arrays(self, start_buy, start_sell, tick_size):
+        """Return (buy_prices, buy_sizes, sell_prices, sell_sizes) as arrays, outside in."""
+        scale = tickScale(tick_size)
+        return (self.__round(start_buy * self.buy_multipliers, scale), self.__sizes(),
+                self.__round(start_sell * self.sell_multipliers, scale), self.__sizes())
+
+    def __round(self, prices, scale):
+        # Round to a whole number of ticks, exactly as toNearest does, then scale back by an exact
+        # power of ten. That gives the float nearest the decimal price, e.g. 401.46 rather than
+        # 401.46000000000004, as toNearest does too. See TickScale.
+        return round_ticks(prices / scale.tickSize) * scale.units / scale.divisor
+
+    def __sizes(self):
+        if self.random_size:
+            return np.random.randint(self.min_size, self.max_size + 1, self.pairs)
+        return self.sizes
+
+
+def to_orders(side, prices, sizes):
+    return [{'price': price, 'orderQty': size, 'side': side} for price, size in zip(prices.tolist(), sizes.tolist())]
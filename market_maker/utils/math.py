@@ -1,9 +1,66 @@
 from decimal import Decimal
 
+# Above this, integers can't all be represented exactly as floats.
+MAX_EXACT_INT = 2 ** 53
+# Powers of ten up to this are exact as floats.
+MAX_EXACT_POWER = 22
+
+
+class TickScale(object):
+    """Rounds prices to one tick size.
+
+    A tick size is a decimal, units / 10 ** power with both integers (0.5 is 5 / 10, 0.01 is
+    1 / 100). A price of n ticks is then exactly n * units / 10 ** power, and while n * units fits
+    in a float's 53 bits that's one exact integer product and one correctly rounded division - so
+    to_nearest() gives the float nearest the decimal price, the same one Decimal arithmetic gives,
+    without the cost of Decimal. Use tickScale() to get the cached instance for a tick size."""
+
+    def __init__(self, tickSize):
+        self.tickSize = tickSize
+        # Parsed the same way toNearestDecimal() does, so results agree exactly.
+        self.tickDec = Decimal(str(tickSize))
+        _, digits, exponent = self.tickDec.as_tuple()
+        self.units = int(''.join(str(digit) for digit in digits))
+        self.power = 0
+        if exponent >= 0:
+            self.units *= 10 ** exponent
+        else:
+            self.power = -exponent
+        self.divisor = float(10 ** self.power)
+        self.exact = self.power <= MAX_EXACT_POWER
+
+    def to_nearest(self, num):
+        """Round a number to the nearest tick. Gives exactly what toNearestDecimal() gives."""
+        ticks = round(num / self.tickSize, 0)
+        product = ticks * self.units
+        # Leave anything the fast path can't promise to get exactly right to Decimal: NaN and
+        # infinity (which also fail the comparison), zero, and products too big to be exact.
+        if not self.exact or not 0 < abs(product) < MAX_EXACT_INT:
+            return float(Decimal(ticks) * self.tickDec)
+        return product / self.divisor
+
+
+# tickSize -> TickScale
+TICK_SCALES = {}
+
+
+def tickScale(tickSize):
+    """Return the (cached) TickScale for a tick size."""
+    scale = TICK_SCALES.get(tickSize)
+    if scale is None:
+        scale = TICK_SCALES[tickSize] = TickScale(tickSize)
+    return scale
+
+
 def toNearest(num, tickSize):
     """Given a number, round it to the nearest tick. Very useful for sussing float error
        out of numbers: e.g. toNearest(401.46, 0.01) -> 401.46, whereas processing is
        normally with floats would give you 401.46000000000004.
        Use this after adding/subtracting/multiplying numbers."""
+    return tickScale(tickSize).to_nearest(num)
+
+
+def toNearestDecimal(num, tickSize):
+    """toNearest() done entirely in Decimal. Slower; kept as the reference toNearest() must match."""
     tickDec = Decimal(str(tickSize))
     return float((Decimal(round(num / tickSize, 0)) * tickDec))
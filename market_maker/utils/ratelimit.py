@@ -0,0 +1,115 @@
+import threading
+from time import sleep, time
+
+# Request priorities, most important first.
+CANCEL = 0
+AMEND = 1
+CREATE = 2
+PRIORITY_NAMES = {CANCEL: 'cancel', AMEND: 'amend', CREATE: 'create'}
+
+
+def request_priority(verb, path):
+    """How important a REST request is to get through: cancels, then amends and other requests, then creates."""
+    if verb == 'DELETE':
+        return CANCEL
+    if verb == 'POST' and path.lstrip('/').startswith('order'):
+        return CREATE
+    return AMEND
+
+
+class RateLimitGovernor(object):
+    """Keeps track of how much of the REST rate limit we have left, and rations it.
+
+    BitMEX reports the limit on every response: X-Ratelimit-Limit (the size of the bucket),
+    X-Ratelimit-Remaining (what's left in it) and X-Ratelimit-Reset (when it'll be full again).
+    Between responses we estimate the bucket as refilling at a steady rate towards full at the
+    reset time, and take a token out for each request we send.
+
+    Rather than spend the last of the budget on whatever comes first and then be locked out, the
+    last `amendReserve` of the limit is kept for cancels, and the last `createReserve` for cancels
+    and amends: acquire() refuses a lower priority request that would dig into its reserve, and the
+    caller defers it (the next pass of the loop merges it into a fresh plan). Cancels are never
+    refused; getting out of the market matters more than the limit."""
+
+    def __init__(self, amendReserve=0.1, createReserve=0.2):
+        self.reserves = {CANCEL: 0, AMEND: amendReserve, CREATE: createReserve}
+        self.lock = threading.Lock()
+        # Unknown until the first response.
+        self.limit = None
+        self.remaining = None
+        self.refillRate = 0
+        self.updatedAt = None
+        self.sent = 0
+        self.deferred = dict((priority, 0) for priority in PRIORITY_NAMES)
+
+    def update(self, headers):
+        """Read the limit headers from a response."""
+        try:
+            limit = int(headers['X-Ratelimit-Limit'])
+            remaining = int(headers['X-Ratelimit-Remaining'])
+            reset = int(headers.get('X-Ratelimit-Reset', 0))
+        except (KeyError, TypeError, ValueError):
+            return
+        now = time()
+        with self.lock:
+            self.limit = limit
+            self.remaining = float(remaining)
+            self.updatedAt = now
+            # If the bucket is full by `reset`, that's how fast it's refilling.
+            self.refillRate = (limit - remaining) / float(reset - now) if reset > now else 0
+
+    def acquire(self, priority, block=False, poll=0.5):
+        """Take a token for a request. Returns False if the request should be deferred instead.
+
+        With `block`, waits until the request can go rather than deferring it, checking at least
+        every `poll` seconds, and returns True. However long it waits, that's one deferral."""
+        deferred = False
+        while True:
+            with self.lock:
+                shortfall = self.__shortfall(priority)
+                if shortfall is None:
+                    return True
+                if not deferred:
+                    self.deferred[priority] += 1
+                    deferred = True
+                if not block:
+                    return False
+                # Sleep until the bucket should have refilled enough, or we might hear otherwise.
+                delay = min(poll, shortfall / self.refillRate) if self.refillRate > 0 else poll
+            sleep(delay)
+
+    def budget(self):
+        """The fraction of the limit we have left (0 to 1), or None if we haven't heard yet."""
+        with self.lock:
+            tokens = self.__tokens()
+            return None if tokens is None else max(0, tokens) / float(self.limit)
+
+    def stats(self):
+        with self.lock:
+            tokens = self.__tokens()
+            return {
+                'limit': self.limit,
+                'remaining': tokens,
+                'sent': self.sent,
+                'deferred': dict((PRIORITY_NAMES[p], count) for p, count in self.deferred.items())
+            }
+
+    def __shortfall(self, priority):
+        """Take a token and return None, or return how many tokens short of the reserve we'd be."""
+        # Called with the lock held.
+        tokens = self.__tokens()
+        if tokens is not None and priority != CANCEL:
+            shortfall = self.reserves[priority] * self.limit - (tokens - 1)
+            if shortfall > 0:
+                return shortfall
+        if tokens is not None:
+            self.remaining = tokens - 1
+            self.updatedAt = time()
+        self.sent += 1
+        return None
+
+    def __tokens(self):
+        if self.limit is None:
+            return None
+        refilled = self.remaining + (time() - self.updatedAt) * self.refillRate
+        return min(float(self.limit), refilled)
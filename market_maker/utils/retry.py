@@ -0,0 +1,72 @@
+import random
+import threading
+from time import time
+
+# Verbs that are safe to send again: doing them twice has the same effect as doing them once.
+IDEMPOTENT_VERBS = ('GET', 'HEAD', 'OPTIONS', 'DELETE')
+
+
+class RetryPolicy(object):
+    """Decides whether and when to retry a failed REST request, and keeps count per endpoint.
+
+    Each request gets its own RetryCall from begin(), so one request's retries never use up
+    another's, and concurrent requests only ever wait in their own thread. Waits grow
+    exponentially from `backoff` up to `maxBackoff` seconds. With `jitter`, each wait is shortened
+    by a random fraction of up to that much, so requests that failed together don't all come back
+    at once. A request is given up on once it has had its retries, or when the next wait would take
+    it past `deadline` seconds from when it was first sent.
+
+    Only idempotent verbs are retried by default; see IDEMPOTENT_VERBS."""
+
+    def __init__(self, maxRetries=3, backoff=0.5, maxBackoff=10, deadline=60, jitter=0.5):
+        self.maxRetries = maxRetries
+        self.backoff = backoff
+        self.maxBackoff = maxBackoff
+        self.deadline = deadline
+        self.jitter = jitter
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def begin(self, verb, path, maxRetries=None):
+        """Start a request. `maxRetries` overrides the policy for this call."""
+        if maxRetries is None:
+            maxRetries = self.maxRetries if verb in IDEMPOTENT_VERBS else 0
+        return RetryCall(self, '%s %s' % (verb, path), maxRetries)
+
+    def delay(self, attempt):
+        """How long to wait before retry number `attempt` (1 is the first retry)."""
+        delay = min(self.maxBackoff, self.backoff * 2 ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def stats(self):
+        """Per endpoint ('VERB path'): requests, retries, failures (given up on) and seconds spent waiting."""
+        with self.lock:
+            return dict((endpoint, dict(counts)) for endpoint, counts in self.endpoints.items())
+
+    def record(self, endpoint, **counts):
+        with self.lock:
+            totals = self.endpoints.setdefault(endpoint, {'requests': 0, 'retries': 0, 'failures': 0, 'waited': 0})
+            for name, count in counts.items():
+                totals[name] += count
+
+
+class RetryCall(object):
+    """The retry state of one request."""
+
+    def __init__(self, policy, endpoint, maxRetries):
+        self.policy = policy
+        self.endpoint = endpoint
+        self.maxRetries = maxRetries
+        self.attempt = 0
+        self.started = time()
+        policy.record(endpoint, requests=1)
+
+    def next_delay(self, minimum=0):
+        """How long to wait before trying again, at least `minimum` seconds, or None to give up."""
+        self.attempt += 1
+        delay = max(minimum, self.policy.delay(self.attempt))
+        if self.attempt > self.maxRetries or time() + delay > self.started + self.policy.deadline:
+            self.policy.record(self.endpoint, failures=1)
+            return None
+        self.policy.record(self.endpoint, retries=1, waited=delay)
+        return delay
@@ -0,0 +1,159 @@
+from __future__ import absolute_import
+
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from market_maker.utils.backfill import BarBackfill, stitch, to_columns
+from market_maker.utils.bars import BarBuffer, to_epoch
+from market_maker.utils.ratelimit import RateLimitGovernor
+from market_maker.utils.rest import ApiException
+from market_maker.utils.retry import RetryPolicy
+from market_maker.utils.trade_bin import TradeBin
+
+START = datetime(2018, 1, 1)
+
+
+def trade_bin(minutes, close=None):
+    """The 5m bin ending `minutes` after START."""
+    close = minutes if close is None else close
+    return TradeBin(timestamp=(START + timedelta(minutes=minutes)).strftime('%Y-%m-%dT%H:%M:%S.000Z'), symbol='XBTUSD',
+                    open=close, high=close, low=close, close=close, volume=1)
+
+
+def headers(remaining=290, reset_in=1):
+    return {'X-Ratelimit-Limit': '300', 'X-Ratelimit-Remaining': str(remaining),
+            'X-Ratelimit-Reset': str(int(time.time()) + reset_in)}
+
+
+class FakeTradeApi(object):
+    """5m bins every 5 minutes, with the close the number of minutes since START."""
+
+    def __init__(self, latency=0, fail=()):
+        self.latency = latency
+        self.fail = list(fail)
+        self.lock = threading.Lock()
+        self.requests = []
+        self.inFlight = 0
+        self.maxInFlight = 0
+
+    def trade_get_bucketed_with_http_info(self, bin_size, symbol, count, start_time, end_time):
+        with self.lock:
+            self.requests.append((start_time, end_time))
+            self.inFlight += 1
+            self.maxInFlight = max(self.maxInFlight, self.inFlight)
+            status = self.fail.pop(0) if self.fail else None
+        try:
+            time.sleep(self.latency)
+            if status:
+                raise ApiException(status=status, reason='failed')
+            bins = []
+            timestamp = start_time
+            while timestamp <= end_time and len(bins) < count:
+                bins.append(trade_bin((timestamp - START).total_seconds() / 60))
+                timestamp += timedelta(minutes=5)
+            return bins, 200, headers()
+        finally:
+            with self.lock:
+                self.inFlight -= 1
+
+
+class TestBarBackfill(unittest.TestCase):
+
+    def test_pages(self):
+        backfill = BarBackfill(FakeTradeApi(), 'XBT', '5m')
+        pages = backfill.pages(START, START + timedelta(minutes=5 * 1200))
+        self.assertEqual(pages, [(START, START + timedelta(minutes=5 * 499)),
+                                 (START + timedelta(minutes=5 * 500), START + timedelta(minutes=5 * 999)),
+                                 (START + timedelta(minutes=5 * 1000), START + timedelta(minutes=5 * 1200))])
+
+    def test_fetch_in_order_with_bounded_concurrency(self):
+        api = FakeTradeApi(latency=0.05)
+        backfill = BarBackfill(api, 'XBT', '5m', workers=3)
+        columns = backfill.fetch(START, START + timedelta(days=10))
+        self.assertEqual(columns.shape, (6, 12 * 24 * 10 + 1))
+        self.assertEqual(columns[0, 0], to_epoch(START))
+        self.assertEqual(list(columns[4, :3]), [0, 5, 10])
+        self.assertTrue((columns[0, 1:] - columns[0, :-1] == 300).all())
+        self.assertEqual(len(api.requests), 6)
+        self.assertEqual(api.maxInFlight, 3)
+
+    def test_to_epoch(self):
+        epoch = 1514764800.0
+        for timestamp in (START, '2018-01-01T00:00:00.000Z', '2018-01-01 00:00:00', u'2018-01-01T00:00:00Z', epoch):
+            self.assertEqual(to_epoch(timestamp), epoch, timestamp)
+        self.assertEqual(to_epoch('2018-03-04T05:06:07.890Z'), epoch + (31 + 28 + 3) * 86400 + 5 * 3600 + 6 * 60 + 7)
+
+    def test_stitch_drops_repeats(self):
+        first = to_columns([trade_bin(5, close=1), trade_bin(10, close=2)])
+        second = to_columns([trade_bin(10, close=3), trade_bin(15, close=4)])
+        columns = stitch([second, first])
+        self.assertEqual(list(columns[4]), [1, 3, 4])
+        self.assertEqual(stitch([]).shape, (6, 0))
+
+    def test_retries_server_errors(self):
+        api = FakeTradeApi(fail=[503])
+        backfill = BarBackfill(api, 'XBT', '5m', retryPolicy=RetryPolicy(backoff=0, jitter=0))
+        self.assertEqual(backfill.fetch(START, START + timedelta(minutes=50)).shape, (6, 11))
+        self.assertEqual(len(api.requests), 2)
+
+        backfill = BarBackfill(FakeTradeApi(fail=[400]), 'XBT', '5m', retryPolicy=RetryPolicy(backoff=0))
+        with self.assertRaises(ApiException):
+            backfill.fetch(START, START + timedelta(minutes=50))
+
+    def test_waits_for_rate_limit(self):
+        ratelimit = RateLimitGovernor(createReserve=0.2)
+        ratelimit.update(headers(remaining=60, reset_in=600))
+        api = FakeTradeApi()
+        backfill = BarBackfill(api, 'XBT', '5m', ratelimit=ratelimit)
+        backfill.RATELIMIT_POLL = 0.01
+        thread = threading.Thread(target=backfill.fetch, args=(START, START + timedelta(minutes=50)))
+        thread.start()
+        time.sleep(0.1)
+        self.assertEqual(api.requests, [])
+        ratelimit.update(headers(remaining=290))
+        thread.join(1)
+        self.assertEqual(len(api.requests), 1)
+        # However many times it checked, the wait counts as one deferral.
+        self.assertEqual(ratelimit.stats()['deferred']['create'], 1)
+
+    def test_fill(self):
+        bars = BarBuffer(100)
+        backfill = BarBackfill(FakeTradeApi(), 'XBT', '5m')
+        self.assertEqual(backfill.fill(bars, START, START + timedelta(days=1)), 100)
+        self.assertEqual(bars['close'][-1], 24 * 60)
+        self.assertEqual(len(bars), 100)
+
+
+class TestBarBufferExtend(unittest.TestCase):
+
+    def columns(self, minutes):
+        return to_columns([trade_bin(m) for m in minutes])
+
+    def test_matches_append(self):
+        appended, extended = BarBuffer(5), BarBuffer(5)
+        for minutes in ([0, 5], [10, 15, 20, 25], [30]):
+            for m in minutes:
+                appended.append(START + timedelta(minutes=m), m, m, m, m, 1)
+            extended.extend(self.columns(minutes))
+            for column in BarBuffer.COLUMNS:
+                self.assertEqual(list(extended[column]), list(appended[column]))
+            self.assertEqual(extended.timestamps, appended.timestamps)
+
+    def test_keeps_newest(self):
+        bars = BarBuffer(3)
+        self.assertEqual(bars.extend(self.columns(range(0, 50, 5))), 3)
+        self.assertEqual(list(bars['close']), [35, 40, 45])
+        self.assertEqual(len(bars.timestamps), 3)
+
+    def test_ignores_old_bars(self):
+        bars = BarBuffer(10)
+        bars.extend(self.columns([10, 15]))
+        self.assertEqual(bars.extend(self.columns([5, 10, 15, 20])), 1)
+        self.assertEqual(list(bars['close']), [10, 15, 20])
+        self.assertEqual(bars.extend(self.columns([])), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
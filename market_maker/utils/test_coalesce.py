@@ -0,0 +1,72 @@
+from __future__ import absolute_import
+
+import time
+import unittest
+
+from market_maker.utils.coalesce import AmendCoalescer
+from market_maker.utils.errors import AmendsQueued
+
+
+def amend(orderID, price):
+    return {'orderID': orderID, 'price': price, 'orderQty': 100}
+
+
+class TestAmendCoalescer(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+        self.coalescer = AmendCoalescer(self.send, 0.05)
+
+    def tearDown(self):
+        self.coalescer.close()
+
+    def send(self, orders):
+        self.sent.append(orders)
+        return orders
+
+    def test_quiet_goes_straight_out(self):
+        self.assertEqual(self.coalescer.submit([amend('a', 1)]), [amend('a', 1)])
+        self.assertEqual(len(self.sent), 1)
+        time.sleep(0.06)
+        self.assertEqual(self.coalescer.submit([amend('a', 2)]), [amend('a', 2)])
+        self.assertEqual(len(self.sent), 2)
+
+    def test_burst_is_merged(self):
+        self.coalescer.submit([amend('a', 1), amend('b', 1)])
+        with self.assertRaises(AmendsQueued):
+            self.coalescer.submit([amend('a', 2), amend('b', 2)])
+        with self.assertRaises(AmendsQueued):
+            self.coalescer.submit([amend('a', 3), amend('c', 3)])
+        self.assertEqual(len(self.sent), 1)
+        time.sleep(0.1)
+        # The latest of each, in the order they were first queued.
+        self.assertEqual(self.sent[1], [amend('a', 3), amend('b', 2), amend('c', 3)])
+        stats = self.coalescer.stats()
+        self.assertEqual((stats['submitted'], stats['requests'], stats['merged'], stats['saved']), (3, 2, 1, 1))
+
+    def test_discard(self):
+        self.coalescer.submit([amend('a', 1)])
+        self.assertRaises(AmendsQueued, self.coalescer.submit, [amend('a', 2), amend('b', 2)])
+        self.coalescer.discard(['a'])
+        self.coalescer.flush()
+        self.assertEqual(self.sent[1], [amend('b', 2)])
+
+    def test_queued_errors_go_back_to_the_next_submit(self):
+        def fail(orders):
+            raise ValueError('Invalid ordStatus')
+        self.coalescer.send = fail
+        self.coalescer.lastSent = time.time()
+        self.assertRaises(AmendsQueued, self.coalescer.submit, [amend('a', 1)])
+        self.coalescer.flush()
+        self.assertEqual(self.coalescer.stats()['queued'], 0)
+        # The caller hears about it, and its new amends aren't queued behind the failure.
+        with self.assertRaises(ValueError):
+            self.coalescer.submit([amend('a', 2)])
+        self.assertEqual(self.coalescer.stats()['queued'], 0)
+        self.coalescer.send = self.send
+        self.coalescer.lastSent = 0
+        self.assertEqual(self.coalescer.submit([amend('a', 3)]), [amend('a', 3)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+from __future__ import absolute_import
+
+import unittest
+
+from market_maker.utils.converge import diff_orders
+
+
+def existing(orderID, side, price, leavesQty, cumQty=0):
+    return {'orderID': orderID, 'side': side, 'price': price, 'leavesQty': leavesQty, 'cumQty': cumQty}
+
+
+def desired(side, price, orderQty):
+    return {'side': side, 'price': price, 'orderQty': orderQty}
+
+
+class TestDiffOrders(unittest.TestCase):
+    """ diff_orders should give the smallest set of changes, as converge_orders always has """
+
+    def test_nothing_to_do(self):
+        diff = diff_orders([existing('a', 'Buy', 100, 10), existing('b', 'Sell', 110, 10)],
+                           [desired('Buy', 100, 10)], [desired('Sell', 110, 10)])
+        self.assertEqual(len(diff), 0)
+
+    def test_creates_what_is_missing(self):
+        buys = [desired('Buy', 99, 20), desired('Buy', 100, 10)]
+        sells = [desired('Sell', 111, 20), desired('Sell', 110, 10)]
+        diff = diff_orders([existing('a', 'Buy', 99, 20)], buys, sells)
+        self.assertEqual(diff.to_create, [buys[1]] + sells)
+        self.assertEqual(diff.to_amend, [])
+        self.assertEqual(diff.to_cancel, [])
+
+    def test_cancels_what_is_left_over(self):
+        orders = [existing('a', 'Buy', 99, 20), existing('b', 'Buy', 100, 10), existing('c', 'Sell', 110, 10)]
+        diff = diff_orders(orders, [desired('Buy', 99, 20)], [])
+        self.assertEqual(diff.to_cancel, orders[1:])
+        self.assertEqual(diff.to_create, [])
+
+    def test_amends_size_including_filled(self):
+        order = existing('a', 'Buy', 100, 5, cumQty=5)
+        diff = diff_orders([order], [desired('Buy', 100, 20)], [])
+        self.assertEqual(diff.to_amend, [{'orderID': 'a', 'orderQty': 25, 'price': 100, 'side': 'Buy'}])
+        self.assertIs(diff.existing['a'], order)
+
+    def test_relist_interval(self):
+        orders = [existing('a', 'Sell', 100, 10)]
+        self.assertEqual(len(diff_orders(orders, [], [desired('Sell', 100.5, 10)], 0.01)), 0)
+        diff = diff_orders(orders, [], [desired('Sell', 102, 10)], 0.01)
+        self.assertEqual(diff.to_amend, [{'orderID': 'a', 'orderQty': 10, 'price': 102, 'side': 'Sell'}])
+        # With no interval, any price change is an amend.
+        self.assertEqual(len(diff_orders(orders, [], [desired('Sell', 100.5, 10)]).to_amend), 1)
+
+    def test_matches_in_order_per_side(self):
+        orders = [existing('s1', 'Sell', 112, 30), existing('b1', 'Buy', 98, 30),
+                  existing('s2', 'Sell', 111, 20), existing('b2', 'Buy', 99, 20)]
+        buys = [desired('Buy', 98, 30), desired('Buy', 99.5, 20)]
+        sells = [desired('Sell', 112, 30), desired('Sell', 111, 20), desired('Sell', 110, 10)]
+        diff = diff_orders(orders, buys, sells)
+        self.assertEqual(diff.to_amend, [{'orderID': 'b2', 'orderQty': 20, 'price': 99.5, 'side': 'Buy'}])
+        self.assertEqual(diff.to_create, [sells[2]])
+        self.assertEqual(diff.to_cancel, [])
+        self.assertEqual(set(diff.existing), set(['s1', 'b1', 's2', 'b2']))
+
+
+if __name__ == '__main__':
+    unittest.main()
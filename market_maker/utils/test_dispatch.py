@@ -0,0 +1,100 @@
+from __future__ import absolute_import
+
+import threading
+import unittest
+
+from market_maker.utils.dispatch import OrderDispatcher
+from market_maker.utils.errors import AmendsQueued, RateLimitDeferred
+
+
+class FakeExchange(object):
+    """Records the order batches are sent in; a batch kind can be made to fail or to block."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = []
+        self.errors = {}
+        self.release = {}
+
+    def __send(self, kind, orders):
+        if kind in self.release:
+            self.release[kind].wait(5)
+        with self.lock:
+            self.sent.append((kind, [order['price'] for order in orders]))
+        if kind in self.errors:
+            raise self.errors[kind]
+        return orders
+
+    def cancel_bulk_orders(self, orders):
+        return self.__send('cancel', orders)
+
+    def amend_bulk_orders(self, orders):
+        return self.__send('amend', orders)
+
+    def create_bulk_orders(self, orders):
+        return self.__send('create', orders)
+
+
+def orders(*prices):
+    return [{'price': price} for price in prices]
+
+
+class TestOrderDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.exchange = FakeExchange()
+        self.dispatcher = OrderDispatcher(self.exchange)
+
+    def tearDown(self):
+        self.dispatcher.close()
+
+    def test_creates_after_amends(self):
+        self.exchange.release['amend'] = threading.Event()
+        done = []
+        thread = threading.Thread(target=lambda: done.append(
+            self.dispatcher.dispatch(orders(1), orders(2), orders(3))))
+        thread.start()
+        thread.join(0.2)
+        # Cancels don't wait for the amends; creates do.
+        self.assertEqual(self.exchange.sent, [('cancel', [1])])
+        self.exchange.release['amend'].set()
+        thread.join(5)
+        self.assertEqual(self.exchange.sent, [('cancel', [1]), ('amend', [2]), ('create', [3])])
+        self.assertEqual([batch.kind for batch in done[0]], ['cancel', 'amend', 'create'])
+
+    def test_amend_at_cancelled_price_waits(self):
+        self.exchange.release['cancel'] = threading.Event()
+        thread = threading.Thread(target=self.dispatcher.dispatch, args=(orders(1), orders(1, 2)))
+        thread.start()
+        thread.join(0.2)
+        self.assertEqual(self.exchange.sent, [('amend', [2])])
+        self.exchange.release['cancel'].set()
+        thread.join(5)
+        self.assertEqual(self.exchange.sent, [('amend', [2]), ('cancel', [1]), ('amend', [1])])
+
+    def test_no_creates_when_amends_fail(self):
+        self.exchange.errors['amend'] = ValueError('Invalid ordStatus')
+        results = self.dispatcher.dispatch(orders(1), orders(2), orders(3))
+        self.assertEqual([batch.kind for batch in results], ['cancel', 'amend'])
+        self.assertIsInstance(results[1].error, ValueError)
+        self.assertNotIn('create', [kind for kind, _ in self.exchange.sent])
+
+    def test_creates_when_amends_deferred(self):
+        self.exchange.errors['amend'] = RateLimitDeferred('low budget')
+        results = self.dispatcher.dispatch((), orders(2), orders(3))
+        self.assertEqual([(batch.kind, batch.ok) for batch in results], [('amend', False), ('create', True)])
+
+    def test_no_creates_while_amends_queued(self):
+        self.exchange.errors['amend'] = AmendsQueued('1 amends queued')
+        results = self.dispatcher.dispatch((), orders(2), orders(3))
+        self.assertEqual([batch.kind for batch in results], ['amend'])
+        self.assertNotIn('create', [kind for kind, _ in self.exchange.sent])
+
+    def test_system_exit(self):
+        self.exchange.errors['create'] = SystemExit(1)
+        with self.assertRaises(SystemExit):
+            self.dispatcher.dispatch((), (), orders(3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+from __future__ import absolute_import
+
+import math
+import random
+import unittest
+
+import numpy as np
+
+try:
+    import talib as ta
+except ImportError:
+    ta = None
+
+from market_maker.utils.indicators import EMA
+
+
+@unittest.skipIf(ta is None, "needs talib")
+class TestEMA(unittest.TestCase):
+    """ EMA should give what talib.EMA gives over the same history """
+
+    def setUp(self):
+        rng = random.Random(42)
+        price = 10000.0
+        self.closes = []
+        for _ in range(600):
+            price = round(price + rng.gauss(0, 15), 1)
+            self.closes.append(price)
+
+    def assertMatchesTalib(self, period, closes):
+        expected = ta.EMA(np.array(closes), period)
+        ema = EMA(period)
+        for i, close in enumerate(closes):
+            value = ema.update(close)
+            if math.isnan(expected[i]):
+                self.assertTrue(math.isnan(value))
+            else:
+                self.assertAlmostEqual(value, expected[i], delta=1e-9 * abs(expected[i]))
+
+    def test_update_matches_talib(self):
+        for period in [1, 2, 7, 30, 100]:
+            self.assertMatchesTalib(period, self.closes)
+
+    def test_seeded_from_history(self):
+        for period in [7, 30]:
+            ema = EMA(period, self.closes[:500])
+            expected = ta.EMA(np.array(self.closes[:500]), period)[-1]
+            self.assertAlmostEqual(ema.value, expected, delta=1e-9 * expected)
+
+    def test_peek_matches_talib_and_does_not_update(self):
+        for period in [7, 30]:
+            ema = EMA(period, self.closes[:500])
+            value, count = ema.value, ema.count
+            price = self.closes[500]
+            expected = ta.EMA(np.array(self.closes[:500] + [price]), period)[-1]
+            self.assertAlmostEqual(ema.peek(price), expected, delta=1e-9 * expected)
+            self.assertEqual(ema.value, value)
+            self.assertEqual(ema.count, count)
+
+    def test_peek_before_seeded(self):
+        ema = EMA(3, [1.0])
+        self.assertTrue(math.isnan(ema.peek(2.0)))
+        ema.update(2.0)
+        self.assertEqual(ema.peek(6.0), 3.0)
+        self.assertTrue(math.isnan(ema.value))
+
+    def test_sliding_window_close_to_talib(self):
+        # The bot keeps 500 closes; talib re-seeds at the start of that window, we don't.
+        ema = EMA(30, self.closes[:500])
+        for i in range(500, len(self.closes)):
+            ema.update(self.closes[i])
+            expected = ta.EMA(np.array(self.closes[i - 499:i + 1]), 30)[-1]
+            self.assertAlmostEqual(ema.value, expected, delta=1e-9 * expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
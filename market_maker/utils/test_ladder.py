@@ -0,0 +1,77 @@
+from __future__ import absolute_import
+
+import random
+import unittest
+
+import numpy as np
+
+from market_maker.utils.ladder import Ladder, round_ticks
+from market_maker.utils.math import toNearest
+
+
+def per_level(pairs, interval, start_buy, start_sell, tick_size, maintain_spreads=True):
+    """The ladder as place_orders used to price it: get_price_offset -> toNearest, one level at a time."""
+    buy_orders = []
+    sell_orders = []
+    for i in reversed(range(1, pairs + 1)):
+        for index in (-i, i):
+            start = start_buy if index < 0 else start_sell
+            offset = index
+            if maintain_spreads:
+                offset = index + 1 if index < 0 else index - 1
+            order = {'price': toNearest(start * (1 + interval) ** offset, tick_size),
+                     'orderQty': 100 + (abs(index) - 1) * 100, 'side': "Buy" if index < 0 else "Sell"}
+            (buy_orders if index < 0 else sell_orders).append(order)
+    return buy_orders, sell_orders
+
+
+class TestLadder(unittest.TestCase):
+
+    def assertMatchesPerLevel(self, pairs, interval, start_buy, start_sell, tick_size, maintain_spreads=True):
+        ladder = Ladder(pairs, interval, 100, 100, maintain_spreads=maintain_spreads)
+        self.assertEqual(ladder.build(start_buy, start_sell, tick_size),
+                         per_level(pairs, interval, start_buy, start_sell, tick_size, maintain_spreads))
+
+    def test_matches_per_level(self):
+        for pairs in (1, 6, 100, 500):
+            for maintain_spreads in (True, False):
+                self.assertMatchesPerLevel(pairs, 0.0005, 10000.5, 10001.0, 0.5, maintain_spreads)
+                self.assertMatchesPerLevel(pairs, 0.005, 401.46, 401.52, 0.01, maintain_spreads)
+
+    def test_matches_per_level_random(self):
+        rng = random.Random(3)
+        for _ in range(200):
+            tick_size = rng.choice([0.5, 1, 0.01, 0.05, 0.0001, 2.5])
+            start = rng.uniform(1, 50000)
+            self.assertMatchesPerLevel(rng.randint(1, 20), rng.uniform(0.0001, 0.01), start,
+                                       start + rng.uniform(0, 100), tick_size, rng.random() < 0.5)
+
+    def test_half_ticks(self):
+        # Start prices exactly half way between two ticks; level 1 sits right on them when
+        # maintaining spreads. They go to the same tick toNearest puts them on.
+        ladder = Ladder(1, 0.0005, 100, 100)
+        for start, tick_size in [(10000.25, 0.5), (10000.75, 0.5), (10000.5, 1), (10001.5, 1),
+                                 (101.25, 2.5), (103.75, 2.5)]:
+            expected = toNearest(start, tick_size)
+            buys, sells = ladder.build(start, start, tick_size)
+            self.assertEqual((buys[0]['price'], sells[0]['price']), (expected, expected), (start, tick_size))
+
+    def test_depth_and_sides(self):
+        ladder = Ladder(6, 0.0005, 100, 100)
+        full_buys, full_sells = ladder.build(10000.5, 10001.0, 0.5)
+        self.assertEqual(ladder.build(10000.5, 10001.0, 0.5, depth=2), (full_buys[-2:], full_sells[-2:]))
+        self.assertEqual(ladder.build(10000.5, 10001.0, 0.5, depth=0), ([], []))
+        self.assertEqual(ladder.build(10000.5, 10001.0, 0.5, buys=False), ([], full_sells))
+
+
+class TestRoundTicks(unittest.TestCase):
+    """ round_ticks must round an array exactly as round() rounds each value on this Python """
+
+    def test_matches_round(self):
+        values = [-2.5, -1.5, -0.5, 0.5, 1.5, 2.5, 20000.5, 20001.5, 0.49999999999999994, -0.49999999999999994,
+                  1.4999999999999998, 2.6, -2.4, 0.0, 2.0 ** 52 + 1, float('inf'), float('-inf')]
+        self.assertEqual(round_ticks(np.array(values)).tolist(), [round(value, 0) for value in values])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+from __future__ import absolute_import
+
+import random
+import struct
+import unittest
+
+from market_maker.utils.math import tickScale, toNearest, toNearestDecimal
+
+TICK_SIZES = [0.5, 1, 1.0, 0.1, 0.01, 0.05, 0.0001, 0.00001, 5e-05, 1e-08, 2.5, 100, 0.25, 1 / 3.0]
+
+
+def bits(value):
+    return struct.pack('>d', value)
+
+
+class TestToNearest(unittest.TestCase):
+    """ toNearest must give exactly what the Decimal implementation gives """
+
+    def assertSameFloat(self, num, tickSize):
+        expected = toNearestDecimal(num, tickSize)
+        actual = toNearest(num, tickSize)
+        if expected != expected:
+            self.assertNotEqual(actual, actual, "toNearest(%r, %r) should be NaN" % (num, tickSize))
+        else:
+            self.assertEqual(bits(actual), bits(expected),
+                             "toNearest(%r, %r): %r != %r" % (num, tickSize, actual, expected))
+
+    def test_random_prices(self):
+        rng = random.Random(7)
+        for tickSize in TICK_SIZES:
+            for _ in range(5000):
+                magnitude = 10 ** rng.uniform(-9, 7)
+                self.assertSameFloat(rng.choice([1, -1]) * rng.random() * magnitude, tickSize)
+
+    def test_float_error(self):
+        self.assertEqual(toNearest(401.46000000000004, 0.01), 401.46)
+        for tickSize in TICK_SIZES:
+            for ticks in range(-2000, 2000):
+                self.assertSameFloat(ticks * tickSize, tickSize)
+                self.assertSameFloat(ticks * tickSize * 1.0000001, tickSize)
+
+    def test_halfway(self):
+        for tickSize in TICK_SIZES:
+            for ticks in range(-50, 50):
+                self.assertSameFloat((ticks + 0.5) * tickSize, tickSize)
+
+    def test_special_values(self):
+        for tickSize in TICK_SIZES:
+            for num in [0.0, -0.0, 1e-300, -1e-300, float('nan'), float('inf'), float('-inf'),
+                        2.0 ** 52, 2.0 ** 53 + 2, 1e20, -1e20, 1e300]:
+                try:
+                    toNearestDecimal(num, tickSize)
+                except (ValueError, OverflowError) as e:
+                    self.assertRaises(type(e), toNearest, num, tickSize)
+                    continue
+                self.assertSameFloat(num, tickSize)
+
+    def test_scale_is_cached(self):
+        for tickSize in TICK_SIZES:
+            self.assertIs(tickScale(tickSize), tickScale(tickSize))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+from __future__ import absolute_import
+
+import threading
+import time
+import unittest
+
+from market_maker.utils.ratelimit import AMEND, CANCEL, CREATE, RateLimitGovernor, request_priority
+
+
+def headers(limit, remaining, reset_in=600):
+    return {'X-Ratelimit-Limit': str(limit), 'X-Ratelimit-Remaining': str(remaining),
+            'X-Ratelimit-Reset': str(int(time.time()) + reset_in)}
+
+
+class TestRateLimitGovernor(unittest.TestCase):
+
+    def test_unknown_until_first_response(self):
+        governor = RateLimitGovernor()
+        self.assertIsNone(governor.budget())
+        self.assertTrue(governor.acquire(CREATE))
+        governor.update({})
+        self.assertIsNone(governor.budget())
+
+    def test_reserves(self):
+        governor = RateLimitGovernor(amendReserve=0.1, createReserve=0.2)
+        governor.update(headers(60, 14))
+        # Creates stop at 12 left, amends at 6, cancels never.
+        self.assertEqual([governor.acquire(CREATE) for _ in range(3)], [True, True, False])
+        self.assertEqual([governor.acquire(AMEND) for _ in range(7)], [True] * 6 + [False])
+        self.assertEqual([governor.acquire(CANCEL) for _ in range(8)], [True] * 8)
+        self.assertEqual(governor.budget(), 0)
+        self.assertEqual(governor.stats()['deferred'], {'cancel': 0, 'amend': 1, 'create': 1})
+
+    def test_response_resets_estimate(self):
+        governor = RateLimitGovernor()
+        governor.update(headers(60, 10))
+        self.assertFalse(governor.acquire(CREATE))
+        governor.update(headers(60, 60))
+        self.assertAlmostEqual(governor.budget(), 1)
+        self.assertTrue(governor.acquire(CREATE))
+
+    def test_blocking_acquire(self):
+        governor = RateLimitGovernor()
+        governor.update(headers(60, 10))
+        thread = threading.Thread(target=governor.acquire, args=(CREATE,), kwargs={'block': True, 'poll': 0.01})
+        thread.start()
+        time.sleep(0.1)
+        self.assertTrue(thread.is_alive())
+        governor.update(headers(60, 60))
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(governor.stats()['sent'], 1)
+        self.assertEqual(governor.stats()['deferred']['create'], 1)
+
+    def test_priority(self):
+        self.assertEqual(request_priority('DELETE', 'order'), CANCEL)
+        self.assertEqual(request_priority('PUT', 'order/bulk'), AMEND)
+        self.assertEqual(request_priority('POST', 'order/bulk'), CREATE)
+        self.assertEqual(request_priority('POST', 'position/isolate'), AMEND)
+        self.assertEqual(request_priority('GET', 'order'), AMEND)
+
+
+if __name__ == '__main__':
+    unittest.main()
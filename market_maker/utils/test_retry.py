@@ -0,0 +1,51 @@
+from __future__ import absolute_import
+
+import unittest
+
+from market_maker.utils.retry import RetryPolicy
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_backoff(self):
+        policy = RetryPolicy(maxRetries=10, backoff=0.5, maxBackoff=3, jitter=0)
+        self.assertEqual([policy.delay(attempt) for attempt in range(1, 6)], [0.5, 1, 2, 3, 3])
+
+    def test_jitter(self):
+        policy = RetryPolicy(backoff=1, jitter=0.5)
+        for _ in range(100):
+            self.assertTrue(0.5 <= policy.delay(1) <= 1)
+
+    def test_idempotent_verbs(self):
+        policy = RetryPolicy(maxRetries=2, backoff=0, jitter=0)
+        for verb, retries in [('GET', 2), ('DELETE', 2), ('POST', 0), ('PUT', 0)]:
+            call = policy.begin(verb, 'order')
+            delays = [call.next_delay() for _ in range(3)]
+            self.assertEqual(delays, [0] * retries + [None] * (3 - retries), verb)
+        call = policy.begin('POST', 'order', maxRetries=1)
+        self.assertEqual(call.next_delay(), 0)
+
+    def test_calls_are_independent(self):
+        policy = RetryPolicy(maxRetries=1, backoff=0)
+        first, second = policy.begin('GET', 'order'), policy.begin('GET', 'order')
+        self.assertEqual(first.next_delay(), 0)
+        self.assertEqual(second.next_delay(), 0)
+        self.assertIsNone(first.next_delay())
+
+    def test_deadline(self):
+        policy = RetryPolicy(maxRetries=5, backoff=1, jitter=0, deadline=2)
+        call = policy.begin('GET', 'order')
+        self.assertEqual(call.next_delay(), 1)
+        self.assertIsNone(call.next_delay(minimum=5))
+
+    def test_stats(self):
+        policy = RetryPolicy(maxRetries=1, backoff=0.25, jitter=0)
+        call = policy.begin('GET', 'instrument')
+        call.next_delay()
+        call.next_delay()
+        policy.begin('GET', 'instrument')
+        self.assertEqual(policy.stats(), {'GET instrument': {'requests': 2, 'retries': 1, 'failures': 1, 'waited': 0.25}})
+
+
+if __name__ == '__main__':
+    unittest.main()
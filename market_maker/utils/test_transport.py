@@ -0,0 +1,104 @@
+from __future__ import absolute_import
+
+import threading
+import time
+import unittest
+
+from market_maker import bitmex
+from market_maker.utils.api_client import ApiClient
+from market_maker.utils.transport import Transport
+
+URL = 'https://testnet.bitmex.com/api/v1/'
+
+
+class NullWebsocket(object):
+
+    def connect(self, *args, **kwargs):
+        pass
+
+    def exit(self):
+        pass
+
+
+class StubPool(object):
+
+    def __init__(self):
+        self.num_requests = 0
+        self.num_connections = 0
+
+
+class StubPoolManager(object):
+    """Stands in for the urllib3 pool: counts requests, and opens a connection for each HEAD."""
+
+    def __init__(self):
+        self.pools = {}
+        self.lock = threading.Lock()
+        self.heads = 0
+
+    def pool(self, host):
+        with self.lock:
+            return self.pools.setdefault(host, StubPool())
+
+    def request(self, method, url, **kwargs):
+        pool = self.pool(url)
+        with self.lock:
+            pool.num_requests += 1
+            if method == 'HEAD':
+                self.heads += 1
+                pool.num_connections += 1
+
+
+class TestTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = Transport(4)
+        self.stub = self.transport.adapter.poolmanager = StubPoolManager()
+
+    def tearDown(self):
+        self.transport.close()
+
+    def test_shared_with_bitmex_and_the_swagger_client(self):
+        transport = Transport(4)
+        websocket = bitmex.BitMEXWebsocket
+        bitmex.BitMEXWebsocket = NullWebsocket
+        try:
+            api = bitmex.BitMEX(URL, 'XBTUSD', apiKey='key', apiSecret='secret', transport=transport)
+        finally:
+            bitmex.BitMEXWebsocket = websocket
+        try:
+            client = ApiClient(pool_manager=transport.poolmanager)
+            self.assertIs(api.session.get_adapter(URL), transport.adapter)
+            self.assertIs(client.rest_client.pool_manager, transport.poolmanager)
+        finally:
+            api.exit()
+
+    def test_stats(self):
+        self.assertEqual(self.transport.stats(), {'requests': 0, 'handshakes': 0, 'warmed': 0, 'reuse': None})
+        self.transport.warm(URL, 2)
+        for _ in range(6):
+            self.stub.request('GET', URL)
+        stats = self.transport.stats()
+        self.assertEqual((stats['requests'], stats['handshakes'], stats['warmed']), (8, 2, 2))
+        self.assertAlmostEqual(stats['reuse'], 0.75)
+
+    def test_warm_is_capped_at_pool_size(self):
+        self.transport.warm(URL, 10)
+        self.assertEqual(self.stub.heads, 4)
+
+    def test_rewarms_after_idle(self):
+        self.transport.keep_warm(URL, 0.05, 2)
+        time.sleep(0.2)
+        self.assertGreaterEqual(self.transport.stats()['warmed'], 2)
+
+    def test_busy_connections_left_alone(self):
+        self.transport.keep_warm(URL, 0.1, 2)
+        # A request at least every interval: the connections are in use, so never idle long enough.
+        deadline = time.time() + 0.35
+        while time.time() < deadline:
+            self.stub.request('GET', URL)
+            time.sleep(0.01)
+        self.assertEqual(self.stub.heads, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -40,11 +40,11 @@ class TradeApi(object):
         Get Trades.
         Please note that indices (symbols starting with `.`) post trades at intervals to the trade feed. These have a `size` of 0 and are used only to indicate a changing price.  See [the FIX Spec](http://www.onixs.biz/fix-dictionary/5.0.SP2/msgType_AE_6569.html) for explanations of these fields.
         This method makes a synchronous HTTP request by default. To make an
-        asynchronous HTTP request, please pass async=True
-        >>> thread = api.trade_get(async=True)
+        asynchronous HTTP request, please pass async_req=True
+        >>> thread = api.trade_get(async_req=True)
         >>> result = thread.get()
 
-        :param async bool
+        :param async_req bool
         :param str symbol: Instrument symbol. Send a bare series (e.g. XBU) to get data for the nearest expiring contract in that series.  You can also send a timeframe, e.g. `XBU:monthly`. Timeframes are `daily`, `weekly`, `monthly`, `quarterly`, and `biquarterly`.
         :param str filter: Generic table filter. Send JSON key/value pairs, such as `{\"key\": \"value\"}`. You can key on individual fields, and do more advanced querying on timestamps. See the [Timestamp Docs](https://www.bitmex.com/app/restAPI#timestamp-filters) for more details.
         :param str columns: Array of column names to fetch. If omitted, will return all columns.  Note that this method will always return item keys, even when not specified, so you may receive more columns that you expect.
@@ -58,7 +58,7 @@ class TradeApi(object):
                  returns the request thread.
         """
         kwargs['_return_http_data_only'] = True
-        if kwargs.get('async'):
+        if kwargs.get('async_req'):
             return self.trade_get_with_http_info(**kwargs)
         else:
             (data) = self.trade_get_with_http_info(**kwargs)
@@ -69,11 +69,11 @@ class TradeApi(object):
         Get Trades.
         Please note that indices (symbols starting with `.`) post trades at intervals to the trade feed. These have a `size` of 0 and are used only to indicate a changing price.  See [the FIX Spec](http://www.onixs.biz/fix-dictionary/5.0.SP2/msgType_AE_6569.html) for explanations of these fields.
         This method makes a synchronous HTTP request by default. To make an
-        asynchronous HTTP request, please pass async=True
-        >>> thread = api.trade_get_with_http_info(async=True)
+        asynchronous HTTP request, please pass async_req=True
+        >>> thread = api.trade_get_with_http_info(async_req=True)
         >>> result = thread.get()
 
-        :param async bool
+        :param async_req bool
         :param str symbol: Instrument symbol. Send a bare series (e.g. XBU) to get data for the nearest expiring contract in that series.  You can also send a timeframe, e.g. `XBU:monthly`. Timeframes are `daily`, `weekly`, `monthly`, `quarterly`, and `biquarterly`.
         :param str filter: Generic table filter. Send JSON key/value pairs, such as `{\"key\": \"value\"}`. You can key on individual fields, and do more advanced querying on timestamps. See the [Timestamp Docs](https://www.bitmex.com/app/restAPI#timestamp-filters) for more details.
         :param str columns: Array of column names to fetch. If omitted, will return all columns.  Note that this method will always return item keys, even when not specified, so you may receive more columns that you expect.
@@ -88,7 +88,7 @@ class TradeApi(object):
         """
 
         all_params = ['symbol', 'filter', 'columns', 'count', 'start', 'reverse', 'start_time', 'end_time']
-        all_params.append('async')
+        all_params.append('async_req')
         all_params.append('_return_http_data_only')
         all_params.append('_preload_content')
         all_params.append('_request_timeout')
@@ -152,7 +152,7 @@ class TradeApi(object):
                                         files=local_var_files,
                                         response_type='list[Trade]',
                                         auth_settings=auth_settings,
-                                        async=params.get('async'),
+                                        async_req=params.get('async_req'),
                                         _return_http_data_only=params.get('_return_http_data_only'),
                                         _preload_content=params.get('_preload_content', True),
                                         _request_timeout=params.get('_request_timeout'),
@@ -162,11 +162,11 @@ class TradeApi(object):
         """
         Get previous trades in time buckets.
         This method makes a synchronous HTTP request by default. To make an
-        asynchronous HTTP request, please pass async=True
-        >>> thread = api.trade_get_bucketed(async=True)
+        asynchronous HTTP request, please pass async_req=True
+        >>> thread = api.trade_get_bucketed(async_req=True)
         >>> result = thread.get()
 
-        :param async bool
+        :param async_req bool
         :param str bin_size: Time interval to bucket by. Available options: [1m,5m,1h,1d].
         :param bool partial: If true, will send in-progress (incomplete) bins for the current time period.
         :param str symbol: Instrument symbol. Send a bare series (e.g. XBU) to get data for the nearest expiring contract in that series.  You can also send a timeframe, e.g. `XBU:monthly`. Timeframes are `daily`, `weekly`, `monthly`, `quarterly`, and `biquarterly`.
@@ -182,7 +182,7 @@ class TradeApi(object):
                  returns the request thread.
         """
         kwargs['_return_http_data_only'] = True
-        if kwargs.get('async'):
+        if kwargs.get('async_req'):
             return self.trade_get_bucketed_with_http_info(**kwargs)
         else:
             (data) = self.trade_get_bucketed_with_http_info(**kwargs)
@@ -192,11 +192,11 @@ class TradeApi(object):
         """
         Get previous trades in time buckets.
         This method makes a synchronous HTTP request by default. To make an
-        asynchronous HTTP request, please pass async=True
-        >>> thread = api.trade_get_bucketed_with_http_info(async=True)
+        asynchronous HTTP request, please pass async_req=True
+        >>> thread = api.trade_get_bucketed_with_http_info(async_req=True)
         >>> result = thread.get()
 
-        :param async bool
+        :param async_req bool
         :param str bin_size: Time interval to bucket by. Available options: [1m,5m,1h,1d].
         :param bool partial: If true, will send in-progress (incomplete) bins for the current time period.
         :param str symbol: Instrument symbol. Send a bare series (e.g. XBU) to get data for the nearest expiring contract in that series.  You can also send a timeframe, e.g. `XBU:monthly`. Timeframes are `daily`, `weekly`, `monthly`, `quarterly`, and `biquarterly`.
@@ -213,7 +213,7 @@ class TradeApi(object):
         """
 
         all_params = ['bin_size', 'partial', 'symbol', 'filter', 'columns', 'count', 'start', 'reverse', 'start_time', 'end_time']
-        all_params.append('async')
+        all_params.append('async_req')
         all_params.append('_return_http_data_only')
         all_params.append('_preload_content')
         all_params.append('_request_timeout')
@@ -271,7 +271,6 @@ class TradeApi(object):
 
         # Authentication setting
         auth_settings = []
-        print "dfsdfsdfsdfdsfsd"
         return self.api_client.call_api('/trade/bucketed', 'GET',
                                         path_params,
                                         query_params,
@@ -281,7 +280,7 @@ class TradeApi(object):
                                         files=local_var_files,
                                         response_type='list[TradeBin]',
                                         auth_settings=auth_settings,
-                                        async=params.get('async'),
+                                        async_req=params.get('async_req'),
                                         _return_http_data_only=params.get('_return_http_data_only'),
                                         _preload_content=params.get('_preload_content', True),
                                         _request_timeout=params.get('_request_timeout'),
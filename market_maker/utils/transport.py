@@ -0,0 +1,120 @@
+import logging
+import os
+import socket
+import threading
+from time import time
+
+import certifi
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+
+class Transport(object):
+    """The HTTP connections we keep open to the REST API, shared by everything that talks to it.
+
+    Both the BitMEX connector's requests session and the generated TradeApi client (through
+    RESTClientObject) send on the same urllib3 pool, so a connection opened by one is reused by
+    the other. Connections are kept alive between requests, with TCP keep-alive on so an idle one
+    isn't silently dropped along the way.
+
+    Opening a connection costs a TCP and TLS handshake, a few round trips. warm() pays that at
+    startup rather than on the first order, and keep_warm() opens them again after an idle spell,
+    when the server has likely closed them.
+
+    stats() counts requests and handshakes (new connections), from which the reuse rate follows."""
+
+    def __init__(self, poolSize=4):
+        self.logger = logging.getLogger('root')
+        self.adapter = KeepAliveAdapter(pool_connections=2, pool_maxsize=poolSize)
+        self.poolSize = poolSize
+        # Warm-ups run on their own threads, from startup and from the refresher.
+        self.lock = threading.Lock()
+        self.warmed = 0
+        self.refresher = None
+        self.stopped = threading.Event()
+
+    @property
+    def poolmanager(self):
+        return self.adapter.poolmanager
+
+    def mount(self, session):
+        """Send a requests session's requests over this transport."""
+        session.mount('https://', self.adapter)
+        session.mount('http://', self.adapter)
+
+    def warm(self, url, connections=1, timeout=5):
+        """Open `connections` connections to the host serving `url`, so they're ready for the first requests.
+
+        Each sends a HEAD to `url`; whatever the response, the connection is then open and goes back
+        into the pool."""
+        connections = min(connections, self.poolSize)
+        start = time()
+        threads = [threading.Thread(target=self.__warm_one, args=(url, timeout)) for _ in range(connections)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.logger.debug("Warmed %d connections to %s in %.0fms." % (connections, url, (time() - start) * 1000))
+
+    def keep_warm(self, url, interval, connections=1):
+        """Whenever `interval` seconds go by without a request, warm the connections up again."""
+        if self.refresher is not None:
+            return
+        self.refresher = threading.Thread(target=self.__refresh, args=(url, interval, connections))
+        self.refresher.daemon = True
+        self.refresher.start()
+
+    def close(self):
+        self.stopped.set()
+
+    def stats(self):
+        requests = 0
+        handshakes = 0
+        pools = self.poolmanager.pools
+        for key in list(pools.keys()):
+            try:
+                pool = pools[key]
+            except KeyError:
+                continue
+            requests += pool.num_requests
+            handshakes += pool.num_connections
+        with self.lock:
+            warmed = self.warmed
+        return {
+            'requests': requests,
+            'handshakes': handshakes,
+            'warmed': warmed,
+            # Requests sent on a connection that was already open.
+            'reuse': 1 - handshakes / float(requests) if requests else None
+        }
+
+    def __warm_one(self, url, timeout):
+        try:
+            self.poolmanager.request('HEAD', url, retries=False, timeout=timeout)
+            with self.lock:
+                self.warmed += 1
+        except Exception as e:
+            self.logger.warning("Unable to warm up a connection to %s: %s" % (url, e))
+
+    def __refresh(self, url, interval, connections):
+        lastRequests = self.stats()['requests']
+        while not self.stopped.wait(interval):
+            requests = self.stats()['requests']
+            if requests == lastRequests:
+                self.warm(url, connections)
+                requests = self.stats()['requests']
+            lastRequests = requests
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """An HTTPAdapter whose pool verifies certificates itself and sets TCP keep-alive, so requests
+    that go straight to the pool (not through requests) can share its connections safely."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs.setdefault('cert_reqs', 'CERT_REQUIRED')
+        # The same CA bundle requests picks for a session with verify=True, so both end up on one pool.
+        kwargs.setdefault('ca_certs', os.environ.get('REQUESTS_CA_BUNDLE') or os.environ.get('CURL_CA_BUNDLE') or
+                          certifi.where())
+        kwargs.setdefault('socket_options', HTTPConnection.default_socket_options +
+                          [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)])
+        super(KeepAliveAdapter, self).init_poolmanager(*args, **kwargs)
@@ -0,0 +1,88 @@
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+
+# Our own open orders, indexed as order messages arrive.
+#
+# The WS `order` table holds every order on the account. The MM only cares about the open ones it
+# placed (those whose clOrdID starts with its prefix), and it asks for them, and for its best bid
+# and ask, several times a loop. This keeps them indexed so none of those questions needs a scan:
+#   - by orderID, in the order they arrived (convergence matches orders in table order),
+#   - by side, sorted by price, so the best own bid/ask is at the end of a list.
+# Rows are the same dicts as in the order table, so in-place updates show up here; call update()
+# after each one so price changes are re-sorted and orders with nothing left to fill drop out.
+class OpenOrders(object):
+
+    def __init__(self, clOrdIDPrefix, orders=()):
+        self.clOrdIDPrefix = clOrdIDPrefix
+        self.reset(orders)
+
+    def reset(self, orders):
+        # Sides first: an entry in self.sides must always have its order in self.orders.
+        self.sides = {'Buy': [], 'Sell': []}
+        # orderID -> the (price, orderID) entry for it in self.sides
+        self.entries = {}
+        self.orders = OrderedDict()
+        self.cached = None
+        for order in orders:
+            self.add(order)
+
+    def add(self, order):
+        if not self.__is_open(order) or not str(order['clOrdID']).startswith(self.clOrdIDPrefix):
+            return
+        self.orders[order['orderID']] = order
+        self.__index(order)
+        self.cached = None
+
+    def update(self, order):
+        '''Re-index an order after it has been updated in place.'''
+        orderID = order['orderID']
+        if orderID not in self.orders:
+            return
+        if not self.__is_open(order):
+            self.remove(order)
+        elif self.entries[orderID][0] != order['price']:
+            self.__unindex(orderID, order['side'])
+            self.__index(order)
+            self.cached = None
+
+    def remove(self, order):
+        orderID = order['orderID']
+        if orderID in self.orders:
+            # Unindex before dropping the order, so best() can't find an entry with no order behind it.
+            self.__unindex(orderID, order['side'])
+            del self.orders[orderID]
+            self.cached = None
+
+    def all(self):
+        '''All our open orders, in the order they arrived. Don't modify the result.'''
+        if self.cached is None:
+            self.cached = tuple(self.orders.values())
+        return self.cached
+
+    def best(self, side):
+        '''Our highest buy or lowest sell, or None if we have none on that side.'''
+        entries = self.sides[side]
+        if not entries:
+            return None
+        return self.orders[(entries[-1] if side == 'Buy' else entries[0])[1]]
+
+    def count(self, side):
+        return len(self.sides[side])
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __index(self, order):
+        entry = (order['price'], order['orderID'])
+        self.entries[order['orderID']] = entry
+        insort(self.sides[order['side']], entry)
+
+    def __unindex(self, orderID, side):
+        entry = self.entries.pop(orderID)
+        entries = self.sides[side]
+        del entries[bisect_left(entries, entry)]
+
+    @staticmethod
+    def __is_open(order):
+        return order.get('leavesQty', 0) > 0
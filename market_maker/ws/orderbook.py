@@ -0,0 +1,253 @@
+from bisect import bisect_left, insort
+from itertools import chain, islice
+
+
+# A local level 2 order book, kept up to date from the websocket.
+#
+# BitMEX offers two order book feeds:
+#   orderBookL2 - the full book, sent as a partial followed by insert/update/delete deltas keyed on
+#                 an `id` per price level. Updates and deletes don't carry the price, so we keep a
+#                 map of id -> price.
+#   orderBook10 - the top 10 levels, resent in full whenever they change.
+# Either can feed an OrderBook.
+#
+# Sides are named the way BitMEX names them: 'Buy' is the bids, 'Sell' is the asks.
+class OrderBook(object):
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        # orderBookL2 id -> price
+        self.levelPrices = {}
+        self.timestamp = None
+
+    def side(self, side):
+        return self.bids if side == 'Buy' else self.asks
+
+    #
+    # Feeding the book
+    #
+    def apply_l2(self, action, rows):
+        '''Apply an orderBookL2 message.'''
+        if action == 'partial':
+            self.clear()
+        for row in rows:
+            if action == 'partial' or action == 'insert':
+                self.levelPrices[row['id']] = row['price']
+                self.side(row['side']).set(row['price'], row['size'])
+            elif action == 'update':
+                price = row.get('price', self.levelPrices.get(row['id']))
+                if price is None:
+                    continue  # Update for a level we never saw. Could happen before the partial.
+                self.levelPrices[row['id']] = price
+                self.side(row['side']).set(price, row['size'])
+            elif action == 'delete':
+                price = self.levelPrices.pop(row['id'], None)
+                if price is not None:
+                    self.side(row['side']).remove(price)
+
+    def apply_snapshot(self, row):
+        '''Replace the book with an orderBook10 row: {'bids': [[price, size], ...], 'asks': [...]}.'''
+        self.bids.replace(row['bids'])
+        self.asks.replace(row['asks'])
+        self.timestamp = row.get('timestamp')
+
+    def clear(self):
+        self.bids.replace([])
+        self.asks.replace([])
+        self.levelPrices = {}
+
+    def copy(self):
+        '''A copy of the book, which later messages won't touch.'''
+        book = OrderBook(self.symbol)
+        book.bids = self.bids.copy()
+        book.asks = self.asks.copy()
+        book.levelPrices = dict(self.levelPrices)
+        book.timestamp = self.timestamp
+        return book
+
+    #
+    # Queries
+    #
+    def best_bid(self):
+        '''Return (price, size) of the best bid, or None if there are no bids.'''
+        return self.bids.best()
+
+    def best_ask(self):
+        '''Return (price, size) of the best ask, or None if there are no asks.'''
+        return self.asks.best()
+
+    def mid(self):
+        bid, ask = self.bids.best(), self.asks.best()
+        if bid is None or ask is None:
+            return None
+        return (bid[0] + ask[0]) / 2.0
+
+    def depth(self, side, levels=None):
+        '''Total size on a side, optionally only over its best `levels` levels.'''
+        return self.side(side).depth(levels)
+
+    def size_within(self, side, ticks, tickSize):
+        '''Total size resting within `ticks` ticks of the best price on a side (inclusive).'''
+        # Pad by half a tick so float error in the prices can't drop the last level.
+        return self.side(side).size_within((ticks + 0.5) * tickSize)
+
+    def price_to_fill(self, side, quantity):
+        '''The worst price we'd trade at taking `quantity` contracts from a side.
+
+        To buy, take from the 'Sell' side; to sell, take from 'Buy'. Returns None if the side
+        doesn't have that much size.'''
+        return self.side(side).price_to_fill(quantity)
+
+    def levels(self, side, count=None):
+        '''Return [(price, size), ...] for a side, best first.'''
+        return self.side(side).levels(count)
+
+    def __len__(self):
+        return len(self.bids) + len(self.asks)
+
+    def __repr__(self):
+        return 'OrderBook(%s, bid=%s, ask=%s, levels=%d)' % (self.symbol, self.best_bid(), self.best_ask(), len(self))
+
+
+class BookSide(object):
+    '''One side of an order book.
+
+    Prices are kept in a SortedPrices and sizes in a dict keyed on price. A size change at an
+    existing level is a dict write; adding or removing a level is O(log n). The best level is
+    always at one end of the prices.'''
+
+    def __init__(self, descending):
+        self.descending = descending
+        self.prices = SortedPrices()
+        self.sizes = {}
+
+    def set(self, price, size):
+        if not size:
+            self.remove(price)
+            return
+        if price not in self.sizes:
+            self.prices.add(price)
+        self.sizes[price] = size
+
+    def remove(self, price):
+        if self.sizes.pop(price, None) is not None:
+            self.prices.remove(price)
+
+    def replace(self, levels):
+        self.sizes = dict((price, size) for price, size in levels if size)
+        self.prices = SortedPrices(self.sizes)
+
+    def copy(self):
+        side = BookSide(self.descending)
+        side.prices = self.prices.copy()
+        side.sizes = dict(self.sizes)
+        return side
+
+    def best(self):
+        if not self.prices:
+            return None
+        price = self.prices.last() if self.descending else self.prices.first()
+        return price, self.sizes[price]
+
+    def iter_prices(self):
+        '''Prices from best to worst.'''
+        return reversed(self.prices) if self.descending else iter(self.prices)
+
+    def levels(self, count=None):
+        return [(price, self.sizes[price]) for price in islice(self.iter_prices(), count)]
+
+    def depth(self, levels=None):
+        if levels is None:
+            return sum(self.sizes.values())
+        return sum(size for _, size in self.levels(levels))
+
+    def size_within(self, distance):
+        best = self.best()
+        if best is None:
+            return 0
+        # Walk out from the best price until we're more than `distance` away.
+        total = 0
+        for price in self.iter_prices():
+            if abs(price - best[0]) > distance:
+                break
+            total += self.sizes[price]
+        return total
+
+    def price_to_fill(self, quantity):
+        remaining = quantity
+        for price in self.iter_prices():
+            remaining -= self.sizes[price]
+            if remaining <= 0:
+                return price
+        return None
+
+    def __len__(self):
+        return len(self.prices)
+
+
+class SortedPrices(object):
+    '''A sorted collection of distinct prices with O(log n) add and remove.
+
+    A single sorted list makes every new or emptied level a list insert or delete, which moves
+    everything after it: O(n) on a deep book. Instead the prices are split into consecutive runs
+    of at most 2 * LOAD, found by bisecting the list of each run's highest price, so an add or
+    remove only shifts the prices in one short run.'''
+
+    LOAD = 64
+
+    def __init__(self, prices=()):
+        prices = sorted(prices)
+        self.runs = [prices[i:i + self.LOAD] for i in range(0, len(prices), self.LOAD)]
+        self.maxes = [run[-1] for run in self.runs]
+        self.count = len(prices)
+
+    def add(self, price):
+        if not self.runs:
+            self.runs.append([price])
+            self.maxes.append(price)
+        else:
+            i = min(bisect_left(self.maxes, price), len(self.runs) - 1)
+            run = self.runs[i]
+            insort(run, price)
+            self.maxes[i] = run[-1]
+            if len(run) > 2 * self.LOAD:
+                self.runs.insert(i + 1, run[self.LOAD:])
+                del run[self.LOAD:]
+                self.maxes.insert(i, run[-1])
+        self.count += 1
+
+    def remove(self, price):
+        '''Remove a price we hold.'''
+        i = bisect_left(self.maxes, price)
+        run = self.runs[i]
+        del run[bisect_left(run, price)]
+        if run:
+            self.maxes[i] = run[-1]
+        else:
+            del self.runs[i]
+            del self.maxes[i]
+        self.count -= 1
+
+    def first(self):
+        return self.runs[0][0]
+
+    def last(self):
+        return self.runs[-1][-1]
+
+    def copy(self):
+        prices = SortedPrices()
+        prices.runs = [list(run) for run in self.runs]
+        prices.maxes = list(self.maxes)
+        prices.count = self.count
+        return prices
+
+    def __iter__(self):
+        return chain.from_iterable(self.runs)
+
+    def __reversed__(self):
+        return chain.from_iterable(reversed(run) for run in reversed(self.runs))
+
+    def __len__(self):
+        return self.count
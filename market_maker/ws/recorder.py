@@ -0,0 +1,164 @@
+import gzip
+import logging
+import os
+import struct
+import threading
+from collections import deque
+from time import sleep, strftime, time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Records raw websocket frames to disk, for reproducing bugs, benchmarking the message handler
+# and replaying real traffic.
+#
+# Frames go into segment files in a directory. A segment is an append-only sequence of records:
+#
+#   8 bytes  receive time, seconds since the epoch (big-endian double)
+#   4 bytes  length of the frame in bytes (big-endian unsigned int)
+#   n bytes  the frame as received, UTF-8
+#
+# optionally compressed as a whole with gzip or zstd. A new segment is started once the current
+# one has had SEGMENT_BYTES of frames written to it.
+#
+# The socket callback only timestamps the frame and appends it to a deque (no locks); a background
+# thread drains it every WRITE_INTERVAL and does the encoding, compression and disk writes in one
+# batch. If the writer falls behind and the backlog reaches QUEUE_SIZE, frames are dropped (and
+# counted) rather than stalling the socket.
+RECORD_HEADER = struct.Struct('>dI')
+EXTENSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+
+class FrameRecorder(object):
+
+    # Start a new segment after this many (uncompressed) bytes of frames.
+    SEGMENT_BYTES = 256 * 1024 * 1024
+    # Frames waiting to be written before we start dropping them.
+    QUEUE_SIZE = 100000
+    # How often the writer wakes up to write out queued frames, in seconds.
+    WRITE_INTERVAL = 0.1
+    # Flush to disk at least this often, in seconds, so a crash loses little.
+    FLUSH_INTERVAL = 1
+
+    def __init__(self, directory, compression='gzip', segmentBytes=None):
+        self.logger = logging.getLogger('root')
+        if compression == 'zstd' and zstandard is None:
+            self.logger.warning("zstandard is not installed; recording frames with gzip instead.")
+            compression = 'gzip'
+        if compression not in EXTENSIONS:
+            raise ValueError("Unknown frame recorder compression: %s" % compression)
+        self.directory = directory
+        self.compression = compression
+        self.segmentBytes = segmentBytes or FrameRecorder.SEGMENT_BYTES
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.queue = deque()
+        self.recorded = 0
+        self.dropped = 0
+        self.segment = None
+        self.segmentWritten = 0
+        self.closed = False
+
+        self.thread = threading.Thread(target=self.__run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def record(self, frame):
+        '''Queue a frame to be written. Never blocks.'''
+        if len(self.queue) < FrameRecorder.QUEUE_SIZE:
+            self.queue.append((time(), frame))
+        else:
+            self.dropped += 1
+
+    def close(self):
+        '''Write out everything queued so far and close the current segment.'''
+        if self.closed:
+            return
+        self.closed = True
+        self.thread.join()
+
+    def __run(self):
+        lastFlush = time()
+        while not self.closed:
+            sleep(FrameRecorder.WRITE_INTERVAL)
+            self.__write_queued()
+            if self.segment is not None and time() - lastFlush >= FrameRecorder.FLUSH_INTERVAL:
+                self.segment.flush()
+                lastFlush = time()
+        self.__write_queued()
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+
+    def __write_queued(self):
+        chunks = []
+        pending = 0
+        # popleft() is atomic, so this is safe against record() appending on the socket thread.
+        for _ in range(len(self.queue)):
+            receivedAt, frame = self.queue.popleft()
+            if not isinstance(frame, bytes):
+                frame = frame.encode('utf8')
+            if self.segment is None or self.segmentWritten + pending >= self.segmentBytes:
+                self.__write_chunks(chunks, pending)
+                chunks, pending = [], 0
+                self.__rotate()
+            chunks.append(RECORD_HEADER.pack(receivedAt, len(frame)))
+            chunks.append(frame)
+            pending += RECORD_HEADER.size + len(frame)
+        self.__write_chunks(chunks, pending)
+
+    def __write_chunks(self, chunks, size):
+        if not chunks:
+            return
+        self.segment.write(b''.join(chunks))
+        self.segmentWritten += size
+        self.recorded += len(chunks) // 2
+
+    def __rotate(self):
+        if self.segment is not None:
+            self.segment.close()
+        name = 'frames-%s-%012d.seg%s' % (strftime('%Y%m%d-%H%M%S'), self.recorded, EXTENSIONS[self.compression])
+        self.segment = open_segment(os.path.join(self.directory, name), 'wb')
+        self.segmentWritten = 0
+        self.logger.info("Recording WS frames to %s" % name)
+
+
+def open_segment(path, mode='rb'):
+    '''Open a segment file, (de)compressing according to its extension.'''
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("zstandard is needed to read or write %s" % path)
+        if 'w' in mode:
+            return zstandard.ZstdCompressor().stream_writer(open(path, mode))
+        return zstandard.ZstdDecompressor().stream_reader(open(path, mode))
+    return open(path, mode)
+
+
+def read_frames(path):
+    '''Yield (receivedAt, frame) for each frame in a segment file, or each segment in a directory.'''
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.startswith('frames-'):
+                for record in read_frames(os.path.join(path, name)):
+                    yield record
+        return
+
+    segment = open_segment(path)
+    try:
+        while True:
+            header = segment.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                break  # End of file, or a record cut short by a crash.
+            receivedAt, length = RECORD_HEADER.unpack(header)
+            frame = segment.read(length)
+            if len(frame) < length:
+                break
+            yield receivedAt, frame.decode('utf8')
+    finally:
+        segment.close()
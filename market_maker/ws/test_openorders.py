@@ -0,0 +1,71 @@
+from __future__ import absolute_import
+
+import unittest
+
+from market_maker.ws.openorders import OpenOrders
+
+
+def order(orderID, side, price, leavesQty=100, clOrdID=None):
+    if clOrdID is None:
+        clOrdID = 'mm_' + orderID
+    return {'orderID': orderID, 'clOrdID': clOrdID, 'side': side, 'price': price, 'leavesQty': leavesQty}
+
+
+class TestOpenOrders(unittest.TestCase):
+
+    def setUp(self):
+        self.orders = OpenOrders('mm_', [order('a', 'Buy', 99), order('b', 'Sell', 102), order('c', 'Buy', 100),
+                                         order('d', 'Sell', 101)])
+
+    def test_best_and_count(self):
+        self.assertEqual(self.orders.best('Buy')['orderID'], 'c')
+        self.assertEqual(self.orders.best('Sell')['orderID'], 'd')
+        self.assertEqual(self.orders.count('Buy'), 2)
+        self.assertEqual(len(self.orders), 4)
+        self.assertIsNone(OpenOrders('mm_').best('Buy'))
+
+    def test_only_our_open_orders(self):
+        self.orders.add(order('e', 'Buy', 105, clOrdID='other_e'))
+        self.orders.add(order('f', 'Buy', 105, clOrdID=''))
+        self.orders.add(order('g', 'Buy', 105, leavesQty=0))
+        self.assertEqual(len(self.orders), 4)
+        self.assertEqual(self.orders.best('Buy')['orderID'], 'c')
+
+    def test_keeps_arrival_order(self):
+        self.assertEqual([o['orderID'] for o in self.orders.all()], ['a', 'b', 'c', 'd'])
+
+    def test_update_in_place(self):
+        row = self.orders.all()[0]
+        row['price'] = 101.5
+        self.orders.update(row)
+        self.assertEqual(self.orders.best('Buy')['orderID'], 'a')
+        self.assertEqual(self.orders.all()[0]['price'], 101.5)
+
+        row['leavesQty'] = 0
+        self.orders.update(row)
+        self.assertEqual(self.orders.best('Buy')['orderID'], 'c')
+        self.assertEqual(len(self.orders), 3)
+
+        # Orders we don't hold are ignored.
+        self.orders.update(order('x', 'Buy', 200))
+        self.assertEqual(len(self.orders), 3)
+
+    def test_remove(self):
+        self.orders.remove(order('d', 'Sell', 101))
+        self.orders.remove(order('x', 'Sell', 50))
+        self.assertEqual(self.orders.best('Sell')['orderID'], 'b')
+        self.assertEqual([o['orderID'] for o in self.orders.all()], ['a', 'b', 'c'])
+
+    def test_same_price(self):
+        self.orders.add(order('e', 'Buy', 100))
+        self.orders.remove(order('c', 'Buy', 100))
+        self.assertEqual(self.orders.best('Buy')['orderID'], 'e')
+
+    def test_reset(self):
+        self.orders.reset([order('z', 'Sell', 110)])
+        self.assertEqual([o['orderID'] for o in self.orders.all()], ['z'])
+        self.assertIsNone(self.orders.best('Buy'))
+
+
+if __name__ == '__main__':
+    unittest.main()
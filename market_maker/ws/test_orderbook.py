@@ -0,0 +1,86 @@
+from __future__ import absolute_import
+
+import random
+import unittest
+
+from market_maker.ws.orderbook import OrderBook, SortedPrices
+
+
+def l2(side, price, size):
+    return {'symbol': 'XBTUSD', 'id': int(price * 2), 'side': side, 'price': price, 'size': size}
+
+
+class TestSortedPrices(unittest.TestCase):
+
+    def test_matches_sorted_list(self):
+        rnd = random.Random(1)
+        prices = SortedPrices(rnd.sample(range(100000), 300))
+        expected = set(prices)
+        for _ in range(5000):
+            price = rnd.randrange(2000) * 0.5
+            if price in expected:
+                prices.remove(price)
+                expected.discard(price)
+            else:
+                prices.add(price)
+                expected.add(price)
+        self.assertEqual(list(prices), sorted(expected))
+        self.assertEqual(list(reversed(prices)), sorted(expected, reverse=True))
+        self.assertEqual(len(prices), len(expected))
+        self.assertEqual((prices.first(), prices.last()), (min(expected), max(expected)))
+
+    def test_empty(self):
+        prices = SortedPrices()
+        prices.add(1.0)
+        prices.remove(1.0)
+        self.assertEqual((list(prices), len(prices)), ([], 0))
+        prices.add(2.0)
+        self.assertEqual(list(prices), [2.0])
+
+
+class TestOrderBook(unittest.TestCase):
+
+    def setUp(self):
+        self.book = OrderBook('XBTUSD')
+        self.book.apply_l2('partial', [l2('Buy', 99.5, 10), l2('Buy', 99.0, 20), l2('Buy', 98.0, 30),
+                                       l2('Sell', 100.0, 5), l2('Sell', 100.5, 15), l2('Sell', 102.0, 25)])
+
+    def test_queries(self):
+        self.assertEqual(self.book.best_bid(), (99.5, 10))
+        self.assertEqual(self.book.best_ask(), (100.0, 5))
+        self.assertEqual(self.book.mid(), 99.75)
+        self.assertEqual(self.book.levels('Buy', 2), [(99.5, 10), (99.0, 20)])
+        self.assertEqual(self.book.depth('Sell'), 45)
+        self.assertEqual(self.book.depth('Sell', 2), 20)
+        self.assertEqual(self.book.size_within('Buy', 1, 0.5), 30)
+        self.assertEqual(self.book.size_within('Sell', 1, 0.5), 20)
+        self.assertEqual(self.book.price_to_fill('Sell', 21), 102.0)
+        self.assertIsNone(self.book.price_to_fill('Sell', 46))
+
+    def test_deltas(self):
+        self.book.apply_l2('insert', [l2('Buy', 99.75, 1)])
+        self.book.apply_l2('update', [{'symbol': 'XBTUSD', 'id': 200, 'side': 'Sell', 'size': 7}])
+        self.book.apply_l2('delete', [{'symbol': 'XBTUSD', 'id': 201, 'side': 'Sell'}])
+        self.assertEqual(self.book.best_bid(), (99.75, 1))
+        self.assertEqual(self.book.levels('Sell'), [(100.0, 7), (102.0, 25)])
+        # Updates for levels we never saw are ignored.
+        self.book.apply_l2('update', [{'symbol': 'XBTUSD', 'id': 1, 'side': 'Buy', 'size': 7}])
+        self.assertEqual(len(self.book), 6)
+
+    def test_snapshot(self):
+        self.book.apply_snapshot({'bids': [[99.0, 1], [98.5, 2]], 'asks': [[99.5, 3]], 'timestamp': 'now'})
+        self.assertEqual(self.book.levels('Buy'), [(99.0, 1), (98.5, 2)])
+        self.assertEqual(self.book.best_ask(), (99.5, 3))
+
+    def test_copy_is_independent(self):
+        copy = self.book.copy()
+        self.book.apply_l2('delete', [{'symbol': 'XBTUSD', 'id': 199, 'side': 'Buy'}])
+        self.book.apply_l2('insert', [l2('Sell', 99.75, 1)])
+        self.assertEqual(copy.best_bid(), (99.5, 10))
+        self.assertEqual(copy.best_ask(), (100.0, 5))
+        self.assertEqual(len(copy), 6)
+        self.assertEqual(self.book.best_ask(), (99.75, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from market_maker.ws.recorder import FrameRecorder, read_frames
+
+FRAMES = ['{"table":"quote","action":"insert","data":[{"symbol":"XBTUSD","bidPrice":%d.5}]}' % i for i in range(100)]
+
+
+class TestFrameRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def record(self, frames, compression='gzip', segmentBytes=None):
+        recorder = FrameRecorder(self.directory, compression, segmentBytes)
+        before = time.time()
+        for frame in frames:
+            recorder.record(frame)
+        recorder.close()
+        return recorder, before
+
+    def test_round_trip(self):
+        for compression in (None, 'gzip'):
+            recorder, before = self.record(FRAMES + [u'{"info":"caf\u00e9"}'], compression)
+            records = list(read_frames(self.directory))
+            self.assertEqual([frame for _, frame in records], FRAMES + [u'{"info":"caf\u00e9"}'])
+            self.assertTrue(all(before <= receivedAt <= time.time() for receivedAt, _ in records))
+            self.assertEqual((recorder.recorded, recorder.dropped), (len(FRAMES) + 1, 0))
+            shutil.rmtree(self.directory)
+            os.makedirs(self.directory)
+
+    def test_segments(self):
+        self.record(FRAMES, segmentBytes=1000)
+        segments = sorted(os.listdir(self.directory))
+        self.assertGreater(len(segments), 1)
+        self.assertTrue(all(name.startswith('frames-') and name.endswith('.seg.gz') for name in segments))
+        # Segments read back in order, one at a time or as a directory.
+        perSegment = [frame for name in segments for _, frame in read_frames(os.path.join(self.directory, name))]
+        self.assertEqual(perSegment, FRAMES)
+        self.assertEqual([frame for _, frame in read_frames(self.directory)], FRAMES)
+
+    def test_truncated_record(self):
+        self.record(FRAMES[:3], compression=None)
+        path = os.path.join(self.directory, os.listdir(self.directory)[0])
+        with open(path, 'rb+') as segment:
+            segment.truncate(os.path.getsize(path) - 5)
+        self.assertEqual([frame for _, frame in read_frames(path)], FRAMES[:2])
+
+    def test_drops_when_backlogged(self):
+        recorder = FrameRecorder(self.directory, None)
+        queueSize = FrameRecorder.QUEUE_SIZE
+        FrameRecorder.QUEUE_SIZE = 0
+        try:
+            recorder.record(FRAMES[0])
+        finally:
+            FrameRecorder.QUEUE_SIZE = queueSize
+        recorder.close()
+        self.assertEqual((recorder.recorded, recorder.dropped), (0, 1))
+
+    def test_unknown_compression(self):
+        with self.assertRaises(ValueError):
+            FrameRecorder(self.directory, 'lz4')
+
+
+if __name__ == '__main__':
+    unittest.main()
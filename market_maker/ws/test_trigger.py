@@ -0,0 +1,67 @@
+from __future__ import absolute_import
+
+import threading
+import unittest
+
+from market_maker.ws.trigger import OrderTrigger
+
+
+def quote(bid, ask, symbol='XBTUSD'):
+    return {'symbol': symbol, 'bidPrice': bid, 'askPrice': ask}
+
+
+class TestOrderTrigger(unittest.TestCase):
+
+    def setUp(self):
+        self.trigger = OrderTrigger('XBTUSD', 0.001)
+
+    def reason(self):
+        return self.trigger.wait(0, 0)[0]
+
+    def test_idle(self):
+        self.assertEqual(self.trigger.wait(0, 0.01), (None, None))
+
+    def test_quote_threshold(self):
+        self.trigger.on_quote('quote', 'insert', [quote(9999.5, 10000.5)])
+        self.assertIsNone(self.reason())
+        self.trigger.on_quote('quote', 'insert', [quote(10004.5, 10005.5), quote(1, 2, 'ETHUSD')])
+        self.assertIsNone(self.reason())
+        # Moves are measured from the mid when the loop last ran.
+        self.trigger.on_quote('quote', 'insert', [quote(10009.5, 10010.5)])
+        self.assertIsNone(self.reason())
+        self.trigger.on_quote('quote', 'insert', [quote(10024.5, 10025.5)])
+        self.assertEqual(self.reason(), 'quote')
+
+    def test_fills_only(self):
+        for execType in ('New', 'Replaced', 'Canceled', 'Funding'):
+            self.trigger.on_execution('execution', 'insert', [{'symbol': 'XBTUSD', 'execType': execType}])
+            self.assertIsNone(self.reason(), execType)
+        self.trigger.on_execution('execution', 'insert', [{'symbol': 'ETHUSD', 'execType': 'Trade'}])
+        self.trigger.on_execution('execution', 'partial', [{'symbol': 'XBTUSD', 'execType': 'Trade'}])
+        self.assertIsNone(self.reason())
+        self.trigger.on_execution('execution', 'insert', [{'symbol': 'XBTUSD', 'execType': 'New'},
+                                                          {'symbol': 'XBTUSD', 'execType': 'Trade'}])
+        self.assertEqual(self.reason(), 'execution')
+
+    def test_position_and_bars(self):
+        self.trigger.on_position('position', 'update', [{'symbol': 'XBTUSD', 'markPrice': 1}])
+        self.assertIsNone(self.reason())
+        self.trigger.on_position('position', 'update', [{'symbol': 'XBTUSD', 'currentQty': 100}])
+        self.assertEqual(self.reason(), 'position')
+        self.trigger.on_trade_bin('tradeBin5m', 'insert', [{}])
+        self.assertEqual(self.reason(), 'tradeBin5m')
+
+    def test_first_event_wins_and_wakes_waiter(self):
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(self.trigger.wait(0.05, 5)))
+        waiter.start()
+        self.trigger.fire('position')
+        self.trigger.fire('tradeBin5m')
+        waiter.join(2)
+        self.assertEqual(results[0][0], 'position')
+        self.assertGreater(self.trigger.record_latency(results[0][1]), 0)
+        self.assertEqual(self.trigger.reactions, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
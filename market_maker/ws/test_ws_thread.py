@@ -0,0 +1,390 @@
+from __future__ import absolute_import
+
+import json
+import threading
+import time
+import unittest
+
+from market_maker.ws.ws_thread import BitMEXWebsocket, KeyedTable, findItemByKeys, instrumentConstants
+
+XBTUSD = {'symbol': 'XBTUSD', 'tickSize': 0.5, 'multiplier': -100000000, 'isQuanto': False, 'isInverse': True,
+          'underlyingToSettleMultiplier': None, 'quoteToSettleMultiplier': None,
+          'lastPrice': 10000.0, 'bidPrice': 9999.5, 'askPrice': 10000.5, 'markPrice': 10000.0}
+
+
+class NullSocket(object):
+    def close(self):
+        pass
+
+    def send(self, message):
+        pass
+
+
+def websocket():
+    """A BitMEXWebsocket that isn't connected; feed() messages to it instead."""
+    ws = BitMEXWebsocket()
+    ws.ws = NullSocket()
+    return ws
+
+
+def feed(ws, table, action, data, keys=()):
+    message = {'table': table, 'action': action, 'data': data}
+    if action == 'partial':
+        message['keys'] = list(keys)
+    getattr(ws, '_BitMEXWebsocket__on_message')(None, json.dumps(message))
+
+
+class TestKeyedTable(unittest.TestCase):
+
+    def rows(self):
+        return [{'orderID': 'a', 'price': 100}, {'orderID': 'b', 'price': 101}, {'orderID': 'c', 'price': 102}]
+
+    def test_find(self):
+        table = KeyedTable(['orderID'], self.rows())
+        self.assertEqual(table.find({'orderID': 'b'})['price'], 101)
+        self.assertIsNone(table.find({'orderID': 'x'}))
+        # Missing a key field matches nothing, rather than raising.
+        self.assertIsNone(table.find({'price': 101}))
+
+    def test_compound_keys(self):
+        table = KeyedTable(['symbol', 'side'], [{'symbol': 'XBTUSD', 'side': 'Buy', 'size': 1},
+                                                {'symbol': 'XBTUSD', 'side': 'Sell', 'size': 2},
+                                                {'symbol': 'ETHUSD', 'side': 'Buy', 'size': 3}])
+        self.assertEqual(table.find({'symbol': 'XBTUSD', 'side': 'Sell'})['size'], 2)
+        self.assertEqual(table.find({'symbol': 'ETHUSD', 'side': 'Buy', 'size': 0})['size'], 3)
+        self.assertIsNone(table.find({'symbol': 'ETHUSD', 'side': 'Sell'}))
+
+    def test_insert_update_delete(self):
+        table = KeyedTable(['orderID'], self.rows())
+        table += [{'orderID': 'd', 'price': 103}]
+        self.assertEqual(len(table), 4)
+
+        # Updates are made in place on the row find() returns, as the message handler does.
+        table.find({'orderID': 'a'}).update({'price': 99})
+        self.assertEqual(table[0], {'orderID': 'a', 'price': 99})
+
+        table.remove(table.find({'orderID': 'b'}))
+        table.remove(None)
+        table.remove({'orderID': 'x'})
+        self.assertEqual([row['orderID'] for row in table], ['a', 'c', 'd'])
+
+    def test_insert_with_existing_key_replaces_row(self):
+        table = KeyedTable(['orderID'], self.rows())
+        table.append({'orderID': 'b', 'price': 200})
+        self.assertEqual(len(table), 3)
+        self.assertEqual(table.find({'orderID': 'b'})['price'], 200)
+
+    def test_reads_like_a_list(self):
+        table = KeyedTable(['orderID'], self.rows())
+        self.assertEqual(table[0]['orderID'], 'a')
+        self.assertEqual(table[-1]['orderID'], 'c')
+        self.assertEqual(table[1]['orderID'], 'b')
+        self.assertEqual(list(table), self.rows())
+        with self.assertRaises(IndexError):
+            KeyedTable(['orderID'])[-1]
+
+    def test_evict_oldest(self):
+        table = KeyedTable(['orderID'], self.rows())
+        table.evict(2)
+        self.assertEqual([row['orderID'] for row in table], ['c'])
+        table.evict(5)
+        self.assertEqual(len(table), 0)
+
+    def test_matches_linear_scan(self):
+        rows = [{'symbol': 'XBTUSD', 'id': i, 'size': i * 10} for i in range(50)]
+        table = KeyedTable(['symbol', 'id'], rows)
+        for match in [{'symbol': 'XBTUSD', 'id': 7}, {'symbol': 'XBTUSD', 'id': 49}]:
+            self.assertIs(table.find(match), findItemByKeys(['symbol', 'id'], rows, match))
+
+    def test_needs_keys(self):
+        with self.assertRaises(ValueError):
+            KeyedTable([])
+
+
+class TestInstrumentConstants(unittest.TestCase):
+
+    def test_inverse(self):
+        self.assertEqual(instrumentConstants(XBTUSD), {'tickSize': 0.5, 'tickLog': 1, 'futureType': 'Inverse',
+                                                       'multiplier': None})
+
+    def test_quanto_and_linear(self):
+        quanto = dict(XBTUSD, symbol='ETHUSD', tickSize=0.05, multiplier=100, isQuanto=True, isInverse=False,
+                      quoteToSettleMultiplier=100000000)
+        self.assertEqual(instrumentConstants(quanto), {'tickSize': 0.05, 'tickLog': 2, 'futureType': 'Quanto',
+                                                       'multiplier': 0.000001})
+        linear = dict(quanto, symbol='XBTZ18', tickSize=1, isQuanto=False, underlyingToSettleMultiplier=-100)
+        self.assertEqual(instrumentConstants(linear), {'tickSize': 1, 'tickLog': 0, 'futureType': 'Linear',
+                                                       'multiplier': -1.0})
+
+    def test_index(self):
+        self.assertEqual(instrumentConstants({'symbol': '.BXBT', 'tickSize': 0.01, 'multiplier': None}),
+                         {'tickSize': 0.01, 'tickLog': 2, 'futureType': None, 'multiplier': None})
+
+    def test_cached_until_spec_changes(self):
+        ws = websocket()
+        feed(ws, 'instrument', 'partial', [XBTUSD], ['symbol'])
+        self.assertEqual(ws.get_instrument('XBTUSD')['tickLog'], 1)
+        constants = ws.get_instrument_constants('XBTUSD')
+
+        # Price updates leave the constants alone...
+        feed(ws, 'instrument', 'update', [{'symbol': 'XBTUSD', 'lastPrice': 10001.0}])
+        self.assertIs(ws.get_instrument_constants('XBTUSD'), constants)
+
+        # ...a new tick size rederives them, on the row too.
+        feed(ws, 'instrument', 'update', [{'symbol': 'XBTUSD', 'tickSize': 0.01}])
+        self.assertEqual(ws.get_instrument_constants('XBTUSD')['tickLog'], 2)
+        self.assertEqual(ws.get_instrument('XBTUSD')['tickLog'], 2)
+
+        feed(ws, 'instrument', 'insert', [dict(XBTUSD, symbol='XBTZ18', tickSize=5)])
+        self.assertEqual(ws.get_instrument_constants('XBTZ18')['tickLog'], 0)
+
+
+class TestAppendOnlyTables(unittest.TestCase):
+
+    def trades(self, start, count):
+        return [{'symbol': 'XBTUSD', 'trdMatchID': str(i), 'price': 10000.0 + i} for i in range(start, start + count)]
+
+    def test_ring_buffer_keeps_newest(self):
+        ws = websocket()
+        feed(ws, 'trade', 'partial', self.trades(0, 10))
+        feed(ws, 'trade', 'insert', self.trades(10, BitMEXWebsocket.DEFAULT_TABLE_CAPACITY))
+        trades = ws.recent_trades()
+        self.assertEqual(len(trades), BitMEXWebsocket.DEFAULT_TABLE_CAPACITY)
+        self.assertEqual(trades[0]['trdMatchID'], '10')
+        self.assertEqual(trades[-1]['trdMatchID'], str(9 + BitMEXWebsocket.DEFAULT_TABLE_CAPACITY))
+
+    def test_partial_replaces_rows(self):
+        ws = websocket()
+        feed(ws, 'trade', 'partial', self.trades(0, 10))
+        feed(ws, 'trade', 'partial', self.trades(100, 2))
+        self.assertEqual([trade['trdMatchID'] for trade in ws.recent_trades()], ['100', '101'])
+
+    def test_reads_are_copies(self):
+        ws = websocket()
+        feed(ws, 'trade', 'partial', self.trades(0, 2))
+        trades = ws.recent_trades()
+        # The WS thread appending while the caller iterates must not break the caller's loop.
+        for _ in trades:
+            feed(ws, 'trade', 'insert', self.trades(2, 1))
+        self.assertEqual(len(trades), 2)
+        self.assertEqual(len(ws.recent_trades()), 4)
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.ws = websocket()
+        feed(self.ws, 'instrument', 'partial', [XBTUSD], ['symbol'])
+        feed(self.ws, 'position', 'partial', [{'account': 1, 'symbol': 'XBTUSD', 'currency': 'XBt',
+                                               'currentQty': 100, 'avgCostPrice': 9000}],
+             ['account', 'symbol', 'currency'])
+        feed(self.ws, 'margin', 'partial', [{'account': 1, 'currency': 'XBt', 'marginBalance': 1000}],
+             ['account', 'currency'])
+        feed(self.ws, 'order', 'partial', [{'orderID': 'a', 'clOrdID': 'mm_a', 'symbol': 'XBTUSD', 'side': 'Buy',
+                                            'price': 9990.0, 'orderQty': 100, 'leavesQty': 100, 'cumQty': 0}],
+             ['orderID'])
+        feed(self.ws, 'trade', 'partial', [{'symbol': 'XBTUSD', 'price': 10000.0}])
+
+    def test_copied_at_one_version(self):
+        snapshot = self.ws.snapshot('XBTUSD', 'mm_')
+        self.assertEqual(snapshot.version, self.ws.version)
+        self.assertEqual(snapshot.ticker['mid'], 10000.0)
+        self.assertEqual(snapshot.position['currentQty'], 100)
+        self.assertEqual(snapshot.margin['marginBalance'], 1000)
+        self.assertEqual([o['orderID'] for o in snapshot.orders], ['a'])
+        self.assertEqual(snapshot.trade['price'], 10000.0)
+        self.assertIsNone(snapshot.lastClose)
+
+    def test_unchanged_by_later_messages(self):
+        snapshot = self.ws.snapshot('XBTUSD', 'mm_')
+        self.assertIs(self.ws.snapshot('XBTUSD', 'mm_'), snapshot)
+        self.assertFalse(self.ws.is_stale(snapshot))
+
+        feed(self.ws, 'instrument', 'update', [{'symbol': 'XBTUSD', 'bidPrice': 10000.5, 'askPrice': 10001.5}])
+        feed(self.ws, 'order', 'update', [{'orderID': 'a', 'price': 9995.0}])
+        feed(self.ws, 'position', 'update', [{'account': 1, 'symbol': 'XBTUSD', 'currency': 'XBt', 'currentQty': 0}])
+        self.assertTrue(self.ws.is_stale(snapshot))
+        self.assertEqual(self.ws.stale_snapshots, 1)
+
+        # The old snapshot still reads as it was, all from the same moment.
+        self.assertEqual(snapshot.instrument['bidPrice'], 9999.5)
+        self.assertEqual(snapshot.ticker['mid'], 10000.0)
+        self.assertEqual(snapshot.orders[0]['price'], 9990.0)
+        self.assertEqual(snapshot.position['currentQty'], 100)
+
+        fresh = self.ws.snapshot('XBTUSD', 'mm_')
+        self.assertGreater(fresh.version, snapshot.version)
+        self.assertEqual(fresh.ticker['mid'], 10001.0)
+        self.assertEqual(fresh.orders[0]['price'], 9995.0)
+        self.assertEqual(fresh.position['currentQty'], 0)
+
+
+class TestResync(unittest.TestCase):
+
+    def order(self, orderID, price):
+        return {'orderID': orderID, 'clOrdID': 'mm_' + orderID, 'symbol': 'XBTUSD', 'side': 'Buy', 'price': price,
+                'orderQty': 100, 'leavesQty': 100, 'cumQty': 0}
+
+    def connect(self, ws, orders, trades):
+        feed(ws, 'instrument', 'partial', [XBTUSD], ['symbol'])
+        feed(ws, 'order', 'partial', orders, ['orderID'])
+        feed(ws, 'trade', 'partial', trades)
+
+    def test_partials_replace_stale_tables(self):
+        ws = websocket()
+        ws.subscribedTables = set(['instrument', 'order', 'trade'])
+        self.connect(ws, [self.order('a', 9990.0), self.order('b', 9980.0)], [{'symbol': 'XBTUSD', 'price': 1.0}])
+        self.assertEqual(ws.resyncs, 1)
+        self.assertFalse(ws.is_resyncing())
+        self.assertEqual(len(ws.open_orders('mm_')), 2)
+
+        getattr(ws, '_BitMEXWebsocket__on_close')(None)
+        self.assertTrue(ws.is_resyncing())
+        self.assertFalse(ws.connected)
+        # Until its partial arrives, a table is left as it was.
+        self.assertEqual(len(ws.open_orders('mm_')), 2)
+
+        # Order 'a' was canceled while we were away; the partial drops it, and our index with it.
+        feed(ws, 'order', 'partial', [self.order('b', 9980.0), self.order('c', 9970.0)], ['orderID'])
+        self.assertEqual([o['orderID'] for o in ws.open_orders('mm_')], ['b', 'c'])
+        self.assertEqual(ws.best_open_order('mm_', 'Buy')['orderID'], 'b')
+        self.assertIsNone(ws.data['order'].find({'orderID': 'a'}))
+        self.assertTrue(ws.is_resyncing())
+
+        feed(ws, 'instrument', 'partial', [dict(XBTUSD, lastPrice=11000.0)], ['symbol'])
+        feed(ws, 'trade', 'partial', [{'symbol': 'XBTUSD', 'price': 2.0}])
+        self.assertFalse(ws.is_resyncing())
+        self.assertEqual(ws.resyncs, 2)
+        self.assertEqual(ws.get_instrument('XBTUSD')['lastPrice'], 11000.0)
+        self.assertEqual([trade['price'] for trade in ws.recent_trades()], [2.0])
+
+    def test_index_asked_for_before_the_partial(self):
+        ws = websocket()
+        self.assertEqual(ws.open_orders('mm_'), ())
+        self.connect(ws, [self.order('a', 9990.0)], [])
+        feed(ws, 'order', 'insert', [self.order('b', 9995.0)])
+        self.assertEqual(ws.best_open_order('mm_', 'Buy')['orderID'], 'b')
+        feed(ws, 'order', 'delete', [{'orderID': 'b'}])
+        self.assertEqual(ws.best_open_order('mm_', 'Buy')['orderID'], 'a')
+        self.assertEqual(ws.open_order_count('mm_', 'Buy'), 1)
+
+
+class TestListeners(unittest.TestCase):
+
+    def setUp(self):
+        self.ws = websocket()
+        self.calls = []
+        feed(self.ws, 'order', 'partial', [], ['orderID'])
+
+    def listener(self, table, action, data):
+        self.calls.append((table, action, [row['orderID'] for row in data]))
+
+    def order(self, orderID, **fields):
+        return dict({'orderID': orderID, 'clOrdID': 'mm_' + orderID, 'symbol': 'XBTUSD', 'side': 'Buy',
+                     'price': 9990.0, 'orderQty': 100, 'leavesQty': 100, 'cumQty': 0}, **fields)
+
+    def test_insert_update_delete(self):
+        self.ws.add_listener('order', self.listener)
+        feed(self.ws, 'order', 'insert', [self.order('a'), self.order('b')])
+        feed(self.ws, 'order', 'update', [{'orderID': 'a', 'price': 9995.0}])
+        feed(self.ws, 'order', 'delete', [{'orderID': 'b'}])
+        # Other tables don't call it.
+        feed(self.ws, 'trade', 'partial', [{'symbol': 'XBTUSD', 'price': 1.0}])
+        self.assertEqual(self.calls, [('order', 'insert', ['a', 'b']), ('order', 'update', ['a']),
+                                      ('order', 'delete', ['b'])])
+
+    def test_actions(self):
+        self.ws.add_listener('order', self.listener, actions=['update'])
+        feed(self.ws, 'order', 'insert', [self.order('a')])
+        feed(self.ws, 'order', 'update', [{'orderID': 'a', 'price': 9995.0}])
+        self.assertEqual(self.calls, [('order', 'update', ['a'])])
+
+    def test_sees_the_applied_message(self):
+        seen = []
+        self.ws.add_listener('order', lambda table, action, data: seen.append(self.ws.open_orders('mm_')))
+        feed(self.ws, 'order', 'insert', [self.order('a')])
+        self.assertEqual([[o['orderID'] for o in orders] for orders in seen], [['a']])
+
+    def test_remove(self):
+        self.ws.add_listener('order', self.listener)
+        feed(self.ws, 'order', 'insert', [self.order('a')])
+        self.ws.remove_listener('order', self.listener)
+        feed(self.ws, 'order', 'insert', [self.order('b')])
+        self.assertEqual(self.calls, [('order', 'insert', ['a'])])
+
+    def test_errors_are_contained(self):
+        def fail(table, action, data):
+            raise ValueError('listener')
+        self.ws.add_listener('order', fail)
+        self.ws.add_listener('order', self.listener)
+        feed(self.ws, 'order', 'insert', [self.order('a')])
+        self.assertEqual(self.calls, [('order', 'insert', ['a'])])
+        self.assertEqual(len(self.ws.open_orders('mm_')), 1)
+
+
+class TestWaitFor(unittest.TestCase):
+
+    def test_returns_when_partial_lands(self):
+        ws = websocket()
+        wait_for = getattr(ws, '_BitMEXWebsocket__wait_for')
+        result = []
+
+        def waiter():
+            start = time.time()
+            result.append((wait_for(lambda: 'trade' in ws.partials, 5), time.time() - start))
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        time.sleep(0.05)
+        feed(ws, 'trade', 'partial', [{'symbol': 'XBTUSD', 'price': 1.0}])
+        thread.join(5)
+        found, elapsed = result[0]
+        self.assertTrue(found)
+        # Woken by the partial, well inside the once-a-second fallback wake-up.
+        self.assertLess(elapsed, 0.5)
+
+    def test_timeout(self):
+        ws = websocket()
+        start = time.time()
+        self.assertFalse(getattr(ws, '_BitMEXWebsocket__wait_for')(lambda: False, 0.05))
+        self.assertLess(time.time() - start, 0.5)
+
+    def test_exit_wakes_waiters(self):
+        ws = websocket()
+        wait_for = getattr(ws, '_BitMEXWebsocket__wait_for')
+        result = []
+        thread = threading.Thread(target=lambda: result.append(wait_for(lambda: False)))
+        thread.start()
+        time.sleep(0.05)
+        ws.exit()
+        thread.join(0.5)
+        self.assertEqual(result, [False])
+
+
+class TestMarketDepth(unittest.TestCase):
+
+    def test_returns_a_copy(self):
+        ws = websocket()
+        feed(ws, 'orderBook10', 'partial', [{'symbol': 'XBTUSD', 'bids': [[99.5, 10]], 'asks': [[100.0, 5]]}],
+             ['symbol'])
+        book = ws.market_depth('XBTUSD')
+        feed(ws, 'orderBook10', 'update', [{'symbol': 'XBTUSD', 'bids': [[99.0, 1]], 'asks': [[99.5, 2]]}])
+        self.assertEqual((book.best_bid(), book.best_ask()), ((99.5, 10), (100.0, 5)))
+        self.assertEqual(ws.market_depth('XBTUSD').best_ask(), (99.5, 2))
+        with self.assertRaises(Exception):
+            ws.market_depth('ETHUSD')
+
+    def test_queries_without_a_copy(self):
+        ws = websocket()
+        feed(ws, 'orderBook10', 'partial', [{'symbol': 'XBTUSD', 'bids': [[99.5, 10], [99.0, 20], [98.0, 40]],
+                                             'asks': [[100.0, 5], [100.5, 15]]}], ['symbol'])
+        self.assertEqual(ws.best_bid('XBTUSD'), (99.5, 10))
+        self.assertEqual(ws.best_ask('XBTUSD'), (100.0, 5))
+        self.assertEqual(ws.size_within('XBTUSD', 'Buy', 1, 0.5), 30)
+        self.assertEqual(ws.price_to_fill('XBTUSD', 'Sell', 10), 100.5)
+        self.assertIsNone(ws.price_to_fill('XBTUSD', 'Sell', 100))
+        with self.assertRaises(Exception):
+            ws.best_bid('ETHUSD')
+
+
+if __name__ == '__main__':
+    unittest.main()
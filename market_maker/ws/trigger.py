@@ -0,0 +1,109 @@
+import threading
+from time import time
+
+
+# Decides when the order loop should run, from realtime data.
+#
+# Listens to the websocket for the things that should change our orders:
+#   - the mid price moving more than a threshold (a fraction of price) from where it was when we
+#     last ran,
+#   - a fill on our account (an execution with execType 'Trade'; our own order acks don't count),
+#   - a change to our position,
+#   - a new tradeBin5m bar, which moves the moving averages.
+# wait() blocks until one of those happens, then waits `debounce` seconds more so a burst of
+# messages (a fill is usually an execution, an order update and a position update) leads to one
+# pass rather than several. If nothing happens for `maxIdle` seconds it returns anyway, so the loop
+# keeps running if an event is missed.
+class OrderTrigger(object):
+
+    def __init__(self, symbol, quoteThreshold):
+        self.symbol = symbol
+        self.quoteThreshold = quoteThreshold
+        self.condition = threading.Condition()
+        # (reason, time) of the first event since the loop last ran, or None.
+        self.pending = None
+        self.mid = None
+        # The mid when the loop last ran; quote moves are measured from here.
+        self.referenceMid = None
+        # Decision latency: from an event arriving to the loop having acted on it.
+        self.reactions = 0
+        self.totalLatency = 0
+        self.maxLatency = 0
+
+    def attach(self, bitmex):
+        '''Start listening to a BitMEX connection's realtime data.'''
+        bitmex.add_listener('quote', self.on_quote)
+        bitmex.add_listener('execution', self.on_execution)
+        bitmex.add_listener('position', self.on_position)
+        bitmex.add_listener('tradeBin5m', self.on_trade_bin, actions=['insert'])
+
+    def detach(self, bitmex):
+        bitmex.remove_listener('quote', self.on_quote)
+        bitmex.remove_listener('execution', self.on_execution)
+        bitmex.remove_listener('position', self.on_position)
+        bitmex.remove_listener('tradeBin5m', self.on_trade_bin)
+
+    def wait(self, debounce, maxIdle):
+        '''Block until the loop should run.
+
+        Returns (reason, triggeredAt): what woke us and when it arrived, or (None, None) if we
+        waited `maxIdle` seconds without an event.'''
+        deadline = time() + maxIdle
+        with self.condition:
+            while self.pending is None:
+                remaining = deadline - time()
+                if remaining <= 0:
+                    break
+                self.condition.wait(min(remaining, 1))
+            if self.pending is not None and debounce > 0:
+                # Let the rest of the burst arrive. Later events don't restart the wait, so a
+                # steady stream of them can't hold the loop off.
+                self.condition.wait(debounce)
+            pending = self.pending
+            self.pending = None
+            self.referenceMid = self.mid
+        return pending or (None, None)
+
+    def record_latency(self, triggeredAt):
+        '''Note that the loop has acted on an event that arrived at `triggeredAt`. Returns the latency.'''
+        latency = time() - triggeredAt
+        self.reactions += 1
+        self.totalLatency += latency
+        self.maxLatency = max(self.maxLatency, latency)
+        return latency
+
+    def average_latency(self):
+        return self.totalLatency / self.reactions if self.reactions else 0
+
+    def fire(self, reason):
+        with self.condition:
+            if self.pending is None:
+                self.pending = (reason, time())
+                self.condition.notify()
+
+    #
+    # Listeners. These run on the websocket thread.
+    #
+    def on_quote(self, table, action, data):
+        for quote in data:
+            if quote.get('symbol') != self.symbol or not quote.get('bidPrice') or not quote.get('askPrice'):
+                continue
+            self.mid = (quote['bidPrice'] + quote['askPrice']) / 2.0
+            if self.referenceMid is None:
+                self.referenceMid = self.mid
+            elif abs(self.mid - self.referenceMid) >= self.quoteThreshold * self.referenceMid:
+                self.fire('quote')
+
+    def on_execution(self, table, action, data):
+        # Executions also report our own orders being placed, amended and canceled ('New',
+        # 'Replaced', 'Canceled'). Reacting to those would make every requote trigger another.
+        if action != 'partial' and any(row.get('symbol') == self.symbol and row.get('execType') == 'Trade'
+                                       for row in data):
+            self.fire('execution')
+
+    def on_position(self, table, action, data):
+        if action != 'partial' and any(row.get('symbol') == self.symbol and 'currentQty' in row for row in data):
+            self.fire('position')
+
+    def on_trade_bin(self, table, action, data):
+        self.fire('tradeBin5m')
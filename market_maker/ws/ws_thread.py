@@ -3,19 +3,31 @@ import websocket
 import threading
 import traceback
 import ssl
-from time import sleep
+from time import sleep, time
 import json
 import decimal
 import logging
+from collections import OrderedDict, deque
+from operator import itemgetter
 from market_maker.settings import settings
 from market_maker.auth.APIKeyAuth import generate_nonce, generate_signature
 from market_maker.utils.log import setup_custom_logger
 from market_maker.utils.math import toNearest
+from market_maker.ws.openorders import OpenOrders
+from market_maker.ws.orderbook import OrderBook
+from market_maker.ws.recorder import FrameRecorder
 from future.utils import iteritems
 from future.standard_library import hooks
 with hooks():  # Python 2/3 compat
     from urllib.parse import urlparse, urlunparse
 
+# Decoding every frame is most of the cost of handling it; use orjson if it's installed. Not ujson:
+# without precise_float, older versions can be off in the last digit of a price.
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
 
 # Connects to BitMEX websocket for streaming realtime data.
 # The Marketmaker still interacts with this as if it were a REST Endpoint, but now it can get
@@ -30,23 +42,50 @@ class BitMEXWebsocket():
     # Don't grow a table larger than this amount. Helps cap memory usage.
     MAX_TABLE_LEN = 200
 
-    def __init__(self):
+    # Tables that only ever get rows appended (trade, quote, tradeBin*) are kept in fixed-size ring
+    # buffers. This is the default capacity; set WS_TABLE_CAPACITY in settings to override per table.
+    DEFAULT_TABLE_CAPACITY = MAX_TABLE_LEN
+
+    # How long to wait for the socket to open before giving up.
+    CONNECT_TIMEOUT = 5
+
+    def __init__(self, decoder=None, recorder=None):
+        '''`decoder` turns a raw frame into a dict. Defaults to the fastest JSON parser available.
+
+        `recorder`, if given, is a FrameRecorder that every received frame is written to. Without one,
+        frames are recorded if WS_RECORD_DIR is set.'''
         self.logger = logging.getLogger('root')
+        self.decode = decoder or json_loads
+        self.recorder = recorder
+        # Notified whenever the connection opens or closes, or a partial lands.
+        self.state_changed = threading.Condition()
+        # Held by the WS thread while it applies a message, and while a snapshot is copied.
+        self.lock = threading.RLock()
+        # table -> list of (callback, actions). See add_listener().
+        self.listeners = {}
         self.__reset()
 
     def __del__(self):
         self.exit()
 
-    def connect(self, endpoint="", symbol="XBTN15", shouldAuth=True):
-        '''Connect to the websocket and initialize data stores.'''
+    def connect(self, endpoint="", symbol="XBTN15", shouldAuth=True, clOrdIDPrefix=None):
+        '''Connect to the websocket and initialize data stores.
+
+        If `clOrdIDPrefix` is given, our open orders with that prefix are indexed from the order
+        partial on, so open_orders() and friends never have to build the index themselves.'''
 
         self.logger.debug("Connecting WebSocket.")
         self.symbol = symbol
         self.shouldAuth = shouldAuth
+        if clOrdIDPrefix is not None:
+            self.__open_orders(clOrdIDPrefix)
+        if self.recorder is None and settings.WS_RECORD_DIR:
+            self.recorder = FrameRecorder(settings.WS_RECORD_DIR, settings.WS_RECORD_COMPRESSION,
+                                          settings.WS_RECORD_SEGMENT_BYTES)
 
         # We can subscribe right in the connection querystring, so let's build that.
         # Subscribe to all pertinent endpoints
-        subscriptions = [sub + ':' + symbol for sub in ["quote", "trade","tradeBin5m","orderBook10"]]
+        subscriptions = [sub + ':' + symbol for sub in ["quote", "trade", "tradeBin5m", settings.ORDERBOOK_TABLE]]
         subscriptions += ["instrument"]  # We want all of them
         if self.shouldAuth:
             subscriptions += [sub + ':' + symbol for sub in ["order", "execution"]]
@@ -57,6 +96,8 @@ class BitMEXWebsocket():
         urlParts[0] = urlParts[0].replace('http', 'ws')
         urlParts[2] = "/realtime?subscribe=" + ",".join(subscriptions)
         wsURL = urlunparse(urlParts)
+        # Every subscription sends a partial; after a reconnect we're resynced once they're all back.
+        self.subscribedTables = set(sub.split(':')[0] for sub in subscriptions)
         self.logger.info("Connecting to %s" % wsURL)
         self.__connect(wsURL)
         self.logger.info('Connected to WS. Waiting for data images, this may take a moment...')
@@ -71,64 +112,129 @@ class BitMEXWebsocket():
     # Data methods
     #
     def get_instrument(self, symbol):
-        instruments = self.data['instrument']
-        matchingInstruments = [i for i in instruments if i['symbol'] == symbol]
-        if len(matchingInstruments) == 0:
+        instrument = self.data['instrument'].find({'symbol': symbol})
+        if instrument is None:
             raise Exception("Unable to find instrument or index with symbol: " + symbol)
-        instrument = matchingInstruments[0]
-        # Turn the 'tickSize' into 'tickLog' for use in rounding
-        # http://stackoverflow.com/a/6190291/832202
-        instrument['tickLog'] = decimal.Decimal(str(instrument['tickSize'])).as_tuple().exponent * -1
+        # 'tickLog' is kept up to date on the row by the message handler.
         return instrument
 
+    def get_instrument_constants(self, symbol):
+        '''Return the derived constants (tickLog, tickSize, multiplier, futureType) for an instrument.'''
+        if symbol not in self.instrument_constants:
+            self.__cache_instrument_constants(self.get_instrument(symbol))
+        return self.instrument_constants[symbol]
+
     def get_ticker(self, symbol):
         '''Return a ticker object. Generated from instrument.'''
 
-        instrument = self.get_instrument(symbol)
+        return instrumentTicker(self.get_instrument(symbol))
 
-        # If this is an index, we have to get the data from the last trade.
-        if instrument['symbol'][0] == '.':
-            ticker = {}
-            ticker['mid'] = ticker['buy'] = ticker['sell'] = ticker['last'] = instrument['markPrice']
-        # Normal instrument
-        else:
-            bid = instrument['bidPrice'] or instrument['lastPrice']
-            ask = instrument['askPrice'] or instrument['lastPrice']
-            ticker = {
-                "last": instrument['lastPrice'],
-                "buy": bid,
-                "sell": ask,
-                "mid": (bid + ask) / 2
-            }
-
-        # The instrument has a tickSize. Use it to round values.
-        return {k: toNearest(float(v or 0), instrument['tickSize']) for k, v in iteritems(ticker)}
-   
     def last_close(self):
-        return self.data['tradeBin5m']
-   
+        with self.lock:
+            return list(self.data['tradeBin5m'])
+
     def funds(self):
-        return self.data['margin'][0]
+        with self.lock:
+            return self.data['margin'][0]
 
     def market_depth(self, symbol):
-        raise NotImplementedError('orderBook is not subscribed; use askPrice and bidPrice on instrument')
-        # return self.data['orderBook25'][0]
+        '''Return a copy of the local OrderBook for a symbol.
+
+        The WS thread changes the live book as messages arrive, so it's copied while no message is
+        being applied. Read the copy as much as you like; it won't change. Copying is O(levels), so
+        for one question about the book use best_bid(), best_ask(), size_within() or price_to_fill().'''
+        with self.lock:
+            return self.__live_book(symbol).copy()
+
+    def best_bid(self, symbol):
+        '''Return (price, size) of the best bid in the local book, or None if there are no bids.'''
+        with self.lock:
+            return self.__live_book(symbol).best_bid()
+
+    def best_ask(self, symbol):
+        '''Return (price, size) of the best ask in the local book, or None if there are no asks.'''
+        with self.lock:
+            return self.__live_book(symbol).best_ask()
+
+    def size_within(self, symbol, side, ticks, tickSize):
+        '''Total size resting within `ticks` ticks of the best price on a side. See OrderBook.size_within().'''
+        with self.lock:
+            return self.__live_book(symbol).size_within(side, ticks, tickSize)
+
+    def price_to_fill(self, symbol, side, quantity):
+        '''The worst price we'd trade at taking `quantity` from a side. See OrderBook.price_to_fill().'''
+        with self.lock:
+            return self.__live_book(symbol).price_to_fill(side, quantity)
 
     def open_orders(self, clOrdIDPrefix):
-        orders = self.data['order']
-        # Filter to only open orders (leavesQty > 0) and those that we actually placed
-        return [o for o in orders if str(o['clOrdID']).startswith(clOrdIDPrefix) and o['leavesQty'] > 0]
+        '''Open orders (leavesQty > 0) that we actually placed, i.e. whose clOrdID has our prefix.'''
+        with self.lock:
+            return self.__open_orders(clOrdIDPrefix).all()
+
+    def best_open_order(self, clOrdIDPrefix, side):
+        '''Our highest open buy or lowest open sell, or None if we have none on that side.'''
+        with self.lock:
+            return self.__open_orders(clOrdIDPrefix).best(side)
+
+    def open_order_count(self, clOrdIDPrefix, side):
+        with self.lock:
+            return self.__open_orders(clOrdIDPrefix).count(side)
 
     def position(self, symbol):
-        positions = self.data['position']
-        pos = [p for p in positions if p['symbol'] == symbol]
+        # The position table is keyed on account and currency too, so it can't be looked up by symbol
+        # alone. Scan it while the WS thread can't be changing it.
+        with self.lock:
+            pos = [p for p in self.data['position'] if p['symbol'] == symbol]
         if len(pos) == 0:
             # No position found; stub it
             return {'avgCostPrice': 0, 'avgEntryPrice': 0, 'currentQty': 0, 'symbol': symbol}
         return pos[0]
 
     def recent_trades(self):
-        return self.data['trade']
+        # A copy: the live table is changed by the WS thread, and iterating it meanwhile raises.
+        with self.lock:
+            return list(self.data['trade'])
+
+    #
+    # Snapshots
+    #
+    def snapshot(self, symbol, clOrdIDPrefix):
+        '''Return a consistent, point-in-time Snapshot of what the strategy reads for a symbol.
+
+        The rows in the live tables are updated in place by the WS thread, so reading several of
+        them in turn can mix data from different messages. A snapshot is copied while no message
+        is being applied, so everything in it is from the same moment, and it never changes after
+        that; read as much of it as you like without locking. Snapshots are only rebuilt when a
+        message has been applied since the last one was taken.'''
+        key = (symbol, clOrdIDPrefix)
+        with self.lock:
+            snapshot = self.snapshots.get(key)
+            if snapshot is None or snapshot.version != self.version:
+                snapshot = Snapshot(self, symbol, clOrdIDPrefix)
+                self.snapshots[key] = snapshot
+            return snapshot
+
+    def is_stale(self, snapshot):
+        '''Return True, and count it in stale_snapshots, if any table has changed since `snapshot`.'''
+        stale = snapshot.version != self.version
+        if stale:
+            self.stale_snapshots += 1
+        return stale
+
+    #
+    # Listeners
+    #
+    def add_listener(self, table, callback, actions=None):
+        '''Call `callback(table, action, data)` whenever a message for `table` has been applied.
+
+        `actions` limits the callback to some of 'partial', 'insert', 'update' and 'delete'; by default
+        it gets all of them. `data` is the list of rows from the message. Callbacks run on the
+        websocket thread, so they should be quick and must not block.'''
+        self.listeners.setdefault(table, []).append((callback, set(actions) if actions else None))
+
+    def remove_listener(self, table, callback):
+        '''Stop calling a callback registered with add_listener().'''
+        self.listeners[table] = [(cb, actions) for cb, actions in self.listeners.get(table, []) if cb != callback]
 
     #
     # Lifecycle methods
@@ -140,7 +246,17 @@ class BitMEXWebsocket():
 
     def exit(self):
         self.exited = True
+        self.__notify_state_changed()
         self.ws.close()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def is_resyncing(self):
+        '''True while we're reconnecting, or waiting for partials to replace stale tables.
+
+        Table data is left as it was when the connection dropped until each table's partial
+        arrives, so don't act on it while this is True.'''
+        return self.disconnectedAt is not None
 
     #
     # Private methods
@@ -150,33 +266,54 @@ class BitMEXWebsocket():
         '''Connect to the websocket in a thread.'''
         self.logger.debug("Starting thread")
 
-        ssl_defaults = ssl.get_default_verify_paths()
-        sslopt_ca_certs = {'ca_certs': ssl_defaults.cafile}
-        self.ws = websocket.WebSocketApp(wsURL,
-                                         on_message=self.__on_message,
-                                         on_close=self.__on_close,
-                                         on_open=self.__on_open,
-                                         on_error=self.__on_error,
-                                         header=self.__get_auth()
-                                         )
-
+        self.wsURL = wsURL
         setup_custom_logger('websocket', log_level=settings.LOG_LEVEL)
-        self.wst = threading.Thread(target=lambda: self.ws.run_forever(sslopt=sslopt_ca_certs))
+        self.wst = threading.Thread(target=self.__run)
         self.wst.daemon = True
         self.wst.start()
         self.logger.info("Started thread")
 
         # Wait for connect before continuing
-        conn_timeout = 5
-        while (not self.ws.sock or not self.ws.sock.connected) and conn_timeout and not self._error:
-            sleep(1)
-            conn_timeout -= 1
+        connected = self.__wait_for(lambda: self.connected or self._error, BitMEXWebsocket.CONNECT_TIMEOUT)
 
-        if not conn_timeout or self._error:
+        if not connected or self._error:
             self.logger.error("Couldn't connect to WS! Exiting.")
             self.exit()
             sys.exit(1)
 
+    def __run(self):
+        '''Body of the WS thread. Runs the socket and, if it drops, reconnects with backoff.
+
+        Tables are kept through the gap and replaced one by one as the new connection's partials
+        land. If we can't reconnect after WS_RECONNECT_ATTEMPTS tries, we give up and exit().'''
+        ssl_defaults = ssl.get_default_verify_paths()
+        sslopt_ca_certs = {'ca_certs': ssl_defaults.cafile}
+        attempts = 0
+        while not self.exited:
+            # Build a new app each time: the auth headers are only good for one connection.
+            self.ws = websocket.WebSocketApp(self.wsURL,
+                                             on_message=self.__on_message,
+                                             on_close=self.__on_close,
+                                             on_open=self.__on_open,
+                                             on_error=self.__on_error,
+                                             header=self.__get_auth()
+                                             )
+            resyncs = self.resyncs
+            self.ws.run_forever(sslopt=sslopt_ca_certs)
+            if self.exited:
+                break
+
+            # Only connections that never got all their partials back count as failed attempts.
+            attempts = 0 if self.resyncs != resyncs else attempts + 1
+            if self.disconnectedAt is None:
+                self.disconnectedAt = time()
+            if attempts >= settings.WS_RECONNECT_ATTEMPTS:
+                self.error("Unable to reconnect to the WS after %d attempts." % attempts)
+                break
+            delay = min(settings.WS_RECONNECT_BACKOFF * 2 ** attempts, settings.WS_RECONNECT_MAX_BACKOFF)
+            self.logger.warning("WS connection lost. Reconnecting in %.1f seconds." % delay)
+            self.__wait_for(lambda: False, delay)
+
     def __get_auth(self):
         '''Return auth headers. Will use API Keys if present in settings.'''
 
@@ -195,14 +332,39 @@ class BitMEXWebsocket():
 
     def __wait_for_account(self):
         '''On subscribe, this data will come down. Wait for it.'''
-        # Wait for the keys to show up from the ws
-        while not {'margin', 'position', 'order'} <= set(self.data):
-            sleep(0.1)
+        # Wait for the partials to show up from the ws
+        self.__wait_for(lambda: {'margin', 'position', 'order'} <= self.partials)
 
     def __wait_for_symbol(self, symbol):
         '''On subscribe, this data will come down. Wait for it.'''
-        while not {'instrument', 'trade', 'quote'} <= set(self.data):
-            sleep(0.1)
+        self.__wait_for(lambda: {'instrument', 'trade', 'quote'} <= self.partials)
+
+    def __wait_for(self, predicate, timeout=None):
+        '''Block until predicate() is true, the socket exits or `timeout` seconds pass.
+
+        The WS thread notifies state_changed as things happen, so this returns as soon as the
+        predicate can have become true. Returns the predicate's last value.'''
+        deadline = None if timeout is None else time() + timeout
+        with self.state_changed:
+            while not predicate() and not self.exited:
+                # Wake at least once a second; on Python 2 an untimed wait can't be interrupted.
+                wait = 1 if deadline is None else min(1, deadline - time())
+                if wait <= 0:
+                    break
+                self.state_changed.wait(wait)
+            return predicate()
+
+    def __notify_state_changed(self):
+        with self.state_changed:
+            self.state_changed.notify_all()
+
+    def __notify_listeners(self, table, action, data):
+        for callback, actions in self.listeners.get(table, ()):
+            if actions is None or action in actions:
+                try:
+                    callback(table, action, data)
+                except Exception:
+                    self.logger.error("Error in %s listener: %s" % (table, traceback.format_exc()))
 
     def __send_command(self, command, args):
         '''Send a raw command.'''
@@ -210,15 +372,18 @@ class BitMEXWebsocket():
 
     def __on_message(self, ws, message):
         '''Handler for parsing WS messages.'''
-        message = json.loads(message)
-        self.logger.debug(json.dumps(message))
+        if self.recorder is not None:
+            self.recorder.record(message)
+        # Log the raw frame; re-serializing the decoded one would cost as much as decoding it.
+        self.logger.debug(message)
+        message = self.decode(message)
 
         table = message['table'] if 'table' in message else None
         action = message['action'] if 'action' in message else None
         try:
             if 'subscribe' in message:
                 if message['success']:
-                    self.logger.debug("Subscribed to %s." % message['subscribe'])
+                    self.logger.debug("Subscribed to %s.", message['subscribe'])
                 else:
                     self.error("Unable to subscribe to %s. Error: \"%s\" Please check and restart." %
                                (message['request']['args'][0], message['error']))
@@ -228,88 +393,384 @@ class BitMEXWebsocket():
                 if message['status'] == 401:
                     self.error("API Key incorrect, please check and restart.")
             elif action:
-
-                if table not in self.data:
-                    self.data[table] = []
-
-                if table not in self.keys:
-                    self.keys[table] = []
-
-                # There are four possible actions from the WS:
-                # 'partial' - full table image
-                # 'insert'  - new row
-                # 'update'  - update row
-                # 'delete'  - delete row
-                if action == 'partial':
-                    self.logger.debug("%s: partial" % table)
-                    self.data[table] += message['data']
-                    # Keys are communicated on partials to let you know how to uniquely identify
-                    # an item. We use it for updates.
-                    self.keys[table] = message['keys']
-                elif action == 'insert':
-                    self.logger.debug('%s: inserting %s' % (table, message['data']))
-                    self.data[table] += message['data']
-
-                    # Limit the max length of the table to avoid excessive memory usage.
-                    # Don't trim orders because we'll lose valuable state if we do.
-                    if table != 'order' and len(self.data[table]) > BitMEXWebsocket.MAX_TABLE_LEN:
-                        self.data[table] = self.data[table][(BitMEXWebsocket.MAX_TABLE_LEN // 2):]
-
-                elif action == 'update':
-                    self.logger.debug('%s: updating %s' % (table, message['data']))
-                    # Locate the item in the collection and update it.
-                    for updateData in message['data']:
-                        item = findItemByKeys(self.keys[table], self.data[table], updateData)
-                        if not item:
-                            continue  # No item found to update. Could happen before push
-
-                        # Log executions
-                        if table == 'order':
-                            is_canceled = 'ordStatus' in updateData and updateData['ordStatus'] == 'Canceled'
-                            if 'cumQty' in updateData and not is_canceled:
-                                contExecuted = updateData['cumQty'] - item['cumQty']
-                                if contExecuted > 0:
-                                    instrument = self.get_instrument(item['symbol'])
-                                    self.logger.info("Execution: %s %d Contracts of %s at %.*f" %
-                                             (item['side'], contExecuted, item['symbol'],
-                                              instrument['tickLog'], item['price']))
-
-                        # Update this item.
-                        item.update(updateData)
-
-                        # Remove canceled / filled orders
-                        if table == 'order' and item['leavesQty'] <= 0:
+                with self.lock:
+                    if table not in self.data:
+                        self.data[table] = self.__new_table(table)
+
+                    if table not in self.keys:
+                        self.keys[table] = []
+
+                    # There are four possible actions from the WS:
+                    # 'partial' - full table image
+                    # 'insert'  - new row
+                    # 'update'  - update row
+                    # 'delete'  - delete row
+                    if action == 'partial':
+                        self.logger.debug("%s: partial", table)
+                        # Keys are communicated on partials to let you know how to uniquely identify
+                        # an item. We use them to index the table so updates don't have to scan it.
+                        # The partial is the whole table, so it replaces whatever we had; after a
+                        # reconnect that's stale.
+                        self.keys[table] = message['keys']
+                        if self.keys[table]:
+                            self.data[table] = KeyedTable(self.keys[table], message['data'])
+                        else:
+                            self.data[table] = self.__new_table(table)
+                            self.data[table] += message['data']
+                        if table == 'instrument':
+                            for instrument in self.data[table]:
+                                self.__cache_instrument_constants(instrument)
+                        elif table == 'order':
+                            for openOrders in self.own_orders.values():
+                                openOrders.reset(self.data[table])
+                        wasSynced = self.subscribedTables <= self.partials
+                        self.partials.add(table)
+                        if not wasSynced and self.subscribedTables <= self.partials:
+                            self.resyncs += 1
+                            if self.disconnectedAt is not None:
+                                self.logger.info("WS resynced. Recovered in %.2f seconds." %
+                                                 (time() - self.disconnectedAt))
+                                self.disconnectedAt = None
+                        self.__notify_state_changed()
+                    elif action == 'insert':
+                        self.logger.debug('%s: inserting %s', table, message['data'])
+                        self.data[table] += message['data']
+                        if table == 'instrument':
+                            for instrument in message['data']:
+                                self.__cache_instrument_constants(instrument)
+                        elif table == 'order':
+                            for openOrders in self.own_orders.values():
+                                for order in message['data']:
+                                    openOrders.add(order)
+
+                        # Limit the max length of the table to avoid excessive memory usage.
+                        # Ring buffers evict their oldest rows on their own as they're appended to.
+                        # Don't trim orders because we'll lose valuable state if we do.
+                        if table != 'order' and isinstance(self.data[table], KeyedTable) and \
+                                len(self.data[table]) > BitMEXWebsocket.MAX_TABLE_LEN:
+                            self.data[table].evict(BitMEXWebsocket.MAX_TABLE_LEN // 2)
+
+                    elif action == 'update':
+                        self.logger.debug('%s: updating %s', table, message['data'])
+                        # Locate the item in the collection and update it.
+                        for updateData in message['data']:
+                            item = self.__find_item(table, updateData)
+                            if not item:
+                                continue  # No item found to update. Could happen before push
+
+                            # Log executions
+                            if table == 'order':
+                                is_canceled = 'ordStatus' in updateData and updateData['ordStatus'] == 'Canceled'
+                                if 'cumQty' in updateData and not is_canceled:
+                                    contExecuted = updateData['cumQty'] - item['cumQty']
+                                    if contExecuted > 0:
+                                        instrument = self.get_instrument(item['symbol'])
+                                        self.logger.info("Execution: %s %d Contracts of %s at %.*f" %
+                                                 (item['side'], contExecuted, item['symbol'],
+                                                  instrument['tickLog'], item['price']))
+
+                            # Only rederive instrument constants if the fields they come from moved.
+                            constantsChanged = table == 'instrument' and any(
+                                field in updateData and updateData[field] != item.get(field)
+                                for field in INSTRUMENT_CONSTANT_FIELDS)
+
+                            # Update this item.
+                            item.update(updateData)
+
+                            if constantsChanged:
+                                self.__cache_instrument_constants(item)
+
+                            if table == 'order':
+                                # Re-sort our own orders if this one moved; drop it if it's done.
+                                for openOrders in self.own_orders.values():
+                                    openOrders.update(item)
+
+                                # Remove canceled / filled orders
+                                if item['leavesQty'] <= 0:
+                                    self.data[table].remove(item)
+
+                    elif action == 'delete':
+                        self.logger.debug('%s: deleting %s', table, message['data'])
+                        # Locate the item in the collection and remove it.
+                        for deleteData in message['data']:
+                            item = self.__find_item(table, deleteData)
                             self.data[table].remove(item)
+                            if table == 'order' and item is not None:
+                                for openOrders in self.own_orders.values():
+                                    openOrders.remove(item)
+                    else:
+                        raise Exception("Unknown action: %s" % action)
 
-                elif action == 'delete':
-                    self.logger.debug('%s: deleting %s' % (table, message['data']))
-                    # Locate the item in the collection and remove it.
-                    for deleteData in message['data']:
-                        item = findItemByKeys(self.keys[table], self.data[table], deleteData)
-                        self.data[table].remove(item)
-                else:
-                    raise Exception("Unknown action: %s" % action)
+                    if table in ORDER_BOOK_TABLES:
+                        self.__update_order_books(table, action, message['data'])
+
+                    self.version += 1
+
+                if table in self.listeners:
+                    self.__notify_listeners(table, action, message['data'])
         except:
             self.logger.error(traceback.format_exc())
 
+    def __cache_instrument_constants(self, instrument):
+        '''Derive an instrument's constants and store them, along with tickLog on the row itself.'''
+        constants = instrumentConstants(instrument)
+        instrument['tickLog'] = constants['tickLog']
+        self.instrument_constants[instrument['symbol']] = constants
+
+    def __open_orders(self, clOrdIDPrefix):
+        '''Return the index of our open orders for a prefix, building it if connect() wasn't given it.
+
+        From then on the message handler keeps it up to date. The WS thread loops over own_orders
+        while it applies a message, so the index is only added under self.lock; hold it too while
+        reading the index that's returned.'''
+        with self.lock:
+            if clOrdIDPrefix not in self.own_orders:
+                self.own_orders[clOrdIDPrefix] = OpenOrders(clOrdIDPrefix, self.data.get('order', ()))
+            return self.own_orders[clOrdIDPrefix]
+
+    def __update_order_books(self, table, action, rows):
+        '''Feed an order book message into the local OrderBook for each symbol in it.'''
+        if table == 'orderBookL2':
+            bySymbol = {}
+            for row in rows:
+                bySymbol.setdefault(row['symbol'], []).append(row)
+            for symbol, symbolRows in iteritems(bySymbol):
+                self.__order_book(symbol).apply_l2(action, symbolRows)
+        else:
+            # orderBook10 rows are each a full image of the top of one symbol's book.
+            for row in rows:
+                self.__order_book(row['symbol']).apply_snapshot(row)
+
+    def __live_book(self, symbol):
+        '''The live OrderBook for a symbol. Only read it under self.lock.'''
+        if symbol not in self.order_books:
+            raise Exception("No order book for %s; is %s subscribed?" % (symbol, settings.ORDERBOOK_TABLE))
+        return self.order_books[symbol]
+
+    def __order_book(self, symbol):
+        if symbol not in self.order_books:
+            self.order_books[symbol] = OrderBook(symbol)
+        return self.order_books[symbol]
+
+    def __new_table(self, table):
+        '''Create storage for a table we haven't seen a partial for yet.
+
+        Until a partial tells us the table's keys, we assume it's append-only and give it a ring
+        buffer. Keyed tables are moved into a KeyedTable when their partial arrives.'''
+        capacity = (settings.WS_TABLE_CAPACITY or {}).get(table, BitMEXWebsocket.DEFAULT_TABLE_CAPACITY)
+        return deque(maxlen=capacity)
+
+    def __find_item(self, table, matchData):
+        '''Find the row in a table matching the table's keys.'''
+        if isinstance(self.data[table], KeyedTable):
+            return self.data[table].find(matchData)
+        return findItemByKeys(self.keys[table], self.data[table], matchData)
+
     def __on_open(self, ws):
         self.logger.debug("Websocket Opened.")
+        self.connected = True
+        self.__notify_state_changed()
 
-    def __on_close(self, ws):
+    def __on_close(self, ws, *args):
         self.logger.info('Websocket Closed')
-        self.exit()
+        with self.lock:
+            self.connected = False
+            # Wait for a fresh partial of every table before trusting the data again.
+            self.partials = set()
+            if self.disconnectedAt is None and not self.exited:
+                self.disconnectedAt = time()
+        self.__notify_state_changed()
 
     def __on_error(self, ws, error):
-        if not self.exited:
+        if self.exited:
+            return
+        if self.partials or self.disconnectedAt is not None:
+            # We've been up before; the run loop will reconnect once the socket closes.
+            self.logger.warning("WS error: %s" % error)
+        else:
             self.error(error)
 
     def __reset(self):
         self.data = {}
         self.keys = {}
+        self.partials = set()
+        self.subscribedTables = set()
+        # How many times every subscribed table has had its partial, counting the first connect.
+        self.resyncs = 0
+        self.instrument_constants = {}
+        self.order_books = {}
+        # clOrdID prefix -> OpenOrders
+        self.own_orders = {}
+        # Bumped every time a message is applied.
+        self.version = 0
+        # (symbol, clOrdIDPrefix) -> the last Snapshot taken
+        self.snapshots = {}
+        self.stale_snapshots = 0
+        self.connected = False
+        # When the connection dropped, until we're resynced.
+        self.disconnectedAt = None
         self.exited = False
         self._error = None
 
 
+class Snapshot(object):
+    '''A read-only copy of the tables the strategy reads for one symbol, all from the same moment.
+
+    Take one with BitMEXWebsocket.snapshot(). `version` identifies the state it was copied from;
+    BitMEXWebsocket.is_stale() tells you if the live tables have moved on since. Rows are copies,
+    so don't expect them to update, and don't modify them: the same snapshot is handed to every
+    caller until the next message arrives.'''
+
+    __slots__ = ('version', 'symbol', 'instrument', 'ticker', 'position', 'margin', 'orders', 'trade', 'lastClose')
+
+    def __init__(self, ws, symbol, clOrdIDPrefix):
+        data = ws.data
+        self.version = ws.version
+        self.symbol = symbol
+        self.instrument = dict(ws.get_instrument(symbol))
+        self.ticker = instrumentTicker(self.instrument)
+        # Account tables are only there if we authenticated.
+        self.position = dict(ws.position(symbol)) if 'position' in data else None
+        self.margin = dict(data['margin'][0]) if data.get('margin') else None
+        self.orders = tuple(dict(o) for o in ws.open_orders(clOrdIDPrefix)) if 'order' in data else ()
+        self.trade = dict(data['trade'][-1]) if data.get('trade') else None
+        self.lastClose = dict(data['tradeBin5m'][-1]) if data.get('tradeBin5m') else None
+
+
+def instrumentTicker(instrument):
+    '''Build a ticker (last, buy, sell and mid prices) from an instrument row.'''
+    # If this is an index, we have to get the data from the last trade.
+    if instrument['symbol'][0] == '.':
+        ticker = {}
+        ticker['mid'] = ticker['buy'] = ticker['sell'] = ticker['last'] = instrument['markPrice']
+    # Normal instrument
+    else:
+        bid = instrument['bidPrice'] or instrument['lastPrice']
+        ask = instrument['askPrice'] or instrument['lastPrice']
+        ticker = {
+            "last": instrument['lastPrice'],
+            "buy": bid,
+            "sell": ask,
+            "mid": (bid + ask) / 2
+        }
+
+    # The instrument has a tickSize. Use it to round values.
+    return {k: toNearest(float(v or 0), instrument['tickSize']) for k, v in iteritems(ticker)}
+
+
+# Tables that feed the local order books. See market_maker.ws.orderbook.
+ORDER_BOOK_TABLES = ('orderBookL2', 'orderBook10')
+
+# Instrument fields that instrumentConstants() derives from.
+INSTRUMENT_CONSTANT_FIELDS = ('tickSize', 'multiplier', 'isQuanto', 'isInverse',
+                              'underlyingToSettleMultiplier', 'quoteToSettleMultiplier')
+
+
+def instrumentConstants(instrument):
+    '''Derive the constants the MM needs from an instrument row.
+
+    These only change when the instrument's contract spec does, so they're computed when the
+    row arrives or one of INSTRUMENT_CONSTANT_FIELDS changes rather than on every lookup.'''
+    tickSize = instrument.get('tickSize')
+    constants = {
+        'tickSize': tickSize,
+        'tickLog': None,
+        'futureType': None,
+        'multiplier': None
+    }
+    if tickSize is not None:
+        # Turn the 'tickSize' into 'tickLog' for use in rounding
+        # http://stackoverflow.com/a/6190291/832202
+        constants['tickLog'] = decimal.Decimal(str(tickSize)).as_tuple().exponent * -1
+
+    # Indices have no contract spec.
+    if instrument.get('multiplier') is None:
+        return constants
+
+    if instrument.get('isQuanto'):
+        constants['futureType'] = "Quanto"
+    elif instrument.get('isInverse'):
+        constants['futureType'] = "Inverse"
+    else:
+        constants['futureType'] = "Linear"
+
+    if instrument.get('underlyingToSettleMultiplier') is None:
+        settleMultiplier = instrument.get('quoteToSettleMultiplier')
+    else:
+        settleMultiplier = instrument['underlyingToSettleMultiplier']
+    if settleMultiplier:
+        constants['multiplier'] = float(instrument['multiplier']) / float(settleMultiplier)
+
+    return constants
+
+
+class KeyedTable(object):
+    '''A table of rows indexed on the values of the table's keys.
+
+    BitMEX tells us on each partial which fields uniquely identify a row. Rows are stored in
+    insertion order in a dict keyed on those fields, so finding, updating and removing a row
+    is O(1) rather than a scan of the whole table. Readers can treat it like the list it replaces:
+    it can be iterated, measured with len() and indexed. Unlike a list, iterating it while another
+    thread changes it raises, so read it from other threads under BitMEXWebsocket.lock.'''
+
+    def __init__(self, keys, rows=()):
+        if not keys:
+            raise ValueError("A KeyedTable needs at least one key.")
+        self.keys = list(keys)
+        # itemgetter returns a tuple of the values for compound keys and the bare value for a
+        # single key; either way it's hashable and consistent within a table.
+        self.key = itemgetter(*self.keys)
+        self.rows = OrderedDict()
+        self.extend(rows)
+
+    def find(self, matchData):
+        '''Return the row with the same keys as matchData, or None.'''
+        try:
+            return self.rows.get(self.key(matchData))
+        except KeyError:
+            # matchData is missing a key field, so it can't match anything.
+            return None
+
+    def append(self, row):
+        self.rows[self.key(row)] = row
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+        return self
+
+    __iadd__ = extend
+
+    def remove(self, row):
+        '''Remove a row. Rows that aren't in the table are ignored.'''
+        if row is not None:
+            self.rows.pop(self.key(row), None)
+
+    def evict(self, count):
+        '''Drop the oldest `count` rows.'''
+        for _ in range(min(count, len(self.rows))):
+            self.rows.popitem(last=False)
+
+    def __iter__(self):
+        return iter(self.rows.values())
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if not self.rows:
+            raise IndexError("KeyedTable index out of range")
+        # The common cases are the first and last row; don't copy the table for those.
+        if index == 0:
+            return self.rows[next(iter(self.rows))]
+        if index == -1:
+            return self.rows[next(reversed(self.rows))]
+        return list(self.rows.values())[index]
+
+    def __repr__(self):
+        return 'KeyedTable(%r, %r)' % (self.keys, list(self.rows.values()))
+
+
 def findItemByKeys(keys, table, matchData):
     for item in table:
         matched = True
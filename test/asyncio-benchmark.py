@@ -0,0 +1,86 @@
+import asyncio
+import os
+import sys
+import time
+from multiprocessing.pool import ThreadPool
+
+###
+# asyncio-benchmark.py
+#
+# Throughput and latency of sending order requests through the threaded connector (a pool of
+# threads over market_maker.bitmex.BitMEX) against the asyncio one (market_maker.aio), with the
+# same number of requests in flight. Both talk to the local stand-in server, which adds a fixed
+# latency to every request in place of the network and the exchange. The server runs on a thread
+# in this process, so it shares the CPU with the client; the numbers are for comparison only.
+#
+# Python 3 only; needs aiohttp.
+#
+# Usage: python test/asyncio-benchmark.py [requests] [in flight] [latency ms]
+###
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from market_maker.aio.bitmex import AsyncBitMEX  # noqa: E402
+from market_maker.aio.standin import StandInServer  # noqa: E402
+from market_maker.bitmex import BitMEX  # noqa: E402
+
+SECRET = 'chNOOS4KvNXR_Xq4k4c9qsfoKWvnDecLATCRlcBwyKDYnWgO'
+
+
+def order(i):
+    return [{'price': 9000.0 + i % 1000, 'orderQty': 100, 'side': 'Buy'}]
+
+
+def report(name, latencies, elapsed):
+    latencies = sorted(latencies)
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000  # noqa: E731
+    print("%-10s %8.0f req/s   p50 %6.1f ms   p99 %6.1f ms   max %6.1f ms" % (
+        name, len(latencies) / elapsed, percentile(0.5), percentile(0.99), latencies[-1] * 1000))
+
+
+def threaded(base_url, requests, inFlight):
+    bitmex = BitMEX(base_url=base_url, symbol='XBTUSD', apiKey='key', apiSecret=SECRET,
+                    shouldWSAuth=False, httpPoolSize=inFlight)
+    pool = ThreadPool(inFlight)
+
+    def send(i):
+        start = time.time()
+        bitmex.create_bulk_orders(order(i))
+        return time.time() - start
+
+    pool.map(send, range(inFlight))  # warm up
+    start = time.time()
+    latencies = pool.map(send, range(requests))
+    report('threaded', latencies, time.time() - start)
+    pool.close()
+    bitmex.exit()
+
+
+async def asynchronous(base_url, requests, inFlight):
+    async with AsyncBitMEX(base_url, ['XBTUSD'], 'key', SECRET, shouldWSAuth=False, maxInFlight=inFlight) as bitmex:
+        slots = asyncio.Semaphore(inFlight)
+
+        async def send(i):
+            async with slots:
+                start = time.time()
+                await bitmex.create_bulk_orders(order(i))
+                return time.time() - start
+
+        await asyncio.gather(*[send(i) for i in range(inFlight)])  # warm up
+        start = time.time()
+        latencies = await asyncio.gather(*[send(i) for i in range(requests)])
+        report('asyncio', latencies, time.time() - start)
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    inFlight = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 20) / 1000
+    server = StandInServer(['XBTUSD'], apiSecret=SECRET, latency=latency)
+    base_url = server.start_in_thread()
+    print("%d requests, %d in flight, %.0f ms server latency" % (requests, inFlight, latency * 1000))
+    threaded(base_url, requests, inFlight)
+    asyncio.get_event_loop().run_until_complete(asynchronous(base_url, requests, inFlight))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+###
+# backfill-benchmark.py
+#
+# Time to load days of 5m bars into a BarBuffer: a page at a time, appending bar by bar, against
+# BarBackfill fetching pages on several threads at once and copying them in with
+# BarBuffer.extend(). The API is stood in for by an object that waits a fixed latency per request
+# and returns 500 generated bins, so this measures the requests overlapping and the copy, not the
+# exchange.
+#
+# Usage: python test/backfill-benchmark.py [days] [workers] [latency ms]
+###
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from market_maker.utils.backfill import BarBackfill  # noqa: E402
+from market_maker.utils.bars import BarBuffer  # noqa: E402
+from market_maker.utils.trade_bin import TradeBin  # noqa: E402
+
+
+class SlowTradeApi(object):
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.requests = 0
+
+    def trade_get_bucketed_with_http_info(self, bin_size, symbol, count, start_time, end_time):
+        self.requests += 1
+        time.sleep(self.latency)
+        bins = []
+        timestamp = start_time
+        while timestamp <= end_time and len(bins) < count:
+            bins.append(TradeBin(timestamp=timestamp.strftime('%Y-%m-%dT%H:%M:%S.000Z'), symbol=symbol,
+                                 open=10000.0, high=10010.0, low=9990.0, close=10005.0, volume=1000))
+            timestamp += timedelta(minutes=5)
+        return bins, 200, {}
+
+
+def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 14
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 300) / 1000
+    end = datetime(2018, 1, 1)
+    start = end - timedelta(days=days)
+    bars = days * 24 * 12
+    print("%d days (%d bars), %d workers, %.0f ms latency" % (days, bars, workers, latency * 1000))
+
+    api = SlowTradeApi(latency)
+    backfill = BarBackfill(api, 'XBT', '5m', workers=1)
+    buffer = BarBuffer(bars)
+    began = time.time()
+    for page in backfill.pages(start, end):
+        trades = api.trade_get_bucketed_with_http_info('5m', 'XBT', BarBackfill.PAGE_SIZE, *page)[0]
+        for trade in trades:
+            buffer.append(trade.timestamp, trade.open, trade.high, trade.low, trade.close, trade.volume)
+    print("%-12s %6.2fs  %d requests, %d bars" % ('sequential', time.time() - began, api.requests, len(buffer)))
+
+    api = SlowTradeApi(latency)
+    backfill = BarBackfill(api, 'XBT', '5m', workers=workers)
+    buffer = BarBuffer(bars)
+    began = time.time()
+    backfill.fill(buffer, start, end)
+    print("%-12s %6.2fs  %d requests, %d bars" % ('parallel', time.time() - began, api.requests, len(buffer)))
+
+
+if __name__ == "__main__":
+    main()
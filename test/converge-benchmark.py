@@ -0,0 +1,100 @@
+import os
+import random
+import sys
+import timeit
+
+###
+# converge-benchmark.py
+#
+# Times working out the create/amend/cancel sets for a ladder of N order pairs, with diff_orders
+# and with the matching converge_orders used to do inline (including looking up each amended
+# order's original with a list scan, for the log line). The ladder has moved since the orders
+# were placed, a few orders have filled and a few have been partially filled.
+#
+# Usage: python test/converge-benchmark.py [pairs ...]
+###
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from market_maker.utils.converge import diff_orders  # noqa: E402
+
+TICK = 0.5
+MID = 10000.0
+RELIST_INTERVAL = 0.0001
+
+
+def ladder(pairs, mid):
+    buys = [{'price': mid - TICK * i, 'orderQty': 100 * i, 'side': 'Buy'} for i in reversed(range(1, pairs + 1))]
+    sells = [{'price': mid + TICK * i, 'orderQty': 100 * i, 'side': 'Sell'} for i in reversed(range(1, pairs + 1))]
+    return buys, sells
+
+
+def open_orders(pairs):
+    rnd = random.Random(1)
+    orders = []
+    buys, sells = ladder(pairs, MID)
+    for i, order in enumerate(buys + sells):
+        if rnd.random() < 0.05:
+            continue  # Filled.
+        cumQty = rnd.randint(1, order['orderQty'] - 1) if rnd.random() < 0.1 else 0
+        orders.append({'orderID': 'order-%d' % i, 'side': order['side'], 'price': order['price'],
+                       'leavesQty': order['orderQty'] - cumQty, 'cumQty': cumQty})
+    rnd.shuffle(orders)
+    return orders
+
+
+def legacy_converge(existing_orders, buy_orders, sell_orders):
+    to_amend = []
+    to_create = []
+    to_cancel = []
+    buys_matched = 0
+    sells_matched = 0
+    for order in existing_orders:
+        try:
+            if order['side'] == 'Buy':
+                desired_order = buy_orders[buys_matched]
+                buys_matched += 1
+            else:
+                desired_order = sell_orders[sells_matched]
+                sells_matched += 1
+            if desired_order['orderQty'] != order['leavesQty'] or (
+                    desired_order['price'] != order['price'] and
+                    abs((desired_order['price'] / order['price']) - 1) > RELIST_INTERVAL):
+                to_amend.append({'orderID': order['orderID'], 'orderQty': order['cumQty'] + desired_order['orderQty'],
+                                 'price': desired_order['price'], 'side': order['side']})
+        except IndexError:
+            to_cancel.append(order)
+    while buys_matched < len(buy_orders):
+        to_create.append(buy_orders[buys_matched])
+        buys_matched += 1
+    while sells_matched < len(sell_orders):
+        to_create.append(sell_orders[sells_matched])
+        sells_matched += 1
+    for amended_order in reversed(to_amend):
+        [o for o in existing_orders if o['orderID'] == amended_order['orderID']][0]
+    return to_create, to_amend, to_cancel
+
+
+def new_converge(existing_orders, buy_orders, sell_orders):
+    diff = diff_orders(existing_orders, buy_orders, sell_orders, RELIST_INTERVAL)
+    for amended_order in reversed(diff.to_amend):
+        diff.existing[amended_order['orderID']]
+    return diff.to_create, diff.to_amend, diff.to_cancel
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 100, 500]
+    for pairs in sizes:
+        orders = open_orders(pairs)
+        buys, sells = ladder(pairs, MID + 3 * TICK)
+        assert legacy_converge(orders, buys, sells) == new_converge(orders, buys, sells)
+        result = new_converge(orders, buys, sells)
+        print("%d pairs, %d open orders: %d to create, %d to amend, %d to cancel" %
+              (pairs, len(orders), len(result[0]), len(result[1]), len(result[2])))
+        for name, converge in [('before', legacy_converge), ('diff_orders', new_converge)]:
+            number = max(1, 20000 // pairs)
+            elapsed = timeit.timeit(lambda: converge(orders, buys, sells), number=number)
+            print("  %-12s %10.1f us" % (name, elapsed / number * 1e6))
+
+
+if __name__ == "__main__":
+    main()
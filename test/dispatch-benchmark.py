@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+
+###
+# dispatch-benchmark.py
+#
+# Measures the wall time of sending a requote (a batch each of cancels, amends and creates) one
+# batch after another, as converge_orders used to, and through OrderDispatcher. The exchange is
+# simulated with a fixed round trip time, so this shows the shape of the win rather than real
+# network numbers.
+#
+# Dispatched takes two round trips rather than one: cancels and amends go together, and the
+# creates wait for them (see OrderDispatcher). Sending the creates alongside would save a round
+# trip, but a create could then land while an amend that failed or crosses it is in flight, and
+# quote the ladder twice. Creates at a price being cancelled at wait for the cancels either way.
+#
+# Usage: python test/dispatch-benchmark.py [rtt ms]
+###
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from market_maker.utils.dispatch import OrderDispatcher  # noqa: E402
+
+
+class SimulatedExchange(object):
+    def __init__(self, rtt):
+        self.rtt = rtt
+        self.sent = []
+
+    def __send(self, kind, orders):
+        time.sleep(self.rtt)
+        self.sent.append((kind, time.time()))
+        return orders
+
+    def cancel_bulk_orders(self, orders):
+        return self.__send('cancel', orders)
+
+    def amend_bulk_orders(self, orders):
+        return self.__send('amend', orders)
+
+    def create_bulk_orders(self, orders):
+        return self.__send('create', orders)
+
+
+def requote():
+    to_cancel = [{'orderID': 'c%d' % i, 'price': 9990.0 - i} for i in range(3)]
+    to_amend = [{'orderID': 'a%d' % i, 'price': 10010.0 + i, 'orderQty': 100} for i in range(6)]
+    to_create = [{'price': 10000.0 - i, 'orderQty': 100, 'side': 'Buy'} for i in range(3)]
+    return to_cancel, to_amend, to_create
+
+
+def main():
+    rtt = (float(sys.argv[1]) if len(sys.argv) > 1 else 50) / 1000
+    exchange = SimulatedExchange(rtt)
+    dispatcher = OrderDispatcher(exchange)
+    to_cancel, to_amend, to_create = requote()
+
+    start = time.time()
+    exchange.cancel_bulk_orders(to_cancel)
+    exchange.amend_bulk_orders(to_amend)
+    exchange.create_bulk_orders(to_create)
+    print("Sequential:                  %6.1f ms (%.1f RTTs)" % ((time.time() - start) * 1000, (time.time() - start) / rtt))
+
+    start = time.time()
+    dispatcher.dispatch(to_cancel, to_amend, to_create)
+    print("Dispatched:                  %6.1f ms (%.1f RTTs)" % ((time.time() - start) * 1000, (time.time() - start) / rtt))
+
+    # A create at a price we're cancelling at has to wait for the cancel.
+    to_create.append({'price': to_cancel[0]['price'], 'orderQty': 100, 'side': 'Buy'})
+    start = time.time()
+    dispatcher.dispatch(to_cancel, to_amend, to_create)
+    print("Dispatched, create waits:    %6.1f ms (%.1f RTTs)" % ((time.time() - start) * 1000, (time.time() - start) / rtt))
+    dispatcher.close()
+
+
+if __name__ == "__main__":
+    main()
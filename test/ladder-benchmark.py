@@ -0,0 +1,52 @@
+import os
+import sys
+import timeit
+
+###
+# ladder-benchmark.py
+#
+# Times building a quote ladder of N pairs with Ladder, against pricing each level on its own the
+# way place_orders used to (prepare_order -> get_price_offset -> toNearest). That both give the
+# same orders is checked in market_maker/utils/test_ladder.py.
+#
+# Usage: python test/ladder-benchmark.py [pairs ...]
+###
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from market_maker.utils.ladder import Ladder  # noqa: E402
+from market_maker.utils.math import toNearest  # noqa: E402
+
+INTERVAL = 0.0005
+TICK = 0.5
+START_BUY = 10000.5
+START_SELL = 10001.0
+
+
+def per_level(pairs):
+    buy_orders = []
+    sell_orders = []
+    for i in reversed(range(1, pairs + 1)):
+        for index in (-i, i):
+            start = START_BUY if index < 0 else START_SELL
+            offset = index + 1 if index < 0 else index - 1
+            order = {'price': toNearest(start * (1 + INTERVAL) ** offset, TICK),
+                     'orderQty': 100 + (abs(index) - 1) * 100, 'side': "Buy" if index < 0 else "Sell"}
+            (buy_orders if index < 0 else sell_orders).append(order)
+    return buy_orders, sell_orders
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [6, 100, 500]
+    for pairs in sizes:
+        ladder = Ladder(pairs, INTERVAL, 100, 100, maintain_spreads=True)
+        number = max(1, 20000 // pairs)
+        print("%d pairs:" % pairs)
+        for name, build in [('per level', lambda: per_level(pairs)),
+                            ('Ladder.build', lambda: ladder.build(START_BUY, START_SELL, TICK)),
+                            ('Ladder.arrays', lambda: ladder.arrays(START_BUY, START_SELL, TICK))]:
+            elapsed = timeit.timeit(build, number=number)
+            print("  %-14s %10.1f us" % (name, elapsed / number * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import random
+import sys
+import timeit
+
+###
+# orderbook-benchmark.py
+#
+# Drives an OrderBook with a synthetic orderBookL2 session shaped like busy XBTUSD trading: a deep
+# partial, then a stream of messages that mostly change sizes near the touch, with levels being
+# added and removed as the price moves. Reports messages/sec applied and the cost of the queries
+# the market maker makes. A busy XBTUSD session peaks at a few thousand L2 messages a second.
+#
+# Usage: python test/orderbook-benchmark.py [messages]
+###
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from market_maker.ws.orderbook import OrderBook  # noqa: E402
+
+TICK = 0.5
+LEVELS_PER_SIDE = 3000
+MID = 10000.0
+
+
+def level_id(price):
+    # BitMEX derives L2 ids from the price; any stable mapping will do here.
+    return int(price / TICK)
+
+
+def generate(count):
+    rnd = random.Random(1)
+    partial = []
+    for i in range(LEVELS_PER_SIDE):
+        bid, ask = MID - TICK * (i + 1), MID + TICK * i
+        partial.append({'symbol': 'XBTUSD', 'id': level_id(bid), 'side': 'Buy', 'size': rnd.randint(1, 50000), 'price': bid})
+        partial.append({'symbol': 'XBTUSD', 'id': level_id(ask), 'side': 'Sell', 'size': rnd.randint(1, 50000), 'price': ask})
+
+    live = {'Buy': set(r['price'] for r in partial if r['side'] == 'Buy'),
+            'Sell': set(r['price'] for r in partial if r['side'] == 'Sell')}
+    messages = []
+    for _ in range(count):
+        side = rnd.choice(['Buy', 'Sell'])
+        offset = int(rnd.expovariate(0.1))  # Most activity is within a few ticks of the touch.
+        price = MID - TICK * (offset + 1) if side == 'Buy' else MID + TICK * offset
+        r = rnd.random()
+        if price in live[side] and r < 0.1:
+            live[side].discard(price)
+            messages.append(('delete', [{'symbol': 'XBTUSD', 'id': level_id(price), 'side': side}]))
+        elif price not in live[side]:
+            live[side].add(price)
+            messages.append(('insert', [{'symbol': 'XBTUSD', 'id': level_id(price), 'side': side,
+                                         'size': rnd.randint(1, 50000), 'price': price}]))
+        else:
+            rows = [{'symbol': 'XBTUSD', 'id': level_id(price), 'side': side, 'size': rnd.randint(1, 50000)}]
+            messages.append(('update', rows))
+    return partial, messages
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    partial, messages = generate(count)
+    book = OrderBook('XBTUSD')
+
+    elapsed = timeit.timeit(lambda: book.apply_l2('partial', partial), number=1)
+    print("Partial of %d levels applied in %.2f ms" % (len(partial), elapsed * 1000))
+
+    def replay():
+        for action, rows in messages:
+            book.apply_l2(action, rows)
+    elapsed = timeit.timeit(replay, number=1)
+    print("%d L2 messages applied in %.3f s: %.0f msgs/sec" % (len(messages), elapsed, len(messages) / elapsed))
+    print(book)
+
+    queries = [
+        ('best_bid()', lambda: book.best_bid()),
+        ('best_ask()', lambda: book.best_ask()),
+        ('size_within(Buy, 10 ticks)', lambda: book.size_within('Buy', 10, TICK)),
+        ('price_to_fill(Sell, 500000)', lambda: book.price_to_fill('Sell', 500000)),
+    ]
+    for name, query in queries:
+        number = 100000
+        elapsed = timeit.timeit(query, number=number)
+        print("%-30s %8.2f us" % (name, elapsed / number * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import os
+import random
+import sys
+import timeit
+
+###
+# tonearest-benchmark.py
+#
+# Times rounding prices to the tick with toNearest (cached integer tick scale) against the Decimal
+# implementation it replaced, for a few tick sizes, and checks they agree on every input.
+#
+# Usage: python test/tonearest-benchmark.py [calls]
+###
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from market_maker.utils.math import toNearest, toNearestDecimal  # noqa: E402
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = random.Random(1)
+    for tickSize, price in [(0.5, 10000.0), (0.01, 400.0), (0.00000001, 0.03)]:
+        prices = [price * rng.uniform(0.9, 1.1) for _ in range(1000)]
+        assert all(toNearest(p, tickSize) == toNearestDecimal(p, tickSize) for p in prices)
+        print("tickSize %g:" % tickSize)
+        for name, fn in [('Decimal', toNearestDecimal), ('toNearest', toNearest)]:
+            elapsed = timeit.timeit(lambda: [fn(p, tickSize) for p in prices], number=calls // len(prices))
+            print("  %-10s %8.3f us/call" % (name, elapsed / calls * 1e6))
+
+
+if __name__ == "__main__":
+    main()
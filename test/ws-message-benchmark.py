@@ -0,0 +1,102 @@
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+###
+# ws-message-benchmark.py
+#
+# Measures how many frames per second BitMEXWebsocket's message handler gets through, by replaying
+# recorded frames through it without a network connection. Frames can come from a file with one raw
+# frame per line, or from segments written by the frame recorder (WS_RECORD_DIR): pass a segment file
+# or the whole directory. Also measures what leaving the recorder on costs the handler.
+#
+# The default, ws-frames-XBTUSD-synthetic.jsonl, is generated, not captured: the message types and
+# row shapes of an XBTUSD session, with made-up values and fixed 2018 timestamps. Numbers from it are
+# good for comparing decoders and handler changes, not for what live traffic costs. For that, run
+# the bot with WS_RECORD_DIR set for a while and pass the directory here.
+#
+# Usage: python test/ws-message-benchmark.py [frames file or recorder dir] [repetitions]
+#
+# Run it from wherever you run the market maker from, so settings can be found.
+###
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from market_maker.ws.recorder import FrameRecorder, read_frames  # noqa: E402
+from market_maker.ws.ws_thread import BitMEXWebsocket  # noqa: E402
+
+DEFAULT_FRAMES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ws-frames-XBTUSD-synthetic.jsonl')
+
+
+class NullSocket(object):
+    def close(self):
+        pass
+
+    def send(self, message):
+        pass
+
+
+def load_frames(path):
+    if os.path.isdir(path) or '.seg' in os.path.basename(path):
+        return [frame for _, frame in read_frames(path)]
+    with open(path) as f:
+        return [line.rstrip('\n') for line in f if line.strip()]
+
+
+def legacy_decoder(message):
+    """What the handler did with each frame before: decode with json, then re-encode it for the debug log."""
+    decoded = json.loads(message)
+    json.dumps(decoded)
+    return decoded
+
+
+def decoders():
+    yield 'json (before: re-encoded for debug log)', legacy_decoder
+    yield 'json', json.loads
+    for name in ['ujson', 'orjson']:
+        try:
+            module = __import__(name)
+        except ImportError:
+            continue
+        yield name, module.loads
+
+
+def run(frames, decoder, repetitions, recorder=None):
+    ws = BitMEXWebsocket(decoder=decoder, recorder=recorder)
+    ws.ws = NullSocket()
+    on_message = getattr(ws, '_BitMEXWebsocket__on_message')
+    start = time.time()
+    for _ in range(repetitions):
+        for frame in frames:
+            on_message(None, frame)
+    elapsed = time.time() - start
+    return len(frames) * repetitions / elapsed
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_FRAMES
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    frames = load_frames(path)
+    logging.getLogger('root').setLevel(logging.INFO)
+
+    print("Replaying %d frames from %s, %d times.%s" % (len(frames), path, repetitions,
+                                                        ' (Synthetic frames.)' if path == DEFAULT_FRAMES else ''))
+    for name, decoder in decoders():
+        print("%-42s %10.0f msgs/sec" % (name, run(frames, decoder, repetitions)))
+
+    directory = tempfile.mkdtemp()
+    try:
+        recorder = FrameRecorder(directory)
+        rate = run(frames, json.loads, repetitions, recorder)
+        recorder.close()
+        print("%-42s %10.0f msgs/sec (%d recorded, %d dropped)" %
+              ('json, recording frames (gzip)', rate, recorder.recorded, recorder.dropped))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()